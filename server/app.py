@@ -15,6 +15,8 @@ except Exception:
 from flask import Flask, jsonify
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
+from telemetry import instrument_flask, metrics_response, wrap_wsgi
+
 # Import the three Flask apps
 from reddit_service.app import app as reddit_app
 from sentiment_service.app import app as sentiment_app
@@ -22,6 +24,7 @@ from storage_service.app import app as storage_app
 
 # Small root app
 _root = Flask(__name__)
+instrument_flask(_root, "root")
 
 @_root.get("/")
 def home():
@@ -35,9 +38,15 @@ def home():
 def health():
     return "OK", 200
 
+@_root.get("/metrics")
+def metrics():
+    """Prometheus text exposition for all three services."""
+    return metrics_response()
+
 # WSGI entrypoint for Elastic Beanstalk
-application = DispatcherMiddleware(_root, {
+# (Server-Timing headers are added when SERVER_TIMING=1)
+application = wrap_wsgi(DispatcherMiddleware(_root, {
     "/reddit": reddit_app,
     "/sentiment": sentiment_app,
     "/storage": storage_app,
-})
+}))
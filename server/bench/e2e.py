@@ -0,0 +1,518 @@
+# server/bench/e2e.py
+"""
+End-to-end throughput benchmark: fetch -> store -> analyze -> summary.
+
+Starts everything locally, with no Reddit credentials or shared database:
+  - a throwaway mongod (--mongod binary, temp dbpath), or --mongo-uri
+  - bench.reddit_stub serving --subreddits x --posts synthetic posts
+  - the root app under gunicorn, as in the Procfile (app:application)
+then drives the real HTTP path, stage by stage:
+
+  fetch    GET /reddit/reddit-posts per subreddit (stub round trip + spool)
+  store    until every fetched post is in Mongo (spool drain -> /store-posts)
+  analyze  GET /sentiment/analyze per subreddit (VADER + /store-sentiment)
+  summary  GET /storage/summary per subreddit and overall, --summary-rounds times
+
+Each stage reports posts/sec plus p50/p99. Client-side latencies come from
+the harness; `server` quantiles come from /metrics histogram deltas. Peak RSS
+is sampled per component (Linux /proc). One JSON document goes to stdout,
+and to --out if given. Compare two commits with:
+
+  python -m bench.e2e --subreddits 20 --posts 500 --out base.json
+  git checkout <other> && python -m bench.e2e --subreddits 20 --posts 500 --compare base.json
+  python -m bench.e2e --results new.json --compare base.json     # no run, just diff
+
+With --compare, the exit status is 1 if any metric regressed by more than
+--threshold percent. Needs gunicorn, mongod and the NLTK VADER lexicon
+(downloaded on first analyze if missing).
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from pymongo import MongoClient
+from prometheus_client.parser import text_string_to_metric_families
+
+from bench.mongo import bench_db, start_mongod
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANALYZE_MAX = 200  # sentiment_service caps /analyze at 200 posts per call
+
+
+def _percentile(vals: list[float], q: float) -> float | None:
+    if not vals:
+        return None
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))]
+
+
+def _ms(v: float | None) -> float | None:
+    return round(v * 1000, 2) if v is not None else None
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url: str, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code < 500:
+                return
+        except Exception:
+            pass
+        time.sleep(0.3)
+    raise RuntimeError(f"{url} did not come up")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Peak RSS per process tree (Linux /proc; empty elsewhere)
+# ──────────────────────────────────────────────────────────────────────────────
+def _tree(pid: int) -> list[int]:
+    parents: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except Exception:
+                continue
+            parents.setdefault(ppid, []).append(int(entry))
+    out, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        out.append(p)
+        todo.extend(parents.get(p, []))
+    return out
+
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+    return 0
+
+
+class RssSampler(threading.Thread):
+    """Max over time of the summed RSS of each component's process tree."""
+
+    def __init__(self, interval: float = 0.25):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.pids: dict[str, int] = {}
+        self.peak: dict[str, int] = {}
+        self.stop = threading.Event()
+        self.enabled = os.path.isdir("/proc")
+
+    def watch(self, name: str, pid: int) -> None:
+        self.pids[name] = pid
+
+    def run(self) -> None:
+        while self.enabled and not self.stop.is_set():
+            for name, pid in list(self.pids.items()):
+                rss = sum(_rss_bytes(p) for p in _tree(pid))
+                self.peak[name] = max(self.peak.get(name, 0), rss)
+            self.stop.wait(self.interval)
+
+    def report(self) -> dict:
+        if not self.enabled:
+            return {}
+        return {name: round(v / 2 ** 20, 1) for name, v in self.peak.items()}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# /metrics histogram deltas -> server-side quantiles
+# ──────────────────────────────────────────────────────────────────────────────
+def scrape(base: str) -> dict:
+    """{(sample name, frozen labels): value} for every histogram bucket/count sample."""
+    out = {}
+    text = requests.get(f"{base}/metrics", timeout=10).text
+    for fam in text_string_to_metric_families(text):
+        if fam.type != "histogram":
+            continue
+        for s in fam.samples:
+            out[(s.name, frozenset(s.labels.items()))] = s.value
+    return out
+
+
+def server_quantiles(before: dict, after: dict, metric: str, **match) -> dict:
+    """Bucket-interpolated p50/p99 (like PromQL histogram_quantile) of a histogram delta."""
+    buckets: dict[float, float] = {}
+    for (name, labels), value in after.items():
+        if name != f"{metric}_bucket":
+            continue
+        lab = dict(labels)
+        if any(lab.get(k) != v for k, v in match.items()):
+            continue
+        le = float(lab["le"])
+        buckets[le] = buckets.get(le, 0.0) + value - before.get((name, labels), 0.0)
+    if not buckets:
+        return {"count": 0, "p50_ms": None, "p99_ms": None}
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+
+    def q(p: float) -> float | None:
+        if total <= 0:
+            return None
+        rank, prev_le, prev_n = p * total, 0.0, 0.0
+        for le in bounds:
+            n = buckets[le]
+            if n >= rank:
+                if le == float("inf"):
+                    return prev_le
+                return prev_le + (le - prev_le) * ((rank - prev_n) / (n - prev_n) if n > prev_n else 1)
+            prev_le, prev_n = le, n
+        return prev_le
+
+    return {"count": int(total), "p50_ms": _ms(q(0.50)), "p99_ms": _ms(q(0.99))}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Processes
+# ──────────────────────────────────────────────────────────────────────────────
+def start_stub(args) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.reddit_stub", "--port", str(port), "--posts", str(args.posts),
+         "--seed", str(args.seed), "--latency-ms", str(args.reddit_latency_ms)],
+        cwd=SERVER_DIR, stdout=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    _wait_http(f"{base}/_stats")
+    return proc, base
+
+
+def start_app(args, mongo_uri: str, stub: str, workdir: str) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    prom_dir = os.path.join(workdir, "prom")
+    os.makedirs(prom_dir)
+    env = {
+        **os.environ,
+        "MONGODB_URI": mongo_uri,
+        "MONGODB_TLS": "false",
+        "REDDIT_API_BASE": stub,
+        "REDDIT_TOKEN_URL": f"{stub}/api/v1/access_token",
+        # Not issued by the stub: the first call 401s and goes through the refresh path
+        "ACCESS_TOKEN": "expired-bench-token",
+        "REFRESH_TOKEN": "bench-refresh-token",
+        "CLIENT_ID": "bench",
+        "CLIENT_SECRET": "bench",
+        "STORAGE_BASE_URL": f"{base}/storage",
+        "REDDIT_SPOOL_PATH": os.path.join(workdir, "spool.sqlite3"),
+        "PROMETHEUS_MULTIPROC_DIR": prom_dir,
+        "SERVER_TIMING": "",
+    }
+    proc = subprocess.Popen(
+        ["gunicorn", "--workers", str(args.workers), "--worker-class", "gthread",
+         "--threads", str(args.threads), "--bind", f"127.0.0.1:{port}", "app:application"],
+        cwd=SERVER_DIR, env=env,
+        stdout=open(os.path.join(workdir, "app.log"), "w"), stderr=subprocess.STDOUT,
+    )
+    _wait_http(f"{base}/health")
+    return proc, base
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Stages
+# ──────────────────────────────────────────────────────────────────────────────
+def _timed_calls(urls: list[str], concurrency: int, count) -> tuple[list[float], int, int, float]:
+    """GET every url; returns (latencies, posts counted, errors, wall seconds)."""
+    lat, posts, errors = [], 0, 0
+    lock = threading.Lock()
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def one(url: str) -> None:
+        nonlocal posts, errors
+        t0 = time.perf_counter()
+        try:
+            r = session.get(url, timeout=300)
+            r.raise_for_status()
+            n = count(r.json())
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            lat.append(time.perf_counter() - t0)
+            posts += n
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, urls))
+    return lat, posts, errors, time.perf_counter() - started
+
+
+def _stage(lat: list[float], posts: int | None, errors: int, wall: float, **extra) -> dict:
+    out = {
+        "calls": len(lat) + errors,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "p50_ms": _ms(_percentile(lat, 0.50)),
+        "p99_ms": _ms(_percentile(lat, 0.99)),
+    }
+    if posts is not None:
+        out["posts"] = posts
+        out["posts_per_s"] = round(posts / wall, 1) if wall else None
+    out.update(extra)
+    return out
+
+
+def _total_stored(posts) -> int:
+    # Collection metadata, not a scan: cheap enough to poll while the spool drains
+    return posts.estimated_document_count()
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="e2e-bench-")
+    procs: list[subprocess.Popen] = []
+    rss = RssSampler()
+    rss.watch("harness", os.getpid())
+    mongo = None
+    try:
+        if args.mongo_uri:
+            mongo_uri = args.mongo_uri
+            client = MongoClient(mongo_uri, serverSelectionTimeoutMS=10000)
+            client.drop_database(bench_db(mongo_uri))
+            client.close()
+        else:
+            mongod, mongo_uri = start_mongod(args.mongod, workdir, "e2e_bench")
+            procs.append(mongod)
+            rss.watch("mongod", mongod.pid)
+        stub_proc, stub = start_stub(args)
+        procs.append(stub_proc)
+        rss.watch("reddit_stub", stub_proc.pid)
+        app_proc, base = start_app(args, mongo_uri, stub, workdir)
+        procs.append(app_proc)
+        rss.watch("app", app_proc.pid)
+        rss.start()
+        mongo = MongoClient(mongo_uri, serverSelectionTimeoutMS=10000)
+        posts_coll = mongo.get_default_database("test")["post"]
+
+        subs = [f"bench{i:03d}" for i in range(args.subreddits)]
+        expected = args.subreddits * args.posts
+        for _ in range(args.workers * 2):  # load the VADER lexicon in every worker
+            requests.get(f"{base}/sentiment/analyze", params={"limit": 1}, timeout=120)
+
+        stages: dict = {}
+        m0 = scrape(base)
+
+        # fetch (store starts as soon as the first payload is spooled)
+        t_ingest = time.perf_counter()
+        lat, posts, errors, wall = _timed_calls(
+            [f"{base}/reddit/reddit-posts?subreddit={s}&limit={args.posts}" for s in subs],
+            args.concurrency,
+            lambda body: len(((body.get("data") or {}).get("data") or {}).get("children") or []),
+        )
+        m1 = scrape(base)
+        stages["fetch"] = _stage(lat, posts, errors, wall, server=server_quantiles(
+            m0, m1, "dependency_request_duration_seconds", dependency="reddit", operation="top"))
+
+        # store: wait for the spool to drain every fetched post into Mongo
+        stored, deadline = 0, time.time() + args.store_timeout
+        while time.time() < deadline:
+            stored = _total_stored(posts_coll)
+            if stored >= expected:
+                break
+            time.sleep(0.1)
+        ingest_wall = time.perf_counter() - t_ingest
+        m2 = scrape(base)
+        stages["store"] = {
+            "posts": stored,
+            "wall_s": round(ingest_wall, 3),
+            "posts_per_s": round(stored / ingest_wall, 1) if ingest_wall else None,
+            "drain_lag_s": round(ingest_wall - wall, 3),
+            "complete": stored >= expected,
+            "server": server_quantiles(m0, m2, "http_request_duration_seconds",
+                                       service="storage", route="/store-posts"),
+        }
+
+        # analyze
+        limit = min(args.posts, ANALYZE_MAX)
+        lat, posts, errors, wall = _timed_calls(
+            [f"{base}/sentiment/analyze?subreddit={s}&limit={limit}" for s in subs],
+            args.concurrency,
+            lambda body: int((body.get("meta") or {}).get("analyzed") or 0),
+        )
+        m3 = scrape(base)
+        stages["analyze"] = _stage(lat, posts, errors, wall, server={
+            "vader": server_quantiles(m2, m3, "dependency_request_duration_seconds",
+                                      dependency="vader", operation="score_posts"),
+            "store_sentiment": server_quantiles(m2, m3, "http_request_duration_seconds",
+                                                service="storage", route="/store-sentiment"),
+        })
+
+        # summary
+        urls = [f"{base}/storage/summary?subreddit={s}" for s in subs] + [f"{base}/storage/summary"]
+        lat, _, errors, wall = _timed_calls(urls * args.summary_rounds, args.concurrency, lambda body: 0)
+        stages["summary"] = _stage(lat, None, errors, wall,
+                                   requests_per_s=round(len(lat) / wall, 1) if wall else None)
+
+        # /analyze scores at most ANALYZE_MAX posts per subreddit, so only the
+        # analyzed posts made it through every stage; rate those, not `expected`.
+        pipeline_wall = stages["store"]["wall_s"] + stages["analyze"]["wall_s"]
+        analyzed = stages["analyze"]["posts"]
+        return {
+            "meta": _meta(args, mongo_uri),
+            "stages": stages,
+            "end_to_end": {  # ingest (fetch + store) then analyze
+                "posts": expected,
+                "stored": stored,
+                "analyzed": analyzed,
+                "wall_s": round(pipeline_wall, 3),
+                "posts_per_s": round(analyzed / pipeline_wall, 1) if pipeline_wall else None,
+            },
+            "peak_rss_mb": rss.report(),
+            "reddit_stub": requests.get(f"{stub}/_stats", timeout=5).json(),
+        }
+    finally:
+        rss.stop.set()
+        if mongo is not None:
+            mongo.close()
+        for p in reversed(procs):
+            p.terminate()
+            try:
+                p.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        if args.keep_workdir:
+            print(f"📂 Logs kept in {workdir}", file=sys.stderr, flush=True)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _meta(args, mongo_uri: str) -> dict:
+    def git(*cmd: str) -> str | None:
+        try:
+            return subprocess.run(["git", *cmd], cwd=SERVER_DIR, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except Exception:
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "cpus": os.cpu_count(),
+        "mongo": "spawned" if not args.mongo_uri else "external",
+        "params": {
+            "subreddits": args.subreddits,
+            "posts": args.posts,
+            "workers": args.workers,
+            "threads": args.threads,
+            "concurrency": args.concurrency,
+            "summary_rounds": args.summary_rounds,
+            "reddit_latency_ms": args.reddit_latency_ms,
+            "seed": args.seed,
+        },
+    }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Regression comparison
+# ──────────────────────────────────────────────────────────────────────────────
+def _flatten(results: dict) -> dict[str, tuple[float, bool]]:
+    """{metric path: (value, higher_is_better)} for the numbers worth comparing."""
+    out = {}
+    for stage, s in (results.get("stages") or {}).items():
+        for key, higher in (("posts_per_s", True), ("requests_per_s", True), ("p50_ms", False), ("p99_ms", False)):
+            if isinstance(s.get(key), (int, float)):
+                out[f"{stage}.{key}"] = (s[key], higher)
+    e2e = results.get("end_to_end") or {}
+    if isinstance(e2e.get("posts_per_s"), (int, float)):
+        out["end_to_end.posts_per_s"] = (e2e["posts_per_s"], True)
+    for name, mb in (results.get("peak_rss_mb") or {}).items():
+        if name != "harness":
+            out[f"peak_rss_mb.{name}"] = (mb, False)
+    return out
+
+
+def compare(baseline: dict, current: dict, threshold_pct: float) -> dict:
+    base, cur = _flatten(baseline), _flatten(current)
+    metrics, regressions = {}, []
+    for key in sorted(base.keys() & cur.keys()):
+        (b, higher), (c, _) = base[key], cur[key]
+        change = round((c - b) / b * 100, 1) if b else None
+        worse = change is not None and (-change if higher else change) > threshold_pct
+        metrics[key] = {"baseline": b, "current": c, "change_pct": change, "regressed": worse}
+        if worse:
+            regressions.append(key)
+    if (baseline.get("meta") or {}).get("params") != (current.get("meta") or {}).get("params"):
+        print("⚠️ Baseline was run with different parameters", file=sys.stderr, flush=True)
+    return {
+        "baseline_commit": (baseline.get("meta") or {}).get("commit"),
+        "threshold_pct": threshold_pct,
+        "regressions": regressions,
+        "metrics": metrics,
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--subreddits", type=int, default=10)
+    ap.add_argument("--posts", type=int, default=200, help="posts per subreddit")
+    ap.add_argument("--workers", type=int, default=3, help="gunicorn workers")
+    ap.add_argument("--threads", type=int, default=100, help="gunicorn threads per worker")
+    ap.add_argument("--concurrency", type=int, default=8, help="client requests in flight")
+    ap.add_argument("--summary-rounds", type=int, default=5)
+    ap.add_argument("--reddit-latency-ms", type=float, default=0, help="simulated Reddit round trip")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--store-timeout", type=float, default=300, help="seconds to wait for the spool to drain")
+    ap.add_argument("--mongod", default="mongod", help="mongod binary for the throwaway instance")
+    ap.add_argument("--mongo-uri", help="use this database instead (it is DROPPED first; its name must contain 'bench')")
+    ap.add_argument("--keep-workdir", action="store_true", help="keep temp dir with app/mongod logs")
+    ap.add_argument("--out", help="also write the results JSON here")
+    ap.add_argument("--results", help="skip the run; compare this results file instead")
+    ap.add_argument("--compare", metavar="BASELINE", help="results JSON from an earlier run")
+    ap.add_argument("--threshold", type=float, default=10.0, help="regression threshold, percent")
+    args = ap.parse_args()
+    if args.results and not args.compare:
+        ap.error("--results only makes sense with --compare")
+    if args.mongo_uri:
+        try:
+            bench_db(args.mongo_uri)
+        except ValueError as e:
+            ap.error(str(e))
+
+    if args.results:
+        with open(args.results) as f:
+            results = json.load(f)
+    else:
+        results = run(args)
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            results["comparison"] = compare(json.load(f), results, args.threshold)
+        status = 1 if results["comparison"]["regressions"] else 0
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+# server/bench/mongo.py
+"""
+Databases for the benchmarks: a throwaway mongod, or an explicit --mongo-uri.
+
+Benchmarks drop and reseed their database, so they never read MONGODB_URI
+and refuse any database whose name does not mark it as a bench database.
+"""
+import os
+import socket
+import subprocess
+
+from pymongo import MongoClient
+
+BENCH_MARKER = "bench"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_db(uri: str) -> str:
+    """Database name in `uri`; raises ValueError unless it is a bench database."""
+    # mongodb[+srv]://[user:pass@]hosts/<db>?options, parsed without resolving SRV records
+    rest = uri.split("://", 1)[-1]
+    return require_bench_name(rest.split("/", 1)[1].split("?", 1)[0] if "/" in rest else "")
+
+
+def require_bench_name(name: str) -> str:
+    if BENCH_MARKER not in name:
+        raise ValueError(
+            f"refusing to use database {name or '(none)'!r}: benchmarks drop it first, "
+            f"so its name must contain {BENCH_MARKER!r} (e.g. mongodb://host/search_bench)"
+        )
+    return name
+
+
+def start_mongod(binary: str, workdir: str, db: str) -> tuple[subprocess.Popen, str]:
+    """mongod on a free port with its dbpath under `workdir`; returns (proc, uri of `db`)."""
+    port = _free_port()
+    dbpath = os.path.join(workdir, "db")
+    os.makedirs(dbpath)
+    proc = subprocess.Popen(
+        [binary, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=open(os.path.join(workdir, "mongod.log"), "w"), stderr=subprocess.STDOUT,
+    )
+    client = MongoClient(f"mongodb://127.0.0.1:{port}", serverSelectionTimeoutMS=30000)
+    client.admin.command("ping")
+    client.close()
+    return proc, f"mongodb://127.0.0.1:{port}/{db}"
@@ -0,0 +1,281 @@
+# server/bench/reddit_stub.py
+"""
+Local stand-in for the Reddit endpoints reddit_service calls, serving a
+deterministic synthetic corpus:
+
+  POST /api/v1/access_token        refresh_token grant -> new bearer token
+  GET  /r/<subreddit>/top|new      Listing (honours limit / after)
+  GET  /comments/<id>[?comment=]   recorded comment tree     (with --fixtures)
+  GET  /api/morechildren           recorded `more` expansion (with --fixtures)
+  GET  /_stats                     request counters (for the harness)
+
+Any subreddit name works; each one has --posts posts generated from --seed,
+so two runs with the same flags serve the same ids, titles and scores. Bearer tokens
+the stub did not issue (or that outlived --token-ttl) get a 401, which drives
+reddit_service through its refresh path. Point the service at it with
+
+  REDDIT_API_BASE=http://127.0.0.1:5099
+  REDDIT_TOKEN_URL=http://127.0.0.1:5099/api/v1/access_token
+
+  python -m bench.reddit_stub --port 5099 --posts 500
+
+Comment endpoints replay recorded JSON from --fixtures DIR:
+  comments_<post>.json              GET /comments/<post>
+  comments_<post>_<comment>.json    GET /comments/<post>?comment=<comment>  ("continue this thread")
+  morechildren_<post>.json          GET /api/morechildren?link_id=t3_<post>; only the
+                                    requested ids (and their replies) are returned
+"""
+import os
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Titles mix VADER-positive, -negative and neutral words so scoring does real work
+POSITIVE = ["great", "love", "amazing", "excellent", "happy", "win", "brilliant", "helpful", "beautiful", "fantastic"]
+NEGATIVE = ["terrible", "hate", "awful", "broken", "sad", "fail", "disaster", "angry", "worst", "scam"]
+NEUTRAL = ["release", "update", "question", "thread", "report", "guide", "project", "review", "launch", "meeting",
+           "library", "policy", "market", "season", "version", "server", "budget", "election", "paper", "patch"]
+TEMPLATES = [
+    "{a} {n} for the new {m}",
+    "Why is the {n} so {a}?",
+    "{N} {m}: {a} results after a week",
+    "Is anyone else finding the {n} {a}",
+    "Weekly {n} {m} thread",
+    "The {a} {n} nobody talks about",
+]
+
+_LISTING_RE = re.compile(r"^/r/([A-Za-z0-9_]+)/(top|new|hot)/?$")
+_COMMENTS_RE = re.compile(r"^/comments/([A-Za-z0-9_]+)/?$")
+
+
+def _short_id(fullname: str | None) -> str | None:
+    return fullname.split("_", 1)[1] if fullname and "_" in fullname else fullname
+
+
+class Corpus:
+    def __init__(self, posts: int, seed: int):
+        self.posts = posts
+        self.seed = seed
+        self.epoch = int(time.time())  # posts are dated backwards from stub start
+        self._cache: dict[str, list[dict]] = {}
+        self._lock = threading.Lock()
+
+    def _generate(self, subreddit: str) -> list[dict]:
+        rng = random.Random(f"{self.seed}:{subreddit.lower()}")
+        out = []
+        for i in range(self.posts):
+            mood = rng.random()
+            adj = rng.choice(POSITIVE if mood < 0.4 else NEGATIVE if mood < 0.7 else NEUTRAL)
+            noun, other = rng.choice(NEUTRAL), rng.choice(NEUTRAL)
+            title = rng.choice(TEMPLATES).format(a=adj, n=noun, m=other, N=noun.capitalize())
+            pid = f"{subreddit.lower()[:8]}{i:06d}"
+            out.append({"kind": "t3", "data": {
+                "id": pid,
+                "name": f"t3_{pid}",
+                "title": title[0].upper() + title[1:],
+                "author": f"user{rng.randrange(5000)}",
+                "subreddit": subreddit,
+                "score": int(rng.paretovariate(1.2) * 10),
+                "num_comments": rng.randrange(200),
+                "created_utc": float(self.epoch - i * 90 - rng.randrange(60)),
+                "url": f"https://example.invalid/r/{subreddit}/{pid}",
+                "permalink": f"/r/{subreddit}/comments/{pid}/",
+                "is_video": False,
+            }})
+        return out
+
+    def posts_for(self, subreddit: str) -> list[dict]:
+        key = subreddit.lower()
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = self._generate(subreddit)
+            return self._cache[key]
+
+
+class Stub:
+    def __init__(self, corpus: Corpus, token_ttl: float, latency_ms: float, fixtures: str | None = None):
+        self.corpus = corpus
+        self.token_ttl = token_ttl
+        self.latency = latency_ms / 1000.0
+        self.fixtures = fixtures
+        self._tokens: dict[str, float] = {}  # token -> issued at
+        self._lock = threading.Lock()
+        self.counts = {"token": 0, "listing": 0, "comments": 0, "morechildren": 0,
+                       "unauthorized": 0, "not_found": 0, "posts_served": 0}
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[key] += n
+
+    def delay(self) -> None:
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))  # ±50% jitter
+
+    def issue_token(self) -> str:
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._tokens[token] = time.time()
+        self._count("token")
+        return token
+
+    def token_ok(self, header: str | None) -> bool:
+        if not header or not header.startswith("Bearer "):
+            return False
+        with self._lock:
+            issued = self._tokens.get(header[7:])
+        return issued is not None and (not self.token_ttl or time.time() - issued < self.token_ttl)
+
+    def listing(self, subreddit: str, qs: dict) -> dict:
+        posts = self.corpus.posts_for(subreddit)
+        try:
+            limit = max(1, int(qs.get("limit", ["25"])[0]))
+        except ValueError:
+            limit = 25
+        start = 0
+        after = qs.get("after", [None])[0]
+        if after:
+            names = [p["data"]["name"] for p in posts]
+            start = names.index(after) + 1 if after in names else len(posts)
+        page = posts[start:start + limit]
+        self._count("listing")
+        self._count("posts_served", len(page))
+        return {"kind": "Listing", "data": {
+            "after": page[-1]["data"]["name"] if start + limit < len(posts) and page else None,
+            "before": None,
+            "dist": len(page),
+            "children": page,
+        }}
+
+
+    def _fixture(self, name: str):
+        if not self.fixtures:
+            return None
+        path = os.path.join(self.fixtures, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def comments(self, post_id: str, qs: dict):
+        comment = qs.get("comment", [None])[0]
+        body = self._fixture(f"comments_{post_id}_{comment}.json" if comment else f"comments_{post_id}.json")
+        if body is not None:
+            self._count("comments")
+        return body
+
+    def morechildren(self, qs: dict):
+        post_id = _short_id(qs.get("link_id", [""])[0])
+        recorded = self._fixture(f"morechildren_{post_id}.json")
+        if recorded is None:
+            return None
+        wanted = set((qs.get("children", [""])[0]).split(","))
+        things, included = [], set()
+        # Things come in tree order, so a reply always follows its parent
+        for t in ((recorded.get("json") or {}).get("data") or {}).get("things") or []:
+            d = t.get("data") or {}
+            if d.get("id") in wanted or _short_id(d.get("parent_id")) in included:
+                things.append(t)
+                included.add(d.get("id"))
+        self._count("morechildren")
+        return {"json": {"errors": [], "data": {"things": things}}}
+
+
+def make_handler(stub: Stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):  # keep the harness output clean
+            pass
+
+        def _send(self, status: int, body: dict) -> None:
+            raw = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            form = parse_qs(self.rfile.read(length).decode() if length else "")
+            if urlsplit(self.path).path.rstrip("/") != "/api/v1/access_token":
+                return self._send(404, {"error": 404})
+            stub.delay()
+            if form.get("grant_type", [None])[0] not in ("refresh_token", "authorization_code"):
+                return self._send(400, {"error": "unsupported_grant_type"})
+            self._send(200, {
+                "access_token": stub.issue_token(),
+                "token_type": "bearer",
+                "expires_in": int(stub.token_ttl or 86400),
+                "scope": "read",
+            })
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path == "/_stats":
+                with stub._lock:
+                    counts = dict(stub.counts)
+                return self._send(200, counts)
+            stub.delay()
+            if not stub.token_ok(self.headers.get("Authorization")):
+                stub._count("unauthorized")
+                return self._send(401, {"message": "Unauthorized", "error": 401})
+            qs = parse_qs(parts.query)
+            m = _LISTING_RE.match(parts.path)
+            if m:
+                return self._send(200, stub.listing(m.group(1), qs))
+            m = _COMMENTS_RE.match(parts.path)
+            if m:
+                body = stub.comments(m.group(1), qs)
+            elif parts.path.rstrip("/") == "/api/morechildren":
+                body = stub.morechildren(qs)
+            else:
+                body = None
+            if body is None:
+                stub._count("not_found")
+                return self._send(404, {"message": "Not Found", "error": 404})
+            self._send(200, body)
+
+    return Handler
+
+
+def serve(port: int, posts: int, seed: int = 1, token_ttl: float = 0, latency_ms: float = 0,
+          fixtures: str | None = None) -> ThreadingHTTPServer:
+    """
+    Start the stub on a background thread; returns the server (call .shutdown()).
+    `server.stub` issues tokens directly for in-process callers.
+    """
+    stub = Stub(Corpus(posts, seed), token_ttl, latency_ms, fixtures)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stub))
+    server.stub = stub
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="reddit-stub", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=5099)
+    ap.add_argument("--posts", type=int, default=100, help="posts per subreddit")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--token-ttl", type=float, default=0, help="seconds before an issued token 401s (0 = never)")
+    ap.add_argument("--latency-ms", type=float, default=0, help="simulated Reddit round trip")
+    ap.add_argument("--fixtures", help="directory of recorded comment JSON (see above)")
+    args = ap.parse_args()
+
+    server = serve(args.port, args.posts, args.seed, args.token_ttl, args.latency_ms, args.fixtures)
+    print(f"🧪 Reddit stub on http://127.0.0.1:{args.port} ({args.posts} posts/subreddit)", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
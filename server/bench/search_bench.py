@@ -0,0 +1,142 @@
+# server/bench/search_bench.py
+"""
+Benchmark /search (search_posts) against a local mongod.
+
+Seeds a synthetic corpus (default 1M posts) into a throwaway database, builds
+the Post indexes, then times keyword queries with and without a subreddit
+filter. Prints one JSON document with p50/p99 latency per query shape.
+
+The database is a throwaway mongod (--mongod binary, temp dbpath) unless
+--mongo-uri names one; MONGODB_URI is never read, since seeding drops the
+post collection. A --mongo-uri database must have "bench" in its name.
+
+  python -m bench.search_bench --posts 1000000
+  python -m bench.search_bench --mongo-uri mongodb://127.0.0.1:27017/search_bench --skip-seed
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mongoengine import connect  # noqa: E402
+
+from storage_service.storage_service import Post, search_posts  # noqa: E402
+from bench.mongo import bench_db, require_bench_name, start_mongod  # noqa: E402
+
+WORDS = (
+    "python rust java golang startup funding layoffs market crash rally ai model "
+    "release election war peace climate health study vaccine football match goal "
+    "transfer book review budget savings debt housing rent salary job interview "
+    "privacy security breach launch update bug outage record win loss"
+).split()
+SUBREDDITS = ["technology", "genAI", "football", "worldnews", "dataisbeautiful",
+              "personalfinance", "health", "relationships", "startups", "books"]
+KEYWORDS = ["python", "crash", "election", "vaccine", "salary", "outage", "transfer", "ai"]
+
+
+def _percentile(vals: list[float], q: float) -> float:
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))]
+
+
+def seed(n: int, batch: int = 10_000, rng: random.Random | None = None) -> float:
+    rng = rng or random.Random(42)
+    coll = Post._get_collection()
+    require_bench_name(coll.database.name)  # never drop a real post collection
+    coll.drop()
+    Post.ensure_indexes()
+
+    start = time.perf_counter()
+    base = datetime.utcnow()
+    for lo in range(0, n, batch):
+        docs = []
+        for i in range(lo, min(lo + batch, n)):
+            comp = max(-1.0, min(1.0, rng.gauss(0, 0.4)))
+            scored = rng.random() < 0.9
+            doc = {
+                "post_id": f"b{i:08x}",
+                "title": " ".join(rng.choices(WORDS, k=rng.randint(5, 14))),
+                "subreddit": rng.choice(SUBREDDITS),
+                "score": rng.randint(0, 50_000),
+                "created_utc": base - timedelta(seconds=rng.randint(0, 30 * 86400)),
+            }
+            if scored:
+                doc["sentiment_compound"] = comp
+                doc["sentiment_polarity"] = (
+                    "positive" if comp >= 0.05 else "negative" if comp <= -0.05 else "neutral"
+                )
+            docs.append(doc)
+        coll.insert_many(docs, ordered=False)
+    return time.perf_counter() - start
+
+
+def run_queries(iterations: int, rng: random.Random) -> dict:
+    shapes = {
+        "keyword": lambda: search_posts(rng.choice(KEYWORDS)),
+        "keyword+subreddit": lambda: search_posts(rng.choice(KEYWORDS), subreddit=rng.choice(SUBREDDITS)),
+        "two_keywords_page3": lambda: search_posts(" ".join(rng.sample(KEYWORDS, 2)), page=3),
+    }
+    out = {}
+    for name, fn in shapes.items():
+        fn()  # warm-up
+        lat = []
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            fn()
+            lat.append((time.perf_counter() - t0) * 1000)
+        out[name] = {
+            "iterations": iterations,
+            "p50_ms": round(_percentile(lat, 0.50), 2),
+            "p99_ms": round(_percentile(lat, 0.99), 2),
+            "mean_ms": round(sum(lat) / len(lat), 2),
+        }
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--posts", type=int, default=1_000_000)
+    ap.add_argument("--iterations", type=int, default=50)
+    ap.add_argument("--skip-seed", action="store_true", help="reuse an already seeded database")
+    ap.add_argument("--mongod", default="mongod", help="mongod binary for the throwaway instance")
+    ap.add_argument("--mongo-uri", help="use this database instead (its post collection is DROPPED; "
+                                        "the name must contain 'bench')")
+    args = ap.parse_args()
+    if args.mongo_uri:
+        try:
+            bench_db(args.mongo_uri)
+        except ValueError as e:
+            ap.error(str(e))
+    elif args.skip_seed:
+        ap.error("--skip-seed needs --mongo-uri (a throwaway mongod starts empty)")
+
+    workdir = tempfile.mkdtemp(prefix="search-bench-")
+    mongod = None
+    try:
+        uri = args.mongo_uri
+        if not uri:
+            mongod, uri = start_mongod(args.mongod, workdir, "search_bench")
+        connect(host=uri, alias="default")
+
+        rng = random.Random(7)
+        result = {"posts": args.posts, "uri_db": bench_db(uri), "mongo": "external" if args.mongo_uri else "spawned"}
+        if not args.skip_seed:
+            result["seed_s"] = round(seed(args.posts), 2)
+        result["queries"] = run_queries(args.iterations, rng)
+        print(json.dumps(result, indent=2))
+    finally:
+        if mongod is not None:
+            mongod.terminate()
+            mongod.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
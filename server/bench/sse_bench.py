@@ -0,0 +1,147 @@
+# server/bench/sse_bench.py
+"""
+Fan-out benchmark for /storage/stream.
+
+Opens N concurrent SSE subscribers against a running server, publishes
+synthetic posts through /storage/store-posts, and measures how many `posts`
+events reach every subscriber, publish→receive latency and dropped
+(overflowed) subscribers. Prints one JSON document.
+
+Each worker process serves at most EVENTS_MAX_SUBSCRIBERS streams (default
+50, so 150 under the Procfile's 3 workers) and answers 503 past that; those
+subscribers are counted as rejected. gunicorn does not spread connections
+evenly across workers, so stay somewhat below the total:
+
+  python -m bench.sse_bench --base http://127.0.0.1:8000 --subscribers 120 --batches 200
+"""
+import json
+import time
+import uuid
+import argparse
+import threading
+from datetime import datetime, timezone
+
+import requests
+
+
+def _percentile(vals: list[float], q: float) -> float | None:
+    if not vals:
+        return None
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))]
+
+
+class Subscriber(threading.Thread):
+    def __init__(self, url: str, run_tag: str, ready: threading.Barrier, stop: threading.Event):
+        super().__init__(daemon=True)
+        self.url = url
+        self.run_tag = run_tag
+        self.ready = ready
+        self.stop = stop
+        self.received = 0
+        self.latencies: list[float] = []
+        self.overflowed = False
+        self.rejected = False
+        self.error: str | None = None
+
+    def run(self) -> None:
+        try:
+            with requests.get(self.url, stream=True, timeout=(5, 30),
+                              headers={"Accept": "text/event-stream"}) as r:
+                if r.status_code == 503:
+                    self.rejected = True  # over the per-process subscriber cap
+                    self.ready.wait()
+                    return
+                r.raise_for_status()
+                self.ready.wait()
+                event = None
+                for line in r.iter_lines(decode_unicode=True):
+                    if self.stop.is_set():
+                        break
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:") and event == "posts":
+                        payload = json.loads(line[5:])
+                        posts = [p for p in payload.get("posts", []) if (p.get("title") or "").startswith(self.run_tag)]
+                        now = time.time()
+                        for p in posts:
+                            sent = float(p["title"].split(":")[1])
+                            self.latencies.append(now - sent)
+                        self.received += len(posts)
+                    elif line.startswith("data:") and event == "overflow":
+                        self.overflowed = True
+                        break
+        except threading.BrokenBarrierError:
+            self.error = "barrier broken"
+        except Exception as e:
+            self.error = str(e)
+            try:
+                self.ready.abort()
+            except Exception:
+                pass
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base", default="http://127.0.0.1:8000", help="root app base URL")
+    ap.add_argument("--subscribers", type=int, default=120)
+    ap.add_argument("--batches", type=int, default=100, help="/store-posts calls")
+    ap.add_argument("--posts-per-batch", type=int, default=10)
+    ap.add_argument("--subreddit", default="ssebench")
+    ap.add_argument("--drain-secs", type=float, default=10.0)
+    args = ap.parse_args()
+
+    run_tag = f"bench-{uuid.uuid4().hex[:6]}"
+    stream_url = f"{args.base.rstrip('/')}/storage/stream?subreddit={args.subreddit}"
+    store_url = f"{args.base.rstrip('/')}/storage/store-posts"
+
+    stop = threading.Event()
+    ready = threading.Barrier(args.subscribers + 1)
+    subs = [Subscriber(stream_url, run_tag, ready, stop) for _ in range(args.subscribers)]
+    for s in subs:
+        s.start()
+    ready.wait(timeout=60)
+    time.sleep(1.0)  # let every server-side subscription register
+
+    expected = args.batches * args.posts_per_batch
+    t0 = time.time()
+    for b in range(args.batches):
+        children = [{"data": {
+            "id": f"{run_tag}-{b}-{i}",
+            "title": f"{run_tag}:{time.time():.6f}",
+            "subreddit": args.subreddit,
+            "created_utc": datetime.now(timezone.utc).timestamp(),
+        }} for i in range(args.posts_per_batch)]
+        requests.post(store_url, json={"data": {"children": children}}, timeout=30).raise_for_status()
+    publish_s = time.time() - t0
+
+    deadline = time.time() + args.drain_secs
+    while time.time() < deadline and any(
+            s.received < expected and not (s.overflowed or s.rejected or s.error) for s in subs):
+        time.sleep(0.2)
+    elapsed = time.time() - t0
+    stop.set()
+
+    delivered = sum(s.received for s in subs)
+    lat = [x for s in subs for x in s.latencies]
+    print(json.dumps({
+        "subscribers": args.subscribers,
+        "events_published": expected,
+        "publish_s": round(publish_s, 3),
+        "deliveries_expected": expected * sum(1 for s in subs if not s.rejected),
+        "deliveries": delivered,
+        "deliveries_per_s": round(delivered / elapsed, 1) if elapsed else None,
+        "complete_subscribers": sum(1 for s in subs if s.received >= expected),
+        "overflowed_subscribers": sum(1 for s in subs if s.overflowed),
+        "rejected_subscribers": sum(1 for s in subs if s.rejected),
+        "errored_subscribers": sum(1 for s in subs if s.error),
+        "latency_ms": {
+            "p50": round(_percentile(lat, 0.50) * 1000, 1) if lat else None,
+            "p99": round(_percentile(lat, 0.99) * 1000, 1) if lat else None,
+            "max": round(max(lat) * 1000, 1) if lat else None,
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
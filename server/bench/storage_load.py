@@ -0,0 +1,234 @@
+# server/bench/storage_load.py
+"""
+Load test: storage_service WSGI (Flask + gunicorn, gthread workers as in the
+Procfile) vs ASGI (Starlette + async PyMongo), both against the same mongod.
+
+With --spawn, both servers are started here with the same worker count:
+  gunicorn --workers N --worker-class gthread --threads T storage_service.app:app  (port 5101)
+  uvicorn  --workers N storage_service.asgi:app                                   (port 5102)
+on a throwaway mongod (--mongod binary, temp dbpath), or on --mongo-uri, whose
+database name must contain "bench". MONGODB_URI is never read. Otherwise point
+--wsgi / --asgi at servers you started yourself; they are not seeded (pass
+--skip-seed), since their database can't be checked from here.
+
+For each concurrency level, closed-loop clients hit a read/write mix of
+/posts/recent, /posts/pending, /summary and /store-sentiment for --duration
+seconds. Prints one JSON document with requests/sec and p50/p95/p99 per target.
+
+  python -m bench.storage_load --spawn --concurrency 16,64,256
+  MONGODB_TLS=false python -m bench.storage_load --spawn \\
+      --mongo-uri mongodb://127.0.0.1:27017/load_bench --worker-class sync --threads 1
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+from pymongo import MongoClient
+
+from bench.mongo import bench_db, start_mongod
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUBREDDITS = ["technology", "worldnews", "football", "books", "startups"]
+
+# (weight, method, path-builder)
+MIX = [
+    (40, "GET", lambda rng: f"/posts/recent?limit=20&subreddit={rng.choice(SUBREDDITS)}"),
+    (20, "GET", lambda rng: "/posts/pending?limit=50"),
+    (20, "GET", lambda rng: f"/summary?subreddit={rng.choice(SUBREDDITS)}"),
+    (20, "POST", lambda rng: "/store-sentiment"),
+]
+
+
+def _percentile(vals: list[float], q: float) -> float | None:
+    if not vals:
+        return None
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(round(q * (len(vals) - 1))))]
+
+
+def _sentiment_body(rng: random.Random, n_posts: int) -> dict:
+    comp = round(rng.uniform(-1, 1), 4)
+    return {"results": [{
+        "post_id": f"load{rng.randrange(n_posts):07d}",
+        "polarity": "positive" if comp >= 0.05 else "negative" if comp <= -0.05 else "neutral",
+        "compound": comp, "pos": 0.3, "neu": 0.5, "neg": 0.2,
+    }]}
+
+
+async def seed(base: str, n_posts: int) -> None:
+    rng = random.Random(1)
+    async with httpx.AsyncClient(base_url=base, timeout=60) as c:
+        for lo in range(0, n_posts, 500):
+            children = [{"data": {
+                "id": f"load{i:07d}",
+                "title": f"synthetic post {i}",
+                "subreddit": rng.choice(SUBREDDITS),
+                "score": rng.randint(0, 5000),
+                "created_utc": time.time() - rng.randint(0, 7 * 86400),
+            }} for i in range(lo, min(lo + 500, n_posts))]
+            r = await c.post("/store-posts", json={"data": {"children": children}})
+            r.raise_for_status()
+
+
+async def run_level(base: str, concurrency: int, duration: float, n_posts: int) -> dict:
+    weights = [w for w, _, _ in MIX]
+    lat: list[float] = []
+    errors = 0
+    stop_at = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base, timeout=30, limits=limits) as client:
+        async def worker(seed_: int):
+            nonlocal errors
+            rng = random.Random(seed_)
+            while time.perf_counter() < stop_at:
+                _, method, path = rng.choices(MIX, weights)[0]
+                t0 = time.perf_counter()
+                try:
+                    if method == "GET":
+                        r = await client.get(path(rng))
+                    else:
+                        r = await client.post(path(rng), json=_sentiment_body(rng, n_posts))
+                    if r.status_code >= 400:
+                        errors += 1
+                        continue
+                except Exception:
+                    errors += 1
+                    continue
+                lat.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    return {
+        "concurrency": concurrency,
+        "requests": len(lat),
+        "errors": errors,
+        "rps": round(len(lat) / elapsed, 1),
+        "p50_ms": ms(_percentile(lat, 0.50)),
+        "p95_ms": ms(_percentile(lat, 0.95)),
+        "p99_ms": ms(_percentile(lat, 0.99)),
+        "max_ms": ms(max(lat) if lat else None),
+    }
+
+
+def spawn(args, mongo_uri: str, env_extra: dict) -> tuple[list[subprocess.Popen], str, str]:
+    env = {**os.environ, **env_extra, "MONGODB_URI": mongo_uri}
+    wsgi_port, asgi_port = 5101, 5102
+    workers = args.workers
+    procs = [
+        subprocess.Popen(
+            ["gunicorn", "--workers", str(workers), "--worker-class", args.worker_class,
+             "--threads", str(args.threads), "--bind", f"127.0.0.1:{wsgi_port}",
+             "storage_service.app:app"],
+            cwd=SERVER_DIR, env=env,
+        ),
+        subprocess.Popen(
+            ["uvicorn", "storage_service.asgi:app", "--workers", str(workers),
+             "--host", "127.0.0.1", "--port", str(asgi_port), "--log-level", "warning"],
+            cwd=SERVER_DIR, env=env,
+        ),
+    ]
+    urls = f"http://127.0.0.1:{wsgi_port}", f"http://127.0.0.1:{asgi_port}"
+    deadline = time.time() + 30
+    for url in urls:
+        while True:
+            try:
+                if httpx.get(f"{url}/ping", timeout=1).status_code == 200:
+                    break
+            except Exception:
+                pass
+            if time.time() > deadline:
+                for p in procs:
+                    p.terminate()
+                raise RuntimeError(f"{url} did not come up")
+            time.sleep(0.3)
+    return procs, *urls
+
+
+async def main_async(args) -> dict:
+    procs = []
+    workdir = tempfile.mkdtemp(prefix="storage-load-")
+    wsgi, asgi = args.wsgi, args.asgi
+    try:
+        if args.spawn:
+            if args.mongo_uri:
+                mongo_uri, env_extra = args.mongo_uri, {}
+                if not args.skip_seed:
+                    with MongoClient(mongo_uri, serverSelectionTimeoutMS=10000) as client:
+                        client.drop_database(bench_db(mongo_uri))
+            else:
+                mongod, mongo_uri = start_mongod(args.mongod, workdir, "load_bench")
+                procs.append(mongod)
+                env_extra = {"MONGODB_TLS": "false"}
+            servers, wsgi, asgi = spawn(args, mongo_uri, env_extra)
+            procs = servers + procs  # stop the servers before their mongod
+
+        targets = {k: v for k, v in (("wsgi", wsgi), ("asgi", asgi)) if v}
+        if not args.skip_seed:
+            await seed(next(iter(targets.values())), args.posts)
+
+        levels = [int(c) for c in args.concurrency.split(",")]
+        out = {
+            "posts": args.posts, "duration_s": args.duration,
+            "workers": args.workers, "worker_class": args.worker_class, "threads": args.threads,
+            "mongo": ("external" if args.mongo_uri else "spawned") if args.spawn else None,
+            "results": {},
+        }
+        for name, base in targets.items():
+            await run_level(base, min(levels), 2.0, args.posts)  # warm-up
+            out["results"][name] = [await run_level(base, c, args.duration, args.posts) for c in levels]
+        return out
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--wsgi", help="base URL of the Flask storage_service (e.g. http://127.0.0.1:8000/storage)")
+    ap.add_argument("--asgi", help="base URL of the ASGI storage_service (e.g. http://127.0.0.1:8001)")
+    ap.add_argument("--spawn", action="store_true", help="start both servers locally")
+    ap.add_argument("--workers", type=int, default=3)
+    ap.add_argument("--worker-class", default="gthread", help="gunicorn worker class for --spawn (Procfile: gthread)")
+    ap.add_argument("--threads", type=int, default=100, help="gunicorn threads per worker for --spawn (Procfile: 100)")
+    ap.add_argument("--mongod", default="mongod", help="mongod binary for the throwaway instance")
+    ap.add_argument("--mongo-uri", help="with --spawn, use this database instead (it is DROPPED first; "
+                                        "the name must contain 'bench')")
+    ap.add_argument("--concurrency", default="16,64,256")
+    ap.add_argument("--duration", type=float, default=15.0)
+    ap.add_argument("--posts", type=int, default=20_000)
+    ap.add_argument("--skip-seed", action="store_true")
+    args = ap.parse_args()
+    if not (args.spawn or args.wsgi or args.asgi):
+        ap.error("pass --spawn or at least one of --wsgi / --asgi")
+    if args.mongo_uri:
+        if not args.spawn:
+            ap.error("--mongo-uri only applies to --spawn")
+        try:
+            bench_db(args.mongo_uri)
+        except ValueError as e:
+            ap.error(str(e))
+    if not args.spawn and not args.skip_seed:
+        ap.error("seeding writes into whatever database the servers use; "
+                 "use --spawn (throwaway or --mongo-uri bench database) or pass --skip-seed")
+    if args.spawn and not args.mongo_uri and args.skip_seed:
+        ap.error("--skip-seed needs --mongo-uri (a throwaway mongod starts empty)")
+
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+# server/gunicorn.conf.py
+"""
+gunicorn settings for the root app (Procfile). Worker count and class stay on
+the command line; this file only sets up Prometheus multiprocess mode so
+/metrics merges every worker (see telemetry.py).
+"""
+import os
+import glob
+import tempfile
+
+# Read by prometheus_client at import, so it has to be in the environment
+# before the workers load the app. Keep a dir the caller chose (bench/e2e.py).
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="prometheus-")
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = PROMETHEUS_MULTIPROC_DIR
+
+
+def on_starting(server):
+    # Files left by a previous master would be merged into this one's counts
+    for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "*.db")):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,20 +1,39 @@
 # server/reddit_service/app.py
 import os, random, string, requests
 from flask import Flask, jsonify, request, redirect
-from .reddit_api import make_authenticated_request, fetch_all_subreddits
+from .reddit_api import (
+    fetch_top_posts,
+    fetch_all_subreddits,
+    send_to_storage_service,
+    STORE_POSTS_URL,
+)
+from .spool import get_drainer, peek as peek_spool, resume_pending
+from telemetry import instrument_flask, gauge_callback
+from .comments import fetch_and_store_comments
 
-STORAGE_SERVICE_URL = os.getenv("STORAGE_SERVICE_URL")  # e.g. http://127.0.0.1:8000/storage
 CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 REDIRECT_URI = os.getenv("REDIRECT_URI")
 USER_AGENT = os.getenv("USER_AGENT")
-TOKEN_URL = "https://www.reddit.com/api/v1/access_token"
+TOKEN_URL = os.getenv("REDDIT_TOKEN_URL", "https://www.reddit.com/api/v1/access_token")
 
 # Optional: existing tokens if you’ve set them as env vars
 ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
 REFRESH_TOKEN = os.getenv("REFRESH_TOKEN")
 
 app = Flask(__name__)
+instrument_flask(app, "reddit")
+
+def _spool_stat(key):
+    # Scrapes must not create the spool or start a drainer; no spool, no gauge
+    return lambda: (peek_spool() or {}).get(key)
+
+gauge_callback("spool_depth", "Fetched payloads waiting in the local spool", _spool_stat("depth"))
+gauge_callback("spool_oldest_age_seconds", "Age of the oldest undrained spool payload", _spool_stat("oldest_age_s"))
+gauge_callback("spool_drain_rate", "Spool payloads drained per second (EWMA)", _spool_stat("drain_rate_per_s"))
+
+# Payloads left behind by a restart or deploy drain now, not on the next fetch
+resume_pending(STORE_POSTS_URL)
 
 @app.route("/")
 def root():
@@ -89,21 +108,33 @@ def get_reddit_posts():
     subreddit = request.args.get("subreddit", "python")
     limit = request.args.get("limit", 20)
 
-    url = f"https://oauth.reddit.com/r/{subreddit}/top?limit={limit}"
-    posts = make_authenticated_request(url)  # Reddit API response (Listing)
+    posts = fetch_top_posts(subreddit, limit)  # Reddit API response (Listing)
 
-    # Forward to storage_service for persistence (non-fatal if it fails)
+    # Spool for storage_service (drained in the background; never blocks this request)
     stored = None
-    if STORAGE_SERVICE_URL:
-        try:
-            r = requests.post(f"{STORAGE_SERVICE_URL}/store-posts", json=posts, timeout=10)
-            r.raise_for_status()
-            stored = r.json()
-        except Exception as e:
-            print(f"❌ Failed to store posts via storage_service: {e}", flush=True)
+    if not (isinstance(posts, dict) and "error" in posts):
+        stored = send_to_storage_service(posts)
 
     return jsonify({"data": posts, "store_result": stored}), 200
 
+@app.route("/comments", methods=["GET"])
+def get_post_comments():
+    """Walk a post's comment tree (expanding `more` stubs) and persist it via storage_service."""
+    post_id = request.args.get("post_id")
+    if not post_id:
+        return jsonify({"error": "post_id is required"}), 400
+    more_budget = request.args.get("more_budget", default=None, type=int)
+    max_comments = request.args.get("max_comments", default=None, type=int)
+
+    result = fetch_and_store_comments(post_id, more_budget=more_budget, max_comments=max_comments)
+    status = 502 if result.get("error") else 200
+    return jsonify(result), status
+
+@app.route("/spool/stats", methods=["GET"])
+def spool_stats():
+    """Spool depth, oldest pending age and drain rate."""
+    return jsonify(get_drainer(STORE_POSTS_URL).stats()), 200
+
 @app.route("/fetch-all", methods=["GET"])
 def fetch_all():
     """Fetch top posts from all predefined subreddits."""
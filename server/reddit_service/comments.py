@@ -0,0 +1,181 @@
+# reddit_service/comments.py
+import os
+from collections import deque
+from urllib.parse import urlencode
+
+import requests
+
+from .reddit_api import make_authenticated_request, reddit_url, _svc_url, _safe_body
+from telemetry import timed
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Comment ingestion configuration
+# ──────────────────────────────────────────────────────────────────────────────
+# Max number of extra Reddit calls (morechildren / "continue this thread") per post
+COMMENT_MORE_BUDGET = int(os.getenv("COMMENT_MORE_BUDGET", "10"))
+# Hard cap on comments walked per post (0 = unlimited)
+COMMENT_MAX_PER_POST = int(os.getenv("COMMENT_MAX_PER_POST", "0"))
+# How many comments are buffered before a bulk write to storage_service
+COMMENT_BATCH_SIZE = int(os.getenv("COMMENT_BATCH_SIZE", "500"))
+# Reddit accepts at most 100 ids per /api/morechildren call
+MORECHILDREN_CHUNK = 100
+
+STORE_COMMENTS_URL = _svc_url("/store-comments")
+
+
+def _short_id(fullname: str | None) -> str | None:
+    """'t3_abc123' -> 'abc123' (matches Post.post_id)."""
+    if not fullname:
+        return None
+    return fullname.split("_", 1)[1] if "_" in fullname else fullname
+
+
+def _normalize(d: dict) -> dict:
+    return {
+        "comment_id": d.get("id"),
+        "post_id": _short_id(d.get("link_id")),
+        "parent_id": d.get("parent_id"),
+        "subreddit": d.get("subreddit"),
+        "author": d.get("author"),
+        "body": d.get("body"),
+        "score": d.get("score"),
+        "depth": d.get("depth"),
+        "created_utc": d.get("created_utc"),
+    }
+
+
+def _is_error(resp) -> bool:
+    return isinstance(resp, dict) and "error" in resp
+
+
+def _comments_listing_children(resp) -> list:
+    """/comments/{id} returns [post_listing, comments_listing]."""
+    if isinstance(resp, list) and len(resp) > 1:
+        return ((resp[1] or {}).get("data") or {}).get("children") or []
+    return []
+
+
+def iter_comments(post_id: str, more_budget: int | None = None, max_comments: int | None = None):
+    """
+    Yield normalized comments for a post, depth-first, without building the tree.
+
+    The walk is iterative (explicit stack), so deep threads never hit the
+    recursion limit, and each node's `replies` are detached as soon as they
+    are pushed, so only the not-yet-visited frontier stays referenced.
+    `more` stubs are queued and expanded afterwards, spending at most
+    `more_budget` extra Reddit calls; whatever is left over is reported back
+    via the generator's return value as {"unexpanded": <ids>}.
+    """
+    post_id = _short_id(post_id)
+    budget = COMMENT_MORE_BUDGET if more_budget is None else max(0, int(more_budget))
+    cap = COMMENT_MAX_PER_POST if max_comments is None else max(0, int(max_comments))
+
+    resp = make_authenticated_request(reddit_url(f"/comments/{post_id}?raw_json=1"), operation="comments")
+    if _is_error(resp):
+        raise RuntimeError(f"Failed to fetch comments for {post_id}: {resp}")
+
+    stack = list(reversed(_comments_listing_children(resp)))
+    del resp
+
+    more_ids: deque[str] = deque()        # ids from `more` stubs (morechildren)
+    continue_parents: deque[str] = deque()  # parents of "continue this thread" stubs
+    emitted = 0
+
+    while True:
+        while stack:
+            node = stack.pop() or {}
+            kind = node.get("kind")
+            d = node.get("data") or {}
+
+            if kind == "t1":
+                replies = d.pop("replies", None)
+                yield _normalize(d)
+                emitted += 1
+                if cap and emitted >= cap:
+                    return {"unexpanded": len(more_ids) + len(continue_parents)}
+                if isinstance(replies, dict):
+                    children = (replies.get("data") or {}).get("children") or []
+                    stack.extend(reversed(children))
+            elif kind == "more":
+                ids = d.get("children") or []
+                if ids:
+                    more_ids.extend(ids)
+                elif d.get("parent_id"):
+                    continue_parents.append(d["parent_id"])
+
+        if budget <= 0 or not (more_ids or continue_parents):
+            break
+        budget -= 1
+
+        if more_ids:
+            chunk = [more_ids.popleft() for _ in range(min(MORECHILDREN_CHUNK, len(more_ids)))]
+            qs = urlencode({
+                "api_type": "json",
+                "link_id": f"t3_{post_id}",
+                "children": ",".join(chunk),
+                "limit_children": "false",
+                "raw_json": 1,
+            })
+            resp = make_authenticated_request(reddit_url(f"/api/morechildren?{qs}"), operation="morechildren")
+            if _is_error(resp):
+                print(f"⚠️ morechildren failed for {post_id}: {resp}", flush=True)
+                continue
+            things = (((resp.get("json") or {}).get("data") or {}).get("things")) or []
+            # morechildren returns a flat list in tree order; keep that order
+            stack.extend(reversed(things))
+        else:
+            parent = _short_id(continue_parents.popleft())
+            resp = make_authenticated_request(
+                reddit_url(f"/comments/{post_id}?comment={parent}&raw_json=1"), operation="comments"
+            )
+            if _is_error(resp):
+                print(f"⚠️ continue-thread fetch failed for {post_id}/{parent}: {resp}", flush=True)
+                continue
+            # First child is the parent comment we've already emitted; walk its replies only
+            for child in _comments_listing_children(resp):
+                replies = ((child or {}).get("data") or {}).get("replies")
+                if isinstance(replies, dict):
+                    stack.extend(reversed((replies.get("data") or {}).get("children") or []))
+        del resp
+
+    return {"unexpanded": len(more_ids) + len(continue_parents)}
+
+
+def _store_batch(batch: list[dict]) -> int:
+    with timed("storage", "store-comments"):
+        r = requests.post(STORE_COMMENTS_URL, json={"comments": batch}, timeout=30)
+    if r.status_code not in (200, 201):
+        raise RuntimeError(f"store-comments failed: {r.status_code}, {_safe_body(r)}")
+    return int((r.json() or {}).get("count") or 0)
+
+
+def fetch_and_store_comments(post_id: str, more_budget: int | None = None, max_comments: int | None = None) -> dict:
+    """
+    Stream a post's comments into storage_service in bounded batches.
+    Memory is O(COMMENT_BATCH_SIZE + unvisited frontier), not O(thread size).
+    """
+    print(f"💬 Fetching comments for post {post_id}...")
+    batch: list[dict] = []
+    walked = stored = 0
+    unexpanded = 0
+
+    gen = iter_comments(post_id, more_budget=more_budget, max_comments=max_comments)
+    try:
+        while True:
+            try:
+                c = next(gen)
+            except StopIteration as stop:
+                unexpanded = (stop.value or {}).get("unexpanded", 0)
+                break
+            walked += 1
+            batch.append(c)
+            if len(batch) >= COMMENT_BATCH_SIZE:
+                stored += _store_batch(batch)
+                batch = []
+        if batch:
+            stored += _store_batch(batch)
+    except Exception as e:
+        print(f"❌ Comment ingestion failed for {post_id}: {e}", flush=True)
+        return {"post_id": _short_id(post_id), "walked": walked, "stored": stored, "error": str(e)}
+
+    return {"post_id": _short_id(post_id), "walked": walked, "stored": stored, "unexpanded_more": unexpanded}
@@ -4,6 +4,9 @@ import json
 from pathlib import Path
 import requests
 
+from .spool import enqueue
+from telemetry import timed, POSTS_FETCHED
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Reddit / App configuration (read only from environment)
 # ──────────────────────────────────────────────────────────────────────────────
@@ -12,13 +15,23 @@ CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 USER_AGENT = os.getenv("USER_AGENT") or "reddit-sentiment-app/0.1"
 ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
 REFRESH_TOKEN = os.getenv("REFRESH_TOKEN")
-TOKEN_URL = "https://www.reddit.com/api/v1/access_token"
+
+# Reddit API base + token endpoint (override to point at a local stub / recorded fixtures)
+TOKEN_URL = os.getenv("REDDIT_TOKEN_URL", "https://www.reddit.com/api/v1/access_token")
+REDDIT_API_BASE = os.getenv("REDDIT_API_BASE", "https://oauth.reddit.com")
+
+def reddit_url(path: str) -> str:
+    return f"{REDDIT_API_BASE.rstrip('/')}/{path.lstrip('/')}"
 
 # Storage service base:
 #   • EB (single env):  STORAGE_BASE_URL=http://127.0.0.1:8000/storage
 #   • Public domain:    STORAGE_BASE_URL=http://<your-eb-domain>/storage
 #   • Local/Docker:     defaults to http://storage_service:5002
-STORAGE_BASE = os.getenv("STORAGE_BASE_URL", "http://storage_service:5002")
+STORAGE_BASE = (
+    os.getenv("STORAGE_BASE_URL")
+    or os.getenv("STORAGE_SERVICE_URL")  # older name used by /reddit-posts
+    or "http://storage_service:5002"
+)
 
 def _svc_url(path: str) -> str:
     return f"{STORAGE_BASE.rstrip('/')}/{path.lstrip('/')}"
@@ -96,7 +109,8 @@ def refresh_access_token():
     headers = {"User-Agent": USER_AGENT}
 
     try:
-        response = requests.post(TOKEN_URL, auth=auth, data=data, headers=headers, timeout=20)
+        with timed("reddit", "token"):
+            response = requests.post(TOKEN_URL, auth=auth, data=data, headers=headers, timeout=20)
     except Exception as e:
         print(f"❌ Token refresh network error: {e}")
         return None
@@ -113,8 +127,11 @@ def refresh_access_token():
         print(f"❌ Failed to refresh access token: {response.status_code}, {details}")
         return None
 
-def make_authenticated_request(url):
-    """Make an authenticated GET to Reddit API, with auto-refresh on 401."""
+def make_authenticated_request(url, operation="api"):
+    """
+    Make an authenticated GET to Reddit API, with auto-refresh on 401.
+    `operation` only labels the call's latency metric (keep it low-cardinality).
+    """
     global ACCESS_TOKEN
 
     if not ACCESS_TOKEN:
@@ -125,7 +142,8 @@ def make_authenticated_request(url):
 
     headers = {"Authorization": f"Bearer {ACCESS_TOKEN}", "User-Agent": USER_AGENT}
     try:
-        response = requests.get(url, headers=headers, timeout=20)
+        with timed("reddit", operation):
+            response = requests.get(url, headers=headers, timeout=20)
     except Exception as e:
         return {"error": f"Network error: {e}"}
 
@@ -135,7 +153,8 @@ def make_authenticated_request(url):
         if new_token:
             headers["Authorization"] = f"Bearer {new_token}"
             try:
-                response = requests.get(url, headers=headers, timeout=20)
+                with timed("reddit", operation):
+                    response = requests.get(url, headers=headers, timeout=20)
             except Exception as e:
                 return {"error": f"Network error after refresh: {e}"}
         else:
@@ -169,20 +188,24 @@ def fetch_top_posts(subreddit, limit=20):
     except Exception:
         limit = 20
     print(f"🔍 Fetching top {limit} posts from r/{subreddit}...")
-    url = f"https://oauth.reddit.com/r/{subreddit}/top?limit={limit}"
-    return make_authenticated_request(url)
+    url = reddit_url(f"/r/{subreddit}/top?limit={limit}")
+    posts = make_authenticated_request(url, operation="top")
+    if isinstance(posts, dict):
+        POSTS_FETCHED.inc(len((posts.get("data") or {}).get("children") or []))
+    return posts
 
 def send_to_storage_service(data):
-    """Send fetched posts to the storage service (non-fatal on failure)."""
+    """
+    Spool fetched posts for delivery to the storage service.
+    Returns immediately; the spool drainer retries until storage accepts them.
+    """
     try:
-        print(f"📤 Sending data to storage service at {STORE_POSTS_URL} ...")
-        r = requests.post(STORE_POSTS_URL, json=data, timeout=30)
-        if r.status_code in (200, 201):
-            print("🚀 Successfully stored posts in storage service!")
-        else:
-            print(f"❌ Failed to store posts: {r.status_code}, {_safe_body(r)}")
+        spool_id = enqueue(data, STORE_POSTS_URL)
+        print(f"📥 Spooled posts for storage service (spool id {spool_id})")
+        return {"spooled": True, "spool_id": spool_id}
     except Exception as e:
-        print(f"❌ Error connecting to storage service: {e}")
+        print(f"❌ Failed to spool posts: {e}")
+        return {"spooled": False, "error": str(e)}
 
 def fetch_all_subreddits():
     """
@@ -0,0 +1,404 @@
+# reddit_service/spool.py
+"""
+Durable local spool between reddit_service and storage_service.
+
+Fetched listings are appended to an SQLite file as soon as they arrive, and a
+background drainer replays them to /store-posts in batches, with exponential
+backoff while storage is slow or down. The drain offset is checkpointed in
+the same file, so nothing is lost across restarts; a lease keeps gunicorn's
+workers from draining the same rows concurrently.
+
+Payloads storage_service rejects outright (4xx) are moved to a quarantine
+table instead of being retried forever; 5xx and network errors back off.
+After SPOOL_POISON_ATTEMPTS failures on the same head batch, payloads go one
+at a time, and a head that fails while the payload behind it succeeds is
+quarantined too, so one bad payload can't block the queue.
+"""
+import os
+import json
+import time
+import random
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+
+import requests
+
+from telemetry import timed
+
+SPOOL_PATH = os.getenv("REDDIT_SPOOL_PATH") or str(Path(__file__).resolve().parent / "spool.sqlite3")
+SPOOL_DRAIN_BATCH = int(os.getenv("SPOOL_DRAIN_BATCH", "20"))       # spooled payloads per POST
+SPOOL_POLL_SECS = float(os.getenv("SPOOL_POLL_SECS", "1.0"))
+SPOOL_BACKOFF_MAX_SECS = float(os.getenv("SPOOL_BACKOFF_MAX_SECS", "60"))
+SPOOL_POST_TIMEOUT = float(os.getenv("SPOOL_POST_TIMEOUT", "30"))
+# Outlives a POST that runs to its timeout, so the lease can't lapse mid-batch
+# and let another worker send the same rows; it is renewed before every batch.
+LEASE_SECS = 2 * SPOOL_POST_TIMEOUT + 30
+RETRYABLE_4XX = (408, 425, 429)   # client-side statuses that are worth retrying
+# Failed attempts on the same head batch before its payloads are sent one by
+# one to find a payload storage_service can never take (e.g. one that 500s).
+SPOOL_POISON_ATTEMPTS = int(os.getenv("SPOOL_POISON_ATTEMPTS", "5"))
+
+
+class Rejected(Exception):
+    """storage_service refused the payload; retrying the same bytes won't help."""
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"store-posts returned {status}: {text[:200]}")
+        self.status = status
+
+
+class Spool:
+    def __init__(self, path: str = SPOOL_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS spool ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " enqueued_at REAL NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoint ("
+                " name TEXT PRIMARY KEY,"
+                " offset INTEGER NOT NULL DEFAULT 0,"
+                " lease_owner TEXT,"
+                " lease_until REAL NOT NULL DEFAULT 0,"
+                " drain_rate REAL NOT NULL DEFAULT 0,"   # shared by every worker, not
+                " drained_at REAL)"                      # just the one holding the lease
+            )
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS quarantine ("
+                " id INTEGER PRIMARY KEY,"
+                " enqueued_at REAL NOT NULL,"
+                " quarantined_at REAL NOT NULL,"
+                " status INTEGER,"
+                " error TEXT,"
+                " payload TEXT NOT NULL)"
+            )
+            c.execute("INSERT OR IGNORE INTO checkpoint (name, offset) VALUES ('drain', 0)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ── producer side ─────────────────────────────────────────────────────
+    def append(self, payload) -> int:
+        """Persist one fetched payload; returns its spool id."""
+        cur = self._conn().execute(
+            "INSERT INTO spool (enqueued_at, payload) VALUES (?, ?)",
+            (time.time(), json.dumps(payload, separators=(",", ":"))),
+        )
+        return cur.lastrowid
+
+    # ── consumer side ─────────────────────────────────────────────────────
+    def offset(self) -> int:
+        row = self._conn().execute("SELECT offset FROM checkpoint WHERE name='drain'").fetchone()
+        return row[0] if row else 0
+
+    def acquire_lease(self, owner: str) -> bool:
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE checkpoint SET lease_owner=?, lease_until=? "
+            "WHERE name='drain' AND (lease_owner=? OR lease_until<?)",
+            (owner, now + LEASE_SECS, owner, now),
+        )
+        return cur.rowcount == 1
+
+    def read_batch(self, limit: int = SPOOL_DRAIN_BATCH) -> list[tuple[int, object]]:
+        rows = self._conn().execute(
+            "SELECT id, payload FROM spool WHERE id > ? ORDER BY id LIMIT ?",
+            (self.offset(), limit),
+        ).fetchall()
+        return [(i, json.loads(p)) for i, p in rows]
+
+    def commit(self, offset: int, rate: float | None = None) -> None:
+        """
+        Advance the checkpoint and drop everything at or below it. `rate`
+        (payloads/sec for the batch just sent) is folded into the shared EWMA.
+        """
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute("UPDATE checkpoint SET offset=MAX(offset, ?) WHERE name='drain'", (offset,))
+            if rate is not None:
+                c.execute(
+                    "UPDATE checkpoint SET drained_at=?, drain_rate="
+                    "CASE WHEN drain_rate > 0 THEN 0.8 * drain_rate + 0.2 * ? ELSE ? END "
+                    "WHERE name='drain'",
+                    (time.time(), rate, rate),
+                )
+            c.execute("DELETE FROM spool WHERE id <= ?", (offset,))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+
+    def quarantine(self, spool_id: int, status: int | None, error: str) -> None:
+        """Move one payload out of the drain path (kept for inspection/replay)."""
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.execute(
+                "INSERT OR REPLACE INTO quarantine (id, enqueued_at, quarantined_at, status, error, payload) "
+                "SELECT id, enqueued_at, ?, ?, ?, payload FROM spool WHERE id = ?",
+                (time.time(), status, error[:1000], spool_id),
+            )
+            c.execute("UPDATE checkpoint SET offset=MAX(offset, ?) WHERE name='drain'", (spool_id,))
+            c.execute("DELETE FROM spool WHERE id <= ?", (spool_id,))
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+
+    def drain_rate(self) -> tuple[float, float | None]:
+        """(payloads/sec EWMA, time of the last drained batch), across all workers."""
+        row = self._conn().execute("SELECT drain_rate, drained_at FROM checkpoint WHERE name='drain'").fetchone()
+        return (row[0], row[1]) if row else (0.0, None)
+
+    def quarantined(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM quarantine").fetchone()[0]
+
+    def depth(self) -> tuple[int, float | None]:
+        """(pending payloads, age in seconds of the oldest one)."""
+        n, oldest = self._conn().execute(
+            "SELECT COUNT(*), MIN(enqueued_at) FROM spool WHERE id > ?", (self.offset(),)
+        ).fetchone()
+        return n, (time.time() - oldest) if oldest else None
+
+
+class Drainer(threading.Thread):
+    """Replays spooled payloads to storage_service with retry + backoff."""
+
+    def __init__(self, spool: Spool, url: str, batch_size: int = SPOOL_DRAIN_BATCH):
+        super().__init__(name="spool-drainer", daemon=True)
+        self.spool = spool
+        self.url = url
+        self.batch_size = batch_size
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.wake = threading.Event()
+        self.stop = threading.Event()
+
+        self.appended = 0
+        self.drained_payloads = 0
+        self.drained_posts = 0
+        self.failures = 0
+        self.rejected = 0
+        self.consecutive_failures = 0
+        self.last_error: str | None = None
+        self._head: int | None = None        # first spool id of the batch being retried
+        self._head_failures = 0
+        self._isolate_through = 0            # send singly up to this id (poison hunt)
+
+    def notify(self) -> None:
+        self.appended += 1
+        self.wake.set()
+
+    def _post(self, batch: list[tuple[int, object]]) -> int:
+        # Keyed by spool id so storage_service's listing walker sees each payload as-is
+        body = {str(i): payload for i, payload in batch}
+        with timed("storage", "store-posts"):
+            r = requests.post(self.url, json=body, timeout=SPOOL_POST_TIMEOUT)
+        if 400 <= r.status_code < 500 and r.status_code not in RETRYABLE_4XX:
+            raise Rejected(r.status_code, r.text)
+        if r.status_code not in (200, 201):
+            raise RuntimeError(f"store-posts returned {r.status_code}: {r.text[:200]}")
+        try:
+            return int((r.json() or {}).get("count") or 0)
+        except Exception:
+            return 0
+
+    def drain_once(self) -> int:
+        """Push one batch; returns number of payloads drained (0 if idle or not leaseholder)."""
+        if not self.spool.acquire_lease(self.owner):
+            return 0
+        batch = self.spool.read_batch(self.batch_size)
+        if not batch:
+            return 0
+        if batch[0][0] <= self._isolate_through:
+            return self._drain_isolated(batch[:2])
+        if batch[0][0] != self._head:
+            self._head, self._head_failures = batch[0][0], 0
+
+        started = time.time()
+        try:
+            posts = self._post(batch)
+        except Rejected as e:
+            if len(batch) > 1:
+                return self._drain_singly(batch)
+            self._quarantine(batch[0][0], e.status, str(e))
+            return 1
+        except Exception:
+            self._head_failures += 1
+            if self._head_failures >= SPOOL_POISON_ATTEMPTS:
+                self._isolate_through = batch[-1][0]
+            raise
+        self.spool.commit(batch[-1][0], len(batch) / max(time.time() - started, 1e-6))
+        self.drained_payloads += len(batch)
+        self.drained_posts += posts
+        return len(batch)
+
+    def _drain_singly(self, batch: list[tuple[int, object]]) -> int:
+        """
+        A batch was rejected: send its payloads one by one so only the bad
+        ones are quarantined. A transient error stops here (the good payloads
+        so far are committed) and leaves the rest to the normal retry path.
+        Returns how many payloads it committed or quarantined.
+        """
+        handled = 0
+        for spool_id, payload in batch:
+            if not self.spool.acquire_lease(self.owner):  # renew per POST
+                break
+            started = time.time()
+            try:
+                posts = self._post([(spool_id, payload)])
+            except Rejected as e:
+                self._quarantine(spool_id, e.status, str(e))
+                handled += 1
+                continue
+            self.spool.commit(spool_id, 1 / max(time.time() - started, 1e-6))
+            self.drained_payloads += 1
+            self.drained_posts += posts
+            handled += 1
+        return handled
+
+    def _drain_isolated(self, pair: list[tuple[int, object]]) -> int:
+        """
+        The head batch kept failing. Send the head alone; if it fails while
+        the payload behind it goes through, storage is up and the head is the
+        problem, so quarantine it. If both fail it's an outage: raise and back off.
+        """
+        (head_id, head), rest = pair[0], pair[1:]
+        started = time.time()
+        try:
+            posts = self._post([(head_id, head)])
+        except Rejected as e:
+            self._quarantine(head_id, e.status, str(e))
+            return 1
+        except Exception as head_error:
+            if not rest:
+                raise
+            next_id, payload = rest[0]
+            try:
+                posts = self._post([(next_id, payload)])
+            except Rejected as e:
+                # Storage answered, so the head's failure is its own
+                self._quarantine(head_id, None, str(head_error))
+                self._quarantine(next_id, e.status, str(e))
+                return 2
+            self._quarantine(head_id, None, str(head_error))
+            self.spool.commit(next_id, 1 / max(time.time() - started, 1e-6))
+            self.drained_payloads += 1
+            self.drained_posts += posts
+            return 2
+        self.spool.commit(head_id, 1 / max(time.time() - started, 1e-6))
+        self.drained_payloads += 1
+        self.drained_posts += posts
+        return 1
+
+    def _quarantine(self, spool_id: int, status: int | None, error: str) -> None:
+        self.spool.quarantine(spool_id, status, error)
+        self.rejected += 1
+        print(f"🚫 Spool payload {spool_id} quarantined: {error}", flush=True)
+
+    def run(self) -> None:
+        while not self.stop.is_set():
+            try:
+                drained = self.drain_once()
+                self.consecutive_failures = 0
+                if drained:
+                    continue  # keep draining while there's a backlog
+                self.wake.wait(SPOOL_POLL_SECS)
+                self.wake.clear()
+            except Exception as e:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = str(e)
+                delay = min(SPOOL_BACKOFF_MAX_SECS, SPOOL_POLL_SECS * 2 ** self.consecutive_failures)
+                delay *= random.uniform(0.5, 1.0)
+                print(f"⚠️ Spool drain failed ({self.consecutive_failures}x), retrying in {delay:.1f}s: {e}", flush=True)
+                self.stop.wait(delay)
+
+    def stats(self) -> dict:
+        depth, oldest_age = self.spool.depth()
+        rate, drained_at = self.spool.drain_rate()
+        return {
+            "path": self.spool.path,
+            "depth": depth,
+            "oldest_age_s": oldest_age,
+            "offset": self.spool.offset(),
+            "appended": self.appended,
+            "drained_payloads": self.drained_payloads,
+            "drained_posts": self.drained_posts,
+            "drain_rate_per_s": round(rate, 3),
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "quarantined": self.spool.quarantined(),
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_drain_at": drained_at,
+        }
+
+
+_spool: Spool | None = None
+_drainer: Drainer | None = None
+_lock = threading.Lock()
+
+
+def peek(path: str = SPOOL_PATH) -> dict | None:
+    """
+    Depth, oldest age and drain rate read straight from the spool file, for
+    metrics. Read-only: never creates the file or starts a drainer, and
+    returns None when there is no spool yet.
+    """
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=1)
+    try:
+        offset, rate = conn.execute("SELECT offset, drain_rate FROM checkpoint WHERE name='drain'").fetchone()
+        n, oldest = conn.execute(
+            "SELECT COUNT(*), MIN(enqueued_at) FROM spool WHERE id > ?", (offset,)
+        ).fetchone()
+    except (sqlite3.Error, TypeError):
+        return None  # another process is still creating it
+    finally:
+        conn.close()
+    return {
+        "depth": n,
+        "oldest_age_s": (time.time() - oldest) if oldest else None,
+        "drain_rate_per_s": round(rate, 3),
+    }
+
+
+def get_drainer(url: str) -> Drainer:
+    """Process-wide spool + drainer, started on first use (after gunicorn forks)."""
+    global _spool, _drainer
+    with _lock:
+        if _drainer is None or not _drainer.is_alive():
+            _spool = _spool or Spool()
+            _drainer = Drainer(_spool, url)
+            _drainer.start()
+        return _drainer
+
+
+def resume_pending(url: str) -> None:
+    """Start the drainer right away if an earlier process left payloads in the spool."""
+    pending = peek(SPOOL_PATH)
+    if pending and pending["depth"]:
+        print(f"📦 Resuming spool drain ({pending['depth']} payloads pending)", flush=True)
+        get_drainer(url)
+
+
+def enqueue(payload, url: str) -> int:
+    """Durably spool a payload for delivery to `url`; returns the spool id."""
+    drainer = get_drainer(url)
+    spool_id = drainer.spool.append(payload)
+    drainer.notify()
+    return spool_id
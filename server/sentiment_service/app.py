@@ -1,9 +1,12 @@
 # server/sentiment_service/app.py
 import os
 from flask import Flask, jsonify, request
-from .logic import analyze_posts, quick_db_check
+from .logic import analyze_posts, analyze_comments, quick_db_check
+from .consumer import read_stats
+from telemetry import instrument_flask
 
 app = Flask(__name__)
+instrument_flask(app, "sentiment")
 
 @app.route("/")
 def root():
@@ -32,6 +35,32 @@ def get_sentiment_analysis():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/analyze-comments", methods=["GET"])
+def get_comment_sentiment_analysis():
+    try:
+        limit = request.args.get("limit", default=200, type=int)
+        post_id = request.args.get("post_id", default=None, type=str)
+        subreddit = request.args.get("subreddit", default=None, type=str)
+        results, meta = analyze_comments(limit=limit, post_id=post_id, subreddit=subreddit)
+        return jsonify({
+            "message": "Comment sentiment analysis completed!",
+            "meta": meta,
+            "results": results
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/consumer/stats", methods=["GET"])
+def consumer_stats():
+    """Throughput and insert→scored latency last checkpointed by the change-stream consumer."""
+    try:
+        stats = read_stats()
+        if stats is None:
+            return jsonify({"error": "consumer has not checkpointed yet"}), 404
+        return jsonify(stats), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == "__main__":
     # For occasional standalone runs: set env vars in your shell before running.
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=True)
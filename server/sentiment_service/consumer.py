@@ -0,0 +1,244 @@
+# server/sentiment_service/consumer.py
+"""
+Change-stream driven scorer.
+
+Watches the `post` collection for inserts and title changes, scores the new
+titles in micro-batches and writes them through storage_service's
+/store-sentiment (so every downstream hook sees them). After each batch the
+change-stream resume token is checkpointed, so a restart resumes exactly
+where the last stored batch ended.
+
+Requires a replica set (Atlas, or a local single-node `mongod --replSet rs0`).
+
+Run:  python -m sentiment_service.consumer
+"""
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+import requests
+from pymongo import MongoClient
+
+from .logic import _get_sia, _score, _url, BATCH_SIZE
+from .keywords import send_keywords
+from telemetry import timed, POSTS_SCORED
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+CONSUMER_NAME = os.getenv("SENTIMENT_CONSUMER_NAME", "post-scorer")
+CONSUMER_MAX_WAIT_MS = int(os.getenv("SENTIMENT_CONSUMER_MAX_WAIT_MS", "500"))
+CHECKPOINT_COLLECTION = "consumer_checkpoints"
+POST_COLLECTION = "post"          # mongoengine's default name for Post
+IDLE_CHECKPOINT_SECS = 30         # keep the token fresh on quiet streams
+
+# Inserts/replaces, and updates that touch the title. Our own sentiment writes
+# are updates that never touch `title`, so they don't loop back in here.
+PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": {"$in": ["insert", "replace"]}},
+        {"operationType": "update",
+         "updateDescription.updatedFields.title": {"$exists": True}},
+    ]}},
+]
+
+
+def _percentile(sorted_vals: list[float], q: float) -> float | None:
+    if not sorted_vals:
+        return None
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+def _event_time(change: dict) -> float | None:
+    """Commit time of the change (wallTime on MongoDB 6+, else clusterTime seconds)."""
+    wall = change.get("wallTime")
+    if isinstance(wall, datetime):
+        if wall.tzinfo is None:
+            wall = wall.replace(tzinfo=timezone.utc)
+        return wall.timestamp()
+    ct = change.get("clusterTime")
+    return float(ct.time) if ct is not None else None
+
+
+class SentimentConsumer:
+    def __init__(self, uri: str | None = None, name: str = CONSUMER_NAME,
+                 batch_size: int = BATCH_SIZE, max_wait_ms: int = CONSUMER_MAX_WAIT_MS):
+        uri = uri or MONGODB_URI
+        if not uri:
+            raise RuntimeError("MONGODB_URI not set; change-stream consumer needs direct DB access")
+        self.client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+        self.db = self.client.get_default_database("test")  # same fallback as mongoengine
+        self.posts = self.db[POST_COLLECTION]
+        self.checkpoints = self.db[CHECKPOINT_COLLECTION]
+        self.name = name
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+
+        self.scored = 0
+        self.skipped = 0
+        self.batches = 0
+        self._latencies: deque[float] = deque(maxlen=1000)  # insert→scored, seconds
+
+    # ── checkpoint ────────────────────────────────────────────────────────
+    def _load_token(self):
+        doc = self.checkpoints.find_one({"_id": self.name})
+        return (doc or {}).get("resume_token")
+
+    def _save_token(self, token):
+        self.checkpoints.update_one(
+            {"_id": self.name},
+            {"$set": {"resume_token": token, "updated_at": datetime.utcnow(), "stats": self.stats()}},
+            upsert=True,
+        )
+
+    # ── scoring ───────────────────────────────────────────────────────────
+    def _flush(self, batch: list[dict]) -> None:
+        # Score each post's *current* title, once per batch. The event's
+        # fullDocument is the post as inserted, so it can't tell whether a
+        # replayed event was already stored; the live document can: VADER is
+        # deterministic, so a stored compound equal to the fresh one means
+        # this exact title was scored before the last checkpoint landed.
+        events: dict[str, dict] = {}
+        for change in batch:
+            pid = (change.get("fullDocument") or {}).get("post_id")
+            if pid:
+                events.setdefault(pid, change)
+            else:
+                self.skipped += 1
+        current = {
+            d["post_id"]: d
+            for d in self.posts.find(
+                {"post_id": {"$in": list(events)}},
+                {"post_id": 1, "title": 1, "subreddit": 1, "created_utc": 1,
+                 "sentiment_compound": 1, "sentiment_polarity": 1},
+            )
+        }
+
+        sia = _get_sia()
+        results, times, fresh = [], [], []
+        for pid, change in events.items():
+            doc = current.get(pid) or {}
+            title = (doc.get("title") or "").strip()
+            if not title:
+                self.skipped += 1
+                continue
+            scored = _score(sia, title)
+            if doc.get("sentiment_compound") == scored["compound"] and doc.get("sentiment_polarity") == scored["polarity"]:
+                self.skipped += 1
+                continue
+            results.append({"post_id": pid, **scored})
+            times.append(_event_time(change))
+            if doc.get("sentiment_polarity") != scored["polarity"]:
+                fresh.append((doc, scored["polarity"]))
+
+        if results:
+            with timed("storage", "store-sentiment"):
+                r = requests.post(_url("/store-sentiment"), json={"results": results}, timeout=20)
+            r.raise_for_status()
+            send_keywords(_url("/store-keywords"), fresh)
+
+        POSTS_SCORED.labels("consumer").inc(len(results))
+        now = time.time()
+        self._latencies.extend(now - t for t in times if t is not None)
+        self.scored += len(results)
+        self.batches += 1
+
+    def stats(self) -> dict:
+        lat = sorted(self._latencies)
+        return {
+            "scored": self.scored,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "latency_s": {
+                "samples": len(lat),
+                "p50": _percentile(lat, 0.50),
+                "p95": _percentile(lat, 0.95),
+                "p99": _percentile(lat, 0.99),
+                "max": lat[-1] if lat else None,
+            },
+        }
+
+    # ── main loop ─────────────────────────────────────────────────────────
+    def run(self, stop: threading.Event | None = None, ready: threading.Event | None = None) -> None:
+        """Consume until `stop` is set; `ready` is set once the stream is open."""
+        stop = stop or threading.Event()
+        token = self._load_token()
+        print(f"📡 Sentiment consumer '{self.name}' starting "
+              f"({'resuming' if token else 'from now'})", flush=True)
+
+        with self.posts.watch(
+            PIPELINE,
+            full_document="updateLookup",
+            resume_after=token,
+            max_await_time_ms=int(self.max_wait * 1000),
+        ) as stream:
+            if token is None:
+                # Checkpoint the starting position right away, so a restart
+                # before the first batch resumes here instead of "from now".
+                self._save_token(stream.resume_token)
+            if ready is not None:
+                ready.set()
+            batch: list[dict] = []
+            first_at = None
+            last_saved = time.time()
+
+            while not stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    batch.append(change)
+                    first_at = first_at or time.time()
+
+                full = len(batch) >= self.batch_size
+                waited = first_at is not None and (time.time() - first_at) >= self.max_wait
+                if batch and (full or waited or change is None):
+                    # Store first, then checkpoint: a crash in between replays
+                    # the batch, and _flush skips what was already stored.
+                    self._flush(batch)
+                    self._save_token(stream.resume_token)
+                    batch, first_at = [], None
+                    last_saved = time.time()
+                elif not batch and time.time() - last_saved >= IDLE_CHECKPOINT_SECS:
+                    self._save_token(stream.resume_token)
+                    last_saved = time.time()
+
+
+_stats_clients: dict[str, MongoClient] = {}
+_stats_lock = threading.Lock()
+
+
+def read_stats(uri: str | None = None, name: str = CONSUMER_NAME) -> dict | None:
+    """Last stats the consumer checkpointed (used by /consumer/stats)."""
+    uri = uri or MONGODB_URI
+    if not uri:
+        return None
+    with _stats_lock:
+        client = _stats_clients.get(uri)
+        if client is None:
+            client = _stats_clients[uri] = MongoClient(uri, serverSelectionTimeoutMS=5000)
+    doc = client.get_default_database("test")[CHECKPOINT_COLLECTION].find_one(
+        {"_id": name}, {"stats": 1, "updated_at": 1}
+    )
+    if not doc:
+        return None
+    return {"name": name, "updated_at": doc.get("updated_at"), **(doc.get("stats") or {})}
+
+
+if __name__ == "__main__":
+    try:
+        from dotenv import load_dotenv
+        for f in (".env.local", ".env.production"):
+            if os.path.exists(f):
+                load_dotenv(f, override=False)
+    except Exception:
+        pass
+    MONGODB_URI = os.getenv("MONGODB_URI")
+
+    while True:
+        try:
+            SentimentConsumer(uri=MONGODB_URI).run()
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            print(f"❌ Sentiment consumer crashed: {e}; restarting in 5s", flush=True)
+            time.sleep(5)
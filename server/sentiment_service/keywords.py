@@ -0,0 +1,87 @@
+# server/sentiment_service/keywords.py
+"""
+Title tokenization for the keyword sketches kept by storage_service.
+
+Scored titles are reduced to per-(subreddit, polarity, day) term counts and
+posted to /store-keywords, which folds them into fixed-size sketches.
+"""
+import re
+from collections import Counter
+from datetime import datetime
+
+import requests
+
+from telemetry import timed
+
+# Small built-in list so scoring never depends on an NLTK corpus download
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are aren't as at be because been before being
+below between both but by can can't cannot could couldn't did didn't do does doesn't doing don't down
+during each few for from further get gets got had hadn't has hasn't have haven't having he he'd he'll
+he's her here here's hers herself him himself his how how's i i'd i'll i'm i've if in into is isn't it
+it's its itself just let's like me more most mustn't my myself new no nor not now of off on once only
+or other ought our ours ourselves out over own really same shan't she she'd she'll she's should
+shouldn't so some such than that that's the their theirs them themselves then there there's these they
+they'd they'll they're they've this those through to too under until up us very via vs was wasn't we
+we'd we'll we're we've were weren't what what's when when's where where's which while who who's whom
+why why's will with won't would wouldn't you you'd you'll you're you've your yours yourself yourselves
+amp one two also still even much many make makes made way ways thing things anyone someone every
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9'+#.-]*[a-z0-9+#]|[a-z0-9]")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased word tokens minus stopwords, bare numbers and 1-letter tokens."""
+    out = []
+    for tok in _TOKEN.findall((text or "").lower()):
+        tok = tok.strip("'")
+        if tok.endswith("'s"):
+            tok = tok[:-2]
+        if len(tok) < 2 or tok in STOPWORDS or tok.isdigit():
+            continue
+        out.append(tok)
+    return out
+
+
+def _day(created) -> str:
+    if isinstance(created, datetime):
+        return created.strftime("%Y-%m-%d")
+    if isinstance(created, str) and len(created) >= 10:
+        return created[:10]                      # ISO string from /posts/recent
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def keyword_groups(rows: list[tuple[dict, str]]) -> list[dict]:
+    """
+    rows: (post, polarity) pairs where post has title/subreddit/created_utc.
+    Returns one term-count group per (subreddit, polarity, day).
+    """
+    counts: dict[tuple[str, str, str], Counter] = {}
+    for post, polarity in rows:
+        sub = post.get("subreddit")
+        if not sub or not polarity:
+            continue
+        terms = tokenize(post.get("title") or "")
+        if terms:
+            key = (sub.lower(), polarity, _day(post.get("created_utc")))
+            counts.setdefault(key, Counter()).update(terms)
+
+    return [
+        {"subreddit": sub, "polarity": polarity, "day": day, "terms": dict(c)}
+        for (sub, polarity, day), c in counts.items()
+    ]
+
+
+def send_keywords(url: str, rows: list[tuple[dict, str]]) -> dict | None:
+    """POST term counts to storage_service (non-fatal; returns its reply or an error dict)."""
+    groups = keyword_groups(rows)
+    if not groups:
+        return None
+    try:
+        with timed("storage", "store-keywords"):
+            r = requests.post(url, json={"groups": groups}, timeout=20)
+        r.raise_for_status()
+        return r.json()
+    except Exception as e:
+        return {"error": "failed_to_store_keywords", "details": str(e)}
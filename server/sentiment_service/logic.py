@@ -4,6 +4,9 @@ from datetime import datetime
 import requests
 import nltk
 
+from .keywords import send_keywords
+from telemetry import timed, POSTS_SCORED
+
 # VADER import (newer NLTK layout first, fallback to old)
 try:
     from nltk.sentiment import SentimentIntensityAnalyzer
@@ -50,6 +53,17 @@ def _bucket(compound: float) -> str:
         return "negative"
     return "neutral"
 
+def _score(sia, text: str) -> dict:
+    scores = sia.polarity_scores(text)
+    comp = float(scores["compound"])
+    return {
+        "polarity": _bucket(comp),
+        "compound": comp,
+        "pos": float(scores["pos"]),
+        "neu": float(scores["neu"]),
+        "neg": float(scores["neg"]),
+    }
+
 def analyze_posts(limit: int = 20, subreddit: str | None = None):
     """Fetch posts from storage_service, analyze with VADER, POST results back."""
     limit = max(1, min(int(limit), 200))
@@ -59,7 +73,8 @@ def analyze_posts(limit: int = 20, subreddit: str | None = None):
         params = {"limit": limit}
         if subreddit:
             params["subreddit"] = subreddit
-        r = requests.get(_url("/posts/recent"), params=params, timeout=20)
+        with timed("storage", "posts-recent"):
+            r = requests.get(_url("/posts/recent"), params=params, timeout=20)
         r.raise_for_status()
         posts = r.json() or []
     except Exception as e:
@@ -74,35 +89,96 @@ def analyze_posts(limit: int = 20, subreddit: str | None = None):
     # 2) Analyze
     sia = _get_sia()
     results = []
-    for p in posts:
-        title = (p.get("title") or "").strip()
-        if not title:
-            continue
-        scores = sia.polarity_scores(title)
-        comp = float(scores["compound"])
-        results.append({
-            "post_id": p.get("post_id"),
-            "polarity": _bucket(comp),
-            "compound": comp,
-            "pos": float(scores["pos"]),
-            "neu": float(scores["neu"]),
-            "neg": float(scores["neg"]),
-        })
+    fresh = []  # (post, polarity) for titles not already counted in the keyword sketches
+    with timed("vader", "score_posts"):
+        for p in posts:
+            title = (p.get("title") or "").strip()
+            if not title:
+                continue
+            scored = _score(sia, title)
+            results.append({"post_id": p.get("post_id"), **scored})
+            if (p.get("sentiment") or {}).get("polarity") != scored["polarity"]:
+                fresh.append((p, scored["polarity"]))
+    POSTS_SCORED.labels("analyze").inc(len(results))
 
     # 3) Store back
     store = None
     try:
-        rr = requests.post(_url("/store-sentiment"),
-                           json={"results": results}, timeout=20)
+        with timed("storage", "store-sentiment"):
+            rr = requests.post(_url("/store-sentiment"),
+                               json={"results": results}, timeout=20)
         rr.raise_for_status()
         store = rr.json()
     except Exception as e:
         store = {"error": "failed_to_store_sentiment", "details": str(e)}
 
+    # 4) Keyword sketches (only once sentiment is stored, so a retry re-counts nothing)
+    keywords = None
+    if "error" not in (store or {}):
+        keywords = send_keywords(_url("/store-keywords"), fresh)
+
     return results, {
         "subreddit_filter": subreddit,
         "fetched": len(posts),
         "analyzed": len(results),
         "store_result": store,
+        "keywords_result": keywords,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+def analyze_comments(limit: int = 200, post_id: str | None = None, subreddit: str | None = None):
+    """Score pending comments from storage_service; storage rolls them up onto their posts."""
+    limit = max(1, min(int(limit), 1000))
+
+    # 1) Fetch unscored comments
+    try:
+        params = {"limit": limit}
+        if post_id:
+            params["post_id"] = post_id
+        if subreddit:
+            params["subreddit"] = subreddit
+        with timed("storage", "comments-pending"):
+            r = requests.get(_url("/comments/pending"), params=params, timeout=20)
+        r.raise_for_status()
+        comments = (r.json() or {}).get("comments") or []
+    except Exception as e:
+        return [], {
+            "error": "failed_to_fetch_comments",
+            "details": str(e),
+            "post_filter": post_id,
+            "subreddit_filter": subreddit,
+            "returned": 0,
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+        }
+
+    # 2) Analyze
+    sia = _get_sia()
+    results = []
+    with timed("vader", "score_comments"):
+        for c in comments:
+            body = (c.get("body") or "").strip()
+            if not body or body in ("[deleted]", "[removed]"):
+                continue
+            results.append({"comment_id": c.get("comment_id"), "post_id": c.get("post_id"), **_score(sia, body)})
+
+    # 3) Store back (storage_service also updates the per-post roll-up)
+    store = None
+    if results:
+        try:
+            with timed("storage", "store-comment-sentiment"):
+                rr = requests.post(_url("/store-comment-sentiment"),
+                                   json={"results": results}, timeout=20)
+            rr.raise_for_status()
+            store = rr.json()
+        except Exception as e:
+            store = {"error": "failed_to_store_comment_sentiment", "details": str(e)}
+
+    return results, {
+        "post_filter": post_id,
+        "subreddit_filter": subreddit,
+        "fetched": len(comments),
+        "analyzed": len(results),
+        "store_result": store,
         "timestamp": datetime.utcnow().isoformat() + "Z",
     }
@@ -1,7 +1,8 @@
 # server/storage_service/app.py
 import os
-from flask import Flask, request, jsonify
-from datetime import datetime, timedelta
+from flask import Flask, request, jsonify, Response, stream_with_context
+from datetime import datetime, timedelta, date
+from itertools import islice
 
 
 from .database import init_db
@@ -10,16 +11,37 @@ from .storage_service import (
     upsert_posts,
     get_recent_posts,
     upsert_sentiment,
+    upsert_comments,
+    get_pending_comments,
+    upsert_comment_sentiment,
+    search_posts,
 )
+from .trends import get_trends
+from .keywords import record_keywords, get_keywords
+from .events import hub, stream as event_stream, TooManySubscribers
+from .retention import (
+    start_compactor,
+    compact,
+    archived_until,
+    archive_summary,
+    merge_archive_summary,
+    iter_archived_posts,
+)
+from telemetry import instrument_flask, gauge_callback
 
 app = Flask(__name__)
+instrument_flask(app, "storage")
 
 # Initialize MongoDB once when the module loads (idempotent + non-fatal).
 try:
-    init_db()
+    if init_db():
+        start_compactor()
 except Exception as e:
     print(f"⚠️ DB init warning: {e}", flush=True)
 
+gauge_callback("sse_subscribers", "Open /storage/stream subscribers in this process",
+               lambda: hub.stats()["subscribers"])
+
 @app.route("/")
 def root():
     return jsonify({"ok": True}), 200
@@ -82,6 +104,44 @@ def store_sentiment():
         print(f"❌ Error storing sentiment: {e}", flush=True)
         return jsonify({"error": "Failed to store sentiment", "details": str(e)}), 500
 
+@app.route("/store-comments", methods=["POST"])
+def store_comments():
+    payload = request.get_json(silent=True) or {}
+    comments = payload.get("comments")
+    if not comments:
+        return jsonify({"error": "No comments provided"}), 400
+    try:
+        count = upsert_comments(comments)
+        return jsonify({"message": "Comments stored successfully!", "count": count}), 201
+    except Exception as e:
+        print(f"❌ Error storing comments: {e}", flush=True)
+        return jsonify({"error": "Failed to store comments", "details": str(e)}), 500
+
+@app.route("/comments/pending", methods=["GET"])
+def comments_pending():
+    try:
+        limit = int(request.args.get("limit", 200))
+        data = get_pending_comments(
+            limit=limit,
+            post_id=request.args.get("post_id"),
+            subreddit=request.args.get("subreddit"),
+        )
+        return jsonify({"count": len(data), "comments": data}), 200
+    except Exception as e:
+        print(f"❌ Error listing pending comments: {e}", flush=True)
+        return jsonify({"error": "Failed to list pending comments", "details": str(e)}), 500
+
+@app.route("/store-comment-sentiment", methods=["POST"])
+def store_comment_sentiment():
+    payload = request.get_json(silent=True) or {}
+    results = payload.get("results") or []
+    try:
+        count = upsert_comment_sentiment(results)
+        return jsonify({"message": "Comment sentiment stored", "count": count}), 201
+    except Exception as e:
+        print(f"❌ Error storing comment sentiment: {e}", flush=True)
+        return jsonify({"error": "Failed to store comment sentiment", "details": str(e)}), 500
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=True)
 
@@ -93,17 +153,21 @@ def summary():
       - total/analyzed/pending
       - average VADER compound
     Optional filters:
-      ?subreddit=<name>&hours=<lookback_hours>
+      ?subreddit=<name>&hours=<lookback_hours>&archive=1
+    With archive=1, archived days (see retention.py) are added from the
+    archive manifest; the hot collection only counts days not yet archived.
     """
     try:
         subreddit = request.args.get("subreddit")
         hours_str = request.args.get("hours")
+        include_archive = request.args.get("archive", "").lower() in ("1", "true", "yes")
 
         q = Post.objects
         if subreddit:
             q = q.filter(subreddit__iexact=subreddit)
 
         lookback_hours = None
+        since = None
         if hours_str:
             try:
                 lookback_hours = int(hours_str)
@@ -112,6 +176,10 @@ def summary():
             except Exception:
                 lookback_hours = None  # ignore bad value
 
+        watermark = archived_until() if include_archive else None
+        if watermark:
+            q = q.filter(created_utc__not__lt=watermark)  # keeps posts without a date
+
         total = q.count()
         analyzed_q = q.filter(sentiment_compound__exists=True)
         analyzed = analyzed_q.count()
@@ -130,16 +198,190 @@ def summary():
         ]
         avg_compound = (sum(compounds) / len(compounds)) if compounds else None
 
+        filters = {"subreddit": subreddit, "hours": lookback_hours}
+        counts = {
+            "total": total,
+            "analyzed": analyzed,
+            "pending": pending,
+            "by_polarity": by_polarity,
+        }
+        if include_archive:
+            arch = merge_archive_summary(counts, sum(compounds), watermark, subreddit, since)
+            avg_compound = arch["average_compound"]
+            filters["archive"] = True
+            filters["archived_until"] = arch["archived_until"]
+
         return jsonify({
-            "filters": {"subreddit": subreddit, "hours": lookback_hours},
-            "counts": {
-                "total": total,
-                "analyzed": analyzed,
-                "pending": pending,
-                "by_polarity": by_polarity,
-            },
+            "filters": filters,
+            "counts": counts,
             "average_compound": avg_compound,
         }), 200
     except Exception as e:
         print(f"❌ Error building summary: {e}", flush=True)
         return jsonify({"error": "Failed to build summary", "details": str(e)}), 500
+
+@app.route("/trends", methods=["GET"])
+def trends():
+    """
+    Rolling sentiment per subreddit (EWMA, windowed mean/std, z-score).
+    Served from incrementally maintained state; never scans Post.
+    Optional filters:
+      ?subreddit=<name>&anomalies=1
+    """
+    try:
+        subreddit = request.args.get("subreddit")
+        anomalies_only = request.args.get("anomalies", "").lower() in ("1", "true", "yes")
+        data = get_trends(subreddit=subreddit, anomalies_only=anomalies_only)
+        return jsonify({
+            "filters": {"subreddit": subreddit, "anomalies": anomalies_only},
+            "trends": data,
+            "anomalies": [t["subreddit"] for t in data if t["anomaly"]],
+        }), 200
+    except Exception as e:
+        print(f"❌ Error reading trends: {e}", flush=True)
+        return jsonify({"error": "Failed to read trends", "details": str(e)}), 500
+
+@app.route("/search", methods=["GET"])
+def search():
+    """
+    Keyword search over post titles with sentiment facets for the match set.
+      ?q=<terms>&subreddit=<name>&page=<n>&page_size=<n>
+    """
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        data = search_posts(
+            query,
+            subreddit=request.args.get("subreddit"),
+            page=request.args.get("page", default=1, type=int),
+            page_size=request.args.get("page_size", default=20, type=int),
+        )
+        return jsonify(data), 200
+    except Exception as e:
+        print(f"❌ Error searching posts: {e}", flush=True)
+        return jsonify({"error": "Failed to search posts", "details": str(e)}), 500
+
+@app.route("/store-keywords", methods=["POST"])
+def store_keywords():
+    payload = request.get_json(silent=True) or {}
+    groups = payload.get("groups") or []
+    try:
+        count = record_keywords(groups)
+        return jsonify({"message": "Keywords stored", "count": count}), 201
+    except Exception as e:
+        print(f"❌ Error storing keywords: {e}", flush=True)
+        return jsonify({"error": "Failed to store keywords", "details": str(e)}), 500
+
+@app.route("/keywords", methods=["GET"])
+def keywords():
+    """
+    Top terms driving each polarity, merged over the requested window.
+      ?subreddit=<name>&polarity=positive,negative&day=YYYY-MM-DD&days=<n>&k=<n>&terms=a,b
+    """
+    try:
+        polarity = request.args.get("polarity") or "positive,negative"
+        polarities = tuple(p for p in polarity.lower().split(",") if p in ("positive", "neutral", "negative"))
+        terms = [t.strip().lower() for t in (request.args.get("terms") or "").split(",") if t.strip()]
+        data = get_keywords(
+            subreddit=request.args.get("subreddit"),
+            polarities=polarities or ("positive", "negative"),
+            day=request.args.get("day"),
+            days=request.args.get("days", default=1, type=int),
+            k=request.args.get("k", default=20, type=int),
+            terms=terms or None,
+        )
+        return jsonify(data), 200
+    except ValueError as e:
+        return jsonify({"error": "Bad request", "details": str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error reading keywords: {e}", flush=True)
+        return jsonify({"error": "Failed to read keywords", "details": str(e)}), 500
+
+@app.route("/stream", methods=["GET"])
+def stream():
+    """
+    Server-Sent Events feed of `posts`, `sentiment` and `summary` (delta) events.
+      ?subreddit=a,b          only events for these subreddits
+      Last-Event-ID header    (or ?last_event_id=) resume after that event
+    503 once this process holds EVENTS_MAX_SUBSCRIBERS streams.
+    """
+    subs = {s.strip().lower() for s in (request.args.get("subreddit") or "").split(",") if s.strip()}
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        sub, backlog, reset = hub.subscribe(subs or None, last_event_id)
+    except TooManySubscribers as e:
+        resp = jsonify({"error": "Too many event subscribers", "details": str(e)})
+        resp.headers["Retry-After"] = "5"
+        return resp, 503
+    except Exception as e:
+        print(f"❌ Error opening event stream: {e}", flush=True)
+        return jsonify({"error": "Failed to open event stream", "details": str(e)}), 500
+    resp = Response(
+        stream_with_context(event_stream(sub, backlog, reset)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # The generator's own cleanup never runs if the client leaves before the first frame
+    resp.call_on_close(lambda: hub.unsubscribe(sub))
+    return resp
+
+@app.route("/stream/stats", methods=["GET"])
+def stream_stats():
+    return jsonify(hub.stats()), 200
+
+@app.route("/archive/summary", methods=["GET"])
+def archive_summary_route():
+    """
+    Counts over archived (expired from Mongo) days, from the manifest only.
+      ?subreddit=<name>&from=YYYY-MM-DD&to=YYYY-MM-DD&by_day=1
+    """
+    try:
+        since = request.args.get("from")
+        until = request.args.get("to")
+        by_day = request.args.get("by_day", "").lower() in ("1", "true", "yes")
+        subreddit = request.args.get("subreddit")
+        data = archive_summary(
+            subreddit=subreddit,
+            since=date.fromisoformat(since) if since else None,
+            until=date.fromisoformat(until) if until else None,
+            by_day=by_day,
+        )
+        data.pop("compound_sum", None)
+        return jsonify({"filters": {"subreddit": subreddit, "from": since, "to": until}, **data}), 200
+    except ValueError as e:
+        return jsonify({"error": "Bad request", "details": str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error reading archive summary: {e}", flush=True)
+        return jsonify({"error": "Failed to read archive summary", "details": str(e)}), 500
+
+@app.route("/archive/posts", methods=["GET"])
+def archive_posts():
+    """
+    Archived posts for one subreddit and day.
+      ?subreddit=<name>&day=YYYY-MM-DD&offset=<n>&limit=<n>
+    """
+    subreddit = request.args.get("subreddit")
+    day = request.args.get("day")
+    if not subreddit or not day:
+        return jsonify({"error": "subreddit and day are required"}), 400
+    try:
+        offset = max(0, request.args.get("offset", default=0, type=int))
+        limit = max(1, min(request.args.get("limit", default=100, type=int), 1000))
+        posts = list(islice(iter_archived_posts(subreddit, date.fromisoformat(day)), offset, offset + limit))
+        return jsonify({"subreddit": subreddit, "day": day, "offset": offset, "count": len(posts),
+                        "posts": posts}), 200
+    except ValueError as e:
+        return jsonify({"error": "Bad request", "details": str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error reading archive: {e}", flush=True)
+        return jsonify({"error": "Failed to read archive", "details": str(e)}), 500
+
+@app.route("/archive/run", methods=["POST"])
+def archive_run():
+    """Archive every day past the hot window now instead of waiting for the timer."""
+    try:
+        return jsonify(compact()), 200
+    except Exception as e:
+        print(f"❌ Error compacting archive: {e}", flush=True)
+        return jsonify({"error": "Failed to compact archive", "details": str(e)}), 500
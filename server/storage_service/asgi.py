@@ -0,0 +1,272 @@
+# server/storage_service/asgi.py
+"""
+Async (ASGI) entry point for storage_service.
+
+Serves the hot routes (/store-posts, /posts/recent, /posts/pending,
+/store-sentiment, /summary) on Starlette with PyMongo's native async client,
+so a slow Mongo call parks a coroutine instead of a whole worker. Responses
+have the same shape as the Flask app in app.py; trend/event side effects
+reuse the same helpers (run in the threadpool).
+
+Run (from server/):
+  uvicorn storage_service.asgi:app --host 0.0.0.0 --port 8001 --workers 3
+"""
+import os
+import re
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from pymongo import AsyncMongoClient, UpdateOne
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from .database import init_db, MONGODB_TLS
+from .events import publish
+from .retention import archived_until, ingest_cutoff, merge_archive_summary
+from telemetry import POSTS_STORED, register_mongo_listener
+from .storage_service import (
+    Post,
+    _extract_flat_posts,
+    _is_hot,
+    _post_fields,
+    _post_events,
+    _recent_row,
+    apply_sentiment_effects,
+)
+
+_client: AsyncMongoClient | None = None
+
+
+def _posts():
+    if _client is None:
+        raise RuntimeError("MONGODB_URI not set; starting without DB")
+    return _client.get_default_database("test")[Post._get_collection_name()]
+
+
+def _iexact(value: str):
+    # Same matching as mongoengine's `__iexact`
+    return re.compile(f"^{re.escape(value)}$", re.IGNORECASE)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _client
+    uri = os.getenv("MONGODB_URI")
+    if uri:
+        register_mongo_listener()
+        _client = AsyncMongoClient(uri, tls=MONGODB_TLS, serverSelectionTimeoutMS=5000)
+        try:
+            await _client.admin.command("ping")
+            print("✅ MongoDB (async) connected", flush=True)
+        except Exception as e:
+            print(f"❌ MongoDB (async) init failed: {e}", flush=True)
+    else:
+        print("⚠️  MONGODB_URI not set; starting without DB", flush=True)
+    # Sync connection for the shared trend/event helpers
+    try:
+        await run_in_threadpool(init_db)
+    except Exception as e:
+        print(f"⚠️ DB init warning: {e}", flush=True)
+    yield
+    if _client is not None:
+        await _client.close()
+
+
+async def _json(request: Request):
+    try:
+        return await request.json()
+    except Exception:
+        return None
+
+
+async def root(request: Request):
+    return JSONResponse({"ok": True}, 200)
+
+
+async def ping(request: Request):
+    return JSONResponse({"message": "Storage Service Pong!"}, 200)
+
+
+async def store_reddit_posts(request: Request):
+    data = await _json(request)
+    if not data:
+        return JSONResponse({"error": "No data provided"}, 400)
+    try:
+        cutoff = ingest_cutoff()
+        fields = [f for f in map(_post_fields, _extract_flat_posts(data)) if f and _is_hot(f, cutoff)]
+        inserted = []
+        if fields:
+            res = await _posts().bulk_write(
+                [UpdateOne({"post_id": f["post_id"]}, {"$set": f}, upsert=True) for f in fields],
+                ordered=False,
+            )
+            inserted = [fields[i] for i in res.upserted_ids]
+        events = _post_events(inserted)
+        if events:
+            await run_in_threadpool(publish, events)
+        POSTS_STORED.inc(len(fields))
+        return JSONResponse({"message": "Posts stored successfully!", "count": len(fields)}, 201)
+    except Exception as e:
+        print(f"❌ Error storing posts: {e}", flush=True)
+        return JSONResponse({"error": "Failed to store posts", "details": str(e)}, 500)
+
+
+async def recent_posts(request: Request):
+    try:
+        limit = max(1, min(int(request.query_params.get("limit", 20)), 200))
+        subreddit = request.query_params.get("subreddit")
+        q = {"subreddit": _iexact(subreddit)} if subreddit else {}
+        cursor = _posts().find(q).sort("created_utc", -1).limit(limit)
+        data = [_recent_row(p) async for p in cursor]
+        return JSONResponse(data, 200)
+    except Exception as e:
+        print(f"❌ Error reading posts: {e}", flush=True)
+        return JSONResponse({"error": "Failed to read posts", "details": str(e)}, 500)
+
+
+async def posts_pending(request: Request):
+    try:
+        limit = max(1, min(int(request.query_params.get("limit", 50)), 200))
+        subreddit = request.query_params.get("subreddit")
+
+        q = {"sentiment_polarity": {"$exists": False}}
+        if subreddit:
+            q["subreddit"] = _iexact(subreddit)
+
+        cursor = _posts().find(q, {"post_id": 1, "title": 1, "subreddit": 1}).sort("created_utc", -1).limit(limit)
+        data = [
+            {"post_id": p.get("post_id"), "title": p.get("title"), "subreddit": p.get("subreddit")}
+            async for p in cursor if p.get("title")
+        ]
+        return JSONResponse({"count": len(data), "posts": data}, 200)
+    except Exception as e:
+        print(f"❌ Error listing pending posts: {e}", flush=True)
+        return JSONResponse({"error": "Failed to list pending posts", "details": str(e)}, 500)
+
+
+async def store_sentiment(request: Request):
+    payload = await _json(request) or {}
+    results = payload.get("results") or []
+    try:
+        if not isinstance(results, list):
+            raise ValueError("results must be a list")
+        by_id = {r["post_id"]: r for r in results if isinstance(r, dict) and r.get("post_id")}
+
+        coll = _posts()
+        prevs = {
+            d["post_id"]: d
+            async for d in coll.find(
+                {"post_id": {"$in": list(by_id)}, "frozen_at": {"$exists": False}},   # not being archived
+                {"post_id": 1, "subreddit": 1, "sentiment_compound": 1, "sentiment_polarity": 1},
+            )
+        }
+        ops = [
+            UpdateOne({"post_id": pid, "frozen_at": {"$exists": False}}, {"$set": {
+                "sentiment_polarity": r.get("polarity"),
+                "sentiment_compound": r.get("compound"),
+                "sentiment_pos": r.get("pos"),
+                "sentiment_neu": r.get("neu"),
+                "sentiment_neg": r.get("neg"),
+            }})
+            for pid, r in by_id.items() if pid in prevs   # never create docs from sentiment only
+        ]
+        if ops:
+            await coll.bulk_write(ops, ordered=False)
+            await run_in_threadpool(
+                apply_sentiment_effects, [(prevs[pid], r) for pid, r in by_id.items() if pid in prevs]
+            )
+        return JSONResponse({"message": "Sentiment stored", "count": len(ops)}, 201)
+    except Exception as e:
+        print(f"❌ Error storing sentiment: {e}", flush=True)
+        return JSONResponse({"error": "Failed to store sentiment", "details": str(e)}, 500)
+
+
+async def summary(request: Request):
+    """Same query parameters and response as the Flask /summary, including archive=1."""
+    try:
+        subreddit = request.query_params.get("subreddit")
+        hours_str = request.query_params.get("hours")
+        include_archive = request.query_params.get("archive", "").lower() in ("1", "true", "yes")
+
+        q: dict = {}
+        if subreddit:
+            q["subreddit"] = _iexact(subreddit)
+
+        lookback_hours = None
+        since = None
+        created: dict = {}
+        if hours_str:
+            try:
+                lookback_hours = int(hours_str)
+                since = datetime.utcnow() - timedelta(hours=lookback_hours)
+                created["$gte"] = since
+            except Exception:
+                lookback_hours = None  # ignore bad value
+
+        watermark = await run_in_threadpool(archived_until) if include_archive else None
+        if watermark:
+            created["$not"] = {"$lt": watermark}  # keeps posts without a date
+        if created:
+            q["created_utc"] = created
+
+        coll = _posts()
+        analyzed_q = {**q, "sentiment_compound": {"$exists": True}}
+
+        async def compound_stats():
+            async for g in await coll.aggregate([
+                {"$match": analyzed_q},
+                {"$group": {"_id": None, "avg": {"$avg": "$sentiment_compound"},
+                            "sum": {"$sum": "$sentiment_compound"}}},
+            ]):
+                return g["avg"], g["sum"]
+            return None, 0.0
+
+        total, analyzed, pending, pos, neu, neg, (avg, compound_sum) = await asyncio.gather(
+            coll.count_documents(q),
+            coll.count_documents(analyzed_q),
+            coll.count_documents({**q, "sentiment_polarity": {"$exists": False}}),
+            coll.count_documents({**q, "sentiment_polarity": "positive"}),
+            coll.count_documents({**q, "sentiment_polarity": "neutral"}),
+            coll.count_documents({**q, "sentiment_polarity": "negative"}),
+            compound_stats(),
+        )
+
+        filters = {"subreddit": subreddit, "hours": lookback_hours}
+        counts = {
+            "total": total,
+            "analyzed": analyzed,
+            "pending": pending,
+            "by_polarity": {"positive": pos, "neutral": neu, "negative": neg},
+        }
+        if include_archive:
+            arch = await run_in_threadpool(merge_archive_summary, counts, compound_sum, watermark, subreddit, since)
+            avg = arch["average_compound"]
+            filters["archive"] = True
+            filters["archived_until"] = arch["archived_until"]
+
+        return JSONResponse({
+            "filters": filters,
+            "counts": counts,
+            "average_compound": avg,
+        }, 200)
+    except Exception as e:
+        print(f"❌ Error building summary: {e}", flush=True)
+        return JSONResponse({"error": "Failed to build summary", "details": str(e)}, 500)
+
+
+app = Starlette(
+    routes=[
+        Route("/", root),
+        Route("/ping", ping, methods=["GET"]),
+        Route("/store-posts", store_reddit_posts, methods=["POST"]),
+        Route("/posts/recent", recent_posts, methods=["GET"]),
+        Route("/posts/pending", posts_pending, methods=["GET"]),
+        Route("/store-sentiment", store_sentiment, methods=["POST"]),
+        Route("/summary", summary, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
@@ -2,8 +2,13 @@
 import os
 from mongoengine import connect
 
+from telemetry import register_mongo_listener
+
 _conn = None
 
+# Atlas needs TLS; set MONGODB_TLS=false for a plain local mongod
+MONGODB_TLS = os.getenv("MONGODB_TLS", "true").lower() not in ("0", "false", "no")
+
 def init_db():
     """Connect lazily; never crash Gunicorn on failure."""
     global _conn
@@ -16,10 +21,11 @@ def init_db():
         return None
 
     try:
+        register_mongo_listener()
         _conn = connect(
             host=uri,
             alias="default",
-            tls=True,                          # fine for Atlas SRV URIs
+            tls=MONGODB_TLS,                   # fine for Atlas SRV URIs
             serverSelectionTimeoutMS=5000,     # fail fast on bad network
         )
         # Ping to log a clear success/failure
@@ -0,0 +1,355 @@
+# storage_service/events.py
+"""
+Live event feed for /stream (Server-Sent Events).
+
+Writers publish small events (new posts, sentiment updates, summary deltas)
+into a capped Mongo collection. Every worker process runs one tailer thread
+that reads the capped collection and fans events out to its own SSE
+subscribers, so an event published by any gunicorn worker reaches clients
+connected to every worker.
+
+Memory stays bounded: the replay ring and each subscriber's queue have a
+fixed size. A subscriber that falls behind is disconnected with an
+`overflow` event and resumes from its Last-Event-ID on reconnect.
+
+Each open stream holds a server thread for its whole life (gthread), so a
+process takes at most EVENTS_MAX_SUBSCRIBERS of them; past that /stream
+answers 503 and the client retries, leaving threads for every other route.
+
+Resume positions are $natural (insertion) order, not _id order: ObjectIds
+minted by different workers in the same second don't sort by insert time.
+"""
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import CursorType
+from mongoengine.connection import get_db
+
+EVENTS_COLLECTION = "storage_events"
+EVENTS_CAPPED_BYTES = int(os.getenv("EVENTS_CAPPED_BYTES", str(32 * 1024 * 1024)))
+EVENTS_CAPPED_MAX = int(os.getenv("EVENTS_CAPPED_MAX", "100000"))
+EVENTS_RING = int(os.getenv("EVENTS_RING", "2000"))            # per-process replay buffer
+EVENTS_SUB_BUFFER = int(os.getenv("EVENTS_SUB_BUFFER", "500"))  # per-subscriber queue
+EVENTS_HEARTBEAT_SECS = float(os.getenv("EVENTS_HEARTBEAT_SECS", "15"))
+# Keep well under gunicorn --threads (Procfile: 100 per worker)
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "50"))
+EVENTS_BACKFILL_MAX = 5000
+# Max gap between minting an event's ObjectId (client side) and its insert;
+# bounds how far back a resume scan starts looking for the matched event.
+EVENTS_RESUME_SKEW_SECS = 60
+
+_coll = None
+_coll_lock = threading.Lock()
+
+
+def _collection():
+    global _coll
+    if _coll is None:
+        with _coll_lock:
+            if _coll is None:
+                db = get_db()
+                if EVENTS_COLLECTION not in db.list_collection_names():
+                    try:
+                        db.create_collection(
+                            EVENTS_COLLECTION, capped=True,
+                            size=EVENTS_CAPPED_BYTES, max=EVENTS_CAPPED_MAX,
+                        )
+                    except Exception:
+                        pass  # another worker created it
+                _coll = db[EVENTS_COLLECTION]
+    return _coll
+
+
+def publish(events: list[dict]) -> None:
+    """
+    Append events to the feed (non-fatal). Item shape:
+      {"type": "posts"|"sentiment"|"summary", "subreddit": "...", "data": {...}}
+    """
+    if not events:
+        return
+    now = datetime.utcnow()
+    docs = [{
+        "type": e["type"],
+        "subreddit": (e.get("subreddit") or "").lower() or None,
+        "data": e.get("data") or {},
+        "ts": now,
+    } for e in events]
+    try:
+        _collection().insert_many(docs, ordered=True)
+    except Exception as e:
+        print(f"⚠️ Event publish failed: {e}", flush=True)
+
+
+def format_sse(doc: dict) -> str:
+    payload = {
+        "subreddit": doc.get("subreddit"),
+        "ts": doc["ts"].isoformat() + "Z" if isinstance(doc.get("ts"), datetime) else doc.get("ts"),
+        **(doc.get("data") or {}),
+    }
+    return f"id: {doc['_id']}\nevent: {doc['type']}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+def _resume_floor(oid: ObjectId) -> dict:
+    """_id filter that is certain to include `oid` and everything inserted after it."""
+    return {"_id": {"$gte": ObjectId.from_datetime(oid.generation_time - timedelta(seconds=EVENTS_RESUME_SKEW_SECS))}}
+
+
+def _found(coll, oid: ObjectId) -> bool:
+    return coll.find_one({"_id": oid}, projection={"_id": 1}) is not None
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, subreddits: Optional[set[str]]):
+        self.subreddits = subreddits
+        self.queue: queue.Queue = queue.Queue(maxsize=EVENTS_SUB_BUFFER)
+        self.overflowed = False
+        # Resumed ahead of this process's tailer: drop live events through this one
+        self.skip_through: Optional[ObjectId] = None
+
+    def wants(self, doc: dict) -> bool:
+        return not self.subreddits or doc.get("subreddit") in self.subreddits
+
+
+class EventHub:
+    """One per process: tails the capped collection and fans out to subscribers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: set[Subscription] = set()   # receiving live events
+        self._open: set[Subscription] = set()   # streams holding a thread, incl. overflowed ones
+        self._ring: deque = deque(maxlen=EVENTS_RING)
+        self._last_id: Optional[ObjectId] = None  # tailer position: last event dispatched
+        self._positioned = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dispatched = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+        self.rejected_subscribers = 0
+
+    # ── tailer ────────────────────────────────────────────────────────────
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._tail, name="event-tailer", daemon=True)
+                self._thread.start()
+
+    def _tail(self) -> None:
+        started, last_id = False, None
+        while True:
+            try:
+                coll = _collection()
+                if not started:
+                    last = coll.find_one(sort=[("$natural", -1)], projection={"_id": 1})
+                    last_id, started = (last["_id"] if last else None), True
+                    self._start_at(last_id)
+                # Re-open just after the last dispatched event in $natural order:
+                # scan from a little before it and skip until it goes by. If it
+                # has been rotated out, deliver everything from the floor.
+                skipping = last_id is not None and _found(coll, last_id)
+                cursor = coll.find(
+                    _resume_floor(last_id) if last_id else {},
+                    cursor_type=CursorType.TAILABLE_AWAIT,
+                    max_await_time_ms=1000,
+                )
+                while cursor.alive:
+                    for doc in cursor:
+                        if skipping:
+                            skipping = doc["_id"] != last_id
+                            continue
+                        last_id = doc["_id"]
+                        self._dispatch(doc)
+            except Exception as e:
+                print(f"⚠️ Event tailer error: {e}", flush=True)
+            time.sleep(0.5)
+
+    def _start_at(self, last_id: Optional[ObjectId]) -> None:
+        with self._lock:
+            self._last_id = last_id
+        self._positioned.set()
+
+    def _dispatch(self, doc: dict) -> None:
+        with self._lock:
+            self._ring.append(doc)
+            self._last_id = doc["_id"]
+            self.dispatched += 1
+            for sub in list(self._subs):
+                if sub.skip_through is not None:
+                    if doc["_id"] == sub.skip_through:
+                        sub.skip_through = None
+                    continue
+                if not sub.wants(doc):
+                    continue
+                try:
+                    sub.queue.put_nowait(doc)
+                    self.delivered += 1
+                except queue.Full:
+                    # Slow client: cut it loose instead of buffering without bound
+                    sub.overflowed = True
+                    self._subs.discard(sub)
+                    self.dropped_subscribers += 1
+
+    # ── subscribers ───────────────────────────────────────────────────────
+    def subscribe(self, subreddits: Optional[set[str]], last_event_id: Optional[str]):
+        """
+        Register a subscriber; returns (subscription, backlog docs, reset_needed).
+        Raises TooManySubscribers when this process already holds
+        EVENTS_MAX_SUBSCRIBERS streams.
+        """
+        sub = Subscription(subreddits)
+        with self._lock:
+            if len(self._open) >= EVENTS_MAX_SUBSCRIBERS:
+                self.rejected_subscribers += 1
+                raise TooManySubscribers(f"{len(self._open)} streams open in this process")
+            self._open.add(sub)
+        try:
+            return self._attach(sub, last_event_id)
+        except BaseException:
+            self.unsubscribe(sub)
+            raise
+
+    def _attach(self, sub: Subscription, last_event_id: Optional[str]):
+        self._ensure_started()
+        last_oid = ObjectId(last_event_id) if last_event_id and ObjectId.is_valid(last_event_id) else None
+        if last_oid is None:
+            with self._lock:
+                self._subs.add(sub)
+            return sub, [], False
+
+        # The tailer's start position bounds the backfill, so wait for it
+        if not self._positioned.wait(5):
+            with self._lock:
+                self._subs.add(sub)
+            return sub, [], True  # no safe resume point yet; client must resync via /summary
+
+        with self._lock:
+            ring, position, seq = list(self._ring), self._last_id, self.dispatched
+
+        backlog, reset, ahead = [], False, False
+        if last_oid in (ids := [d["_id"] for d in ring]):
+            backlog = ring[ids.index(last_oid) + 1:]
+        elif not _found(_collection(), last_oid):
+            reset = True  # already rotated out; client must resync via /summary
+        else:
+            backlog, reset, ahead = self._backfill(last_oid, ring, position)
+
+        # Register, then add what the tailer dispatched while we were reading
+        with self._lock:
+            self._subs.add(sub)
+            caught_up = self.dispatched - seq
+            if caught_up > len(self._ring):
+                backlog, reset = [], True  # ring turned over during the backfill
+            later = list(self._ring)[len(self._ring) - caught_up:] if caught_up and not reset else []
+            if reset:
+                backlog = []
+            elif ahead:
+                later_ids = [d["_id"] for d in later]
+                if last_oid in later_ids:
+                    backlog = later[later_ids.index(last_oid) + 1:]
+                else:
+                    # Resumed from another worker whose tailer is further along:
+                    # drop live events here until last_oid goes by
+                    sub.skip_through = last_oid
+            else:
+                backlog += later
+        backlog = [d for d in backlog if sub.wants(d)]
+        return sub, backlog, reset
+
+    def _backfill(self, last_oid: ObjectId, ring: list[dict],
+                  position: Optional[ObjectId]) -> tuple[list[dict], bool, bool]:
+        """
+        Events after `last_oid` (which is not in the ring) up to the tailer's
+        `position`, in $natural order. Returns (backlog, reset, ahead); `ahead`
+        means the tailer has not reached last_oid yet.
+        """
+        floor = _resume_floor(last_oid)
+        if position is None or position < floor["_id"]["$gte"]:
+            return [], False, True  # nothing dispatched yet, or only well before last_oid
+
+        ring_start = ring[0]["_id"] if ring else None
+        ahead, matched, backlog = False, False, []
+        for doc in _collection().find(floor).sort("$natural", 1):
+            if not matched:
+                matched = doc["_id"] == last_oid
+                if not matched:
+                    # Passing the tailer's position first: it is behind last_oid
+                    ahead = ahead or doc["_id"] in (position, ring_start)
+                elif ahead or doc["_id"] == position:
+                    break
+                continue
+            if doc["_id"] == ring_start:
+                return backlog + ring, False, False
+            if len(backlog) >= EVENTS_BACKFILL_MAX:
+                return [], True, False  # gap too long to replay; client must resync via /summary
+            backlog.append(doc)
+            if doc["_id"] == position:
+                break
+        return backlog, False, ahead
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+            self._open.discard(sub)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._open),
+                "max_subscribers": EVENTS_MAX_SUBSCRIBERS,
+                "rejected_subscribers": self.rejected_subscribers,
+                "ring": len(self._ring),
+                "delivered": self.delivered,
+                "dropped_subscribers": self.dropped_subscribers,
+            }
+
+
+hub = EventHub()
+
+
+def stream(sub: Subscription, backlog: list[dict], reset: bool):
+    """Generator of SSE frames for one client, from hub.subscribe()'s result."""
+    try:
+        yield "retry: 3000\n\n"
+        if reset:
+            yield "event: reset\ndata: {}\n\n"
+        for doc in backlog:
+            yield format_sse(doc)
+        while True:
+            try:
+                doc = sub.queue.get(timeout=EVENTS_HEARTBEAT_SECS)
+            except queue.Empty:
+                if sub.overflowed:
+                    break
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(doc)
+            if sub.overflowed and sub.queue.empty():
+                break
+        yield "event: overflow\ndata: {}\n\n"
+    finally:
+        hub.unsubscribe(sub)
+
+
+def summary_delta(subreddit: str, total: int = 0, analyzed: int = 0, pending: int = 0,
+                  by_polarity: Optional[dict] = None) -> dict:
+    """A `summary` event: increments to apply to the client's last /summary snapshot."""
+    return {
+        "type": "summary",
+        "subreddit": subreddit,
+        "data": {"delta": {
+            "total": total,
+            "analyzed": analyzed,
+            "pending": pending,
+            "by_polarity": {k: v for k, v in (by_polarity or {}).items() if v},
+        }},
+    }
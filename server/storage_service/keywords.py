@@ -0,0 +1,232 @@
+# storage_service/keywords.py
+"""
+Streaming heavy-hitter keywords per (subreddit, polarity, day).
+
+Each key holds a fixed-size Count-Min Sketch (point estimates for any term)
+and a Space-Saving top-k summary (the heavy hitters). Both are mergeable:
+batches from any number of sentiment workers fold into the stored state, and
+/keywords merges several days / subreddits on the fly.
+"""
+import os
+import zlib
+import hashlib
+from array import array
+from datetime import datetime, timedelta
+from typing import Optional
+
+from mongoengine import (
+    Document,
+    StringField,
+    IntField,
+    DateTimeField,
+    BinaryField,
+    DictField,
+    NotUniqueError,
+)
+
+CMS_WIDTH = int(os.getenv("KEYWORD_CMS_WIDTH", "2048"))
+CMS_DEPTH = int(os.getenv("KEYWORD_CMS_DEPTH", "4"))
+TOPK_SIZE = int(os.getenv("KEYWORD_TOPK", "100"))
+_MAX_RETRIES = 5
+
+
+def _hashes(term: str) -> tuple[int, int]:
+    # Stable across processes (unlike hash()), so sketches from any worker line up
+    h = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(h[:4], "little"), int.from_bytes(h[4:], "little") | 1
+
+
+class CountMinSketch:
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH, counts: Optional[array] = None):
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else array("I", bytes(4 * width * depth))
+
+    def _cells(self, term: str):
+        h1, h2 = _hashes(term)
+        for row in range(self.depth):
+            yield row * self.width + (h1 + row * h2) % self.width
+
+    def add(self, term: str, count: int = 1) -> None:
+        for i in self._cells(term):
+            self.counts[i] += count
+
+    def estimate(self, term: str) -> int:
+        return min(self.counts[i] for i in self._cells(term))
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError("cannot merge sketches of different shape")
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        return self
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(self.counts.tobytes(), 6)
+
+    @classmethod
+    def from_bytes(cls, blob: Optional[bytes], width: int, depth: int) -> "CountMinSketch":
+        if not blob:
+            return cls(width, depth)
+        counts = array("I")
+        counts.frombytes(zlib.decompress(blob))
+        return cls(width, depth, counts)
+
+
+class SpaceSaving:
+    """Top-k summary: term -> [count, error]; counts over-estimate by at most `error`."""
+
+    def __init__(self, k: int = TOPK_SIZE, items: Optional[dict] = None):
+        self.k = k
+        self.items: dict[str, list[int]] = {t: list(v) for t, v in (items or {}).items()}
+
+    def add(self, term: str, count: int = 1) -> None:
+        if term in self.items:
+            self.items[term][0] += count
+        elif len(self.items) < self.k:
+            self.items[term] = [count, 0]
+        else:
+            victim = min(self.items, key=lambda t: self.items[t][0])
+            floor = self.items.pop(victim)[0]
+            self.items[term] = [floor + count, floor]
+
+    def _floor(self) -> int:
+        return min(v[0] for v in self.items.values()) if len(self.items) >= self.k else 0
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        # Terms missing from a full summary may have been evicted with up to
+        # its minimum count, so charge that minimum (as count and error).
+        f_self, f_other = self._floor(), other._floor()
+        merged: dict[str, list[int]] = {}
+        for t in set(self.items) | set(other.items):
+            a = self.items.get(t, [f_self, f_self])
+            b = other.items.get(t, [f_other, f_other])
+            merged[t] = [a[0] + b[0], a[1] + b[1]]
+        self.k = max(self.k, other.k)
+        self.items = dict(sorted(merged.items(), key=lambda kv: -kv[1][0])[: self.k])
+        return self
+
+    def top(self, n: int) -> list[dict]:
+        ranked = sorted(self.items.items(), key=lambda kv: (-kv[1][0], kv[0]))[:n]
+        return [{"term": t, "count": c, "error": e} for t, (c, e) in ranked]
+
+
+class KeywordSketch(Document):
+    subreddit = StringField(required=True)   # lower-cased
+    polarity = StringField(required=True)    # "positive" | "neutral" | "negative"
+    day = StringField(required=True)         # YYYY-MM-DD (UTC, post creation day)
+    total = IntField(default=0)              # term occurrences folded in
+    cms = BinaryField()                      # zlib'd uint32 counters, depth x width
+    cms_width = IntField(default=CMS_WIDTH)
+    cms_depth = IntField(default=CMS_DEPTH)
+    topk = DictField()                       # term -> [count, error]
+    updated_at = DateTimeField()
+    version = IntField(default=0)
+
+    meta = {
+        "indexes": [
+            {"fields": ["subreddit", "polarity", "day"], "unique": True},
+            ("day", "polarity"),
+        ]
+    }
+
+
+def _sketches(doc: KeywordSketch) -> tuple[CountMinSketch, SpaceSaving]:
+    cms = CountMinSketch.from_bytes(doc.cms, doc.cms_width or CMS_WIDTH, doc.cms_depth or CMS_DEPTH)
+    return cms, SpaceSaving(TOPK_SIZE, doc.topk)
+
+
+def record_keywords(groups: list[dict]) -> int:
+    """
+    Fold term counts into the stored sketches.
+    Expected item shape:
+      {"subreddit": "...", "polarity": "negative", "day": "2025-01-31",
+       "terms": {"layoffs": 3, "market": 1}}
+    """
+    if not isinstance(groups, list):
+        raise ValueError("groups must be a list")
+
+    updated = 0
+    for g in groups:
+        sub = ((g or {}).get("subreddit") or "").lower()
+        polarity = g.get("polarity")
+        day = g.get("day")
+        terms = g.get("terms") or {}
+        if not (sub and polarity and day and terms):
+            continue
+
+        for _ in range(_MAX_RETRIES):
+            doc = KeywordSketch.objects(subreddit=sub, polarity=polarity, day=day).first()
+            if doc is None:
+                doc = KeywordSketch(subreddit=sub, polarity=polarity, day=day)
+            cms, top = _sketches(doc)
+            for term, count in terms.items():
+                count = int(count)
+                if count > 0:
+                    cms.add(term, count)
+                    top.add(term, count)
+
+            fields = {
+                "total": (doc.total or 0) + sum(int(c) for c in terms.values() if int(c) > 0),
+                "cms": cms.to_bytes(),
+                "cms_width": cms.width,
+                "cms_depth": cms.depth,
+                "topk": top.items,
+                "updated_at": datetime.utcnow(),
+            }
+            if doc.pk is None:
+                try:
+                    KeywordSketch(subreddit=sub, polarity=polarity, day=day, version=1, **fields).save(force_insert=True)
+                    break
+                except NotUniqueError:
+                    continue  # lost the insert race; retry as an update
+            n = KeywordSketch.objects(pk=doc.pk, version=doc.version).update_one(
+                inc__version=1, **{f"set__{k}": v for k, v in fields.items()}
+            )
+            if n:
+                break
+        else:
+            print(f"⚠️ Keyword update for r/{sub}/{polarity}/{day} lost to contention", flush=True)
+            continue
+        updated += 1
+    return updated
+
+
+def get_keywords(subreddit: Optional[str] = None, polarities: tuple[str, ...] = ("positive", "negative"),
+                 day: Optional[str] = None, days: int = 1, k: int = 20,
+                 terms: Optional[list[str]] = None) -> dict:
+    """
+    Merge the sketches for the requested window and return the top-k terms per
+    polarity. Without a subreddit, all subreddits are merged together.
+    """
+    end = datetime.strptime(day, "%Y-%m-%d") if day else datetime.utcnow()
+    days = max(1, min(int(days), 90))
+    k = max(1, min(int(k), TOPK_SIZE))
+    window = [(end - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+
+    out = {}
+    for polarity in polarities:
+        q = KeywordSketch.objects(polarity=polarity, day__in=window)
+        if subreddit:
+            q = q.filter(subreddit=subreddit.lower())
+
+        cms: Optional[CountMinSketch] = None
+        top = SpaceSaving(TOPK_SIZE)
+        total = keys = 0
+        for doc in q:
+            d_cms, d_top = _sketches(doc)
+            cms = d_cms if cms is None else cms.merge(d_cms)
+            top.merge(d_top)
+            total += doc.total or 0
+            keys += 1
+
+        entry = {"sketches": keys, "total_terms": total, "top": top.top(k)}
+        if terms:
+            entry["estimates"] = {t: (cms.estimate(t) if cms else 0) for t in terms}
+        out[polarity] = entry
+
+    return {
+        "filters": {"subreddit": subreddit, "day": window[0], "days": days},
+        "keywords": out,
+    }
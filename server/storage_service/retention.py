@@ -0,0 +1,435 @@
+# storage_service/retention.py
+"""
+Retention tiering for the Post collection.
+
+Hot tier:  posts live in Mongo until the compactor has archived their day.
+Archive:   once a UTC day is older than POST_HOT_DAYS, the compactor writes
+           it out as one compressed NDJSON file per (day, subreddit) under
+           ARCHIVE_DIR, zstd when `zstandard` is installed, gzip otherwise:
+
+             ARCHIVE_DIR/2025/01/31/python.ndjson.zst
+
+Nothing expires before it is archived. Each day goes through three steps:
+  1. freeze:  its posts get `frozen_at`; sentiment and comment roll-up
+              writes skip frozen posts, so the archive can't go stale
+  2. archive: files are written, their stats recorded, the watermark advanced
+  3. expire:  its posts get `expire_at`; the TTL index on that field (not on
+              `created_utc`) lets Mongo delete them
+A crash between steps just repeats them on the next run.
+
+The manifest lives in Mongo, not on disk: `archive_files` keeps per-file
+counts (total/analyzed/pending/by polarity, compound sum, created range), so
+historical summaries are answered without opening a single archive, and
+`archive_state` holds the `archived_until` watermark plus the compaction
+lease. Every instance therefore sees the same watermark and summaries, and
+only one compacts at a time. Ingest drops posts older than the watermark
+(or the hot window) so the two tiers never overlap.
+
+Retention is off until ARCHIVE_DIR is set explicitly. It must be persistent
+storage shared by every instance (an EFS mount, say), never a directory
+inside the deployed bundle.
+
+Run once from cron instead of (or as well as) the in-process timer:
+  python -m storage_service.retention
+"""
+import os
+import io
+import re
+import json
+import gzip
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta, date
+from typing import Iterator, Optional
+
+from pymongo import ReturnDocument
+from mongoengine.connection import get_db
+
+try:
+    import zstandard
+except ImportError:  # optional: fall back to gzip archives
+    zstandard = None
+
+POST_COLLECTION = "post"  # mongoengine's name for storage_service.Post
+POST_HOT_DAYS = int(os.getenv("POST_HOT_DAYS", "90"))             # 0 disables archiving
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR")                             # required for retention
+ARCHIVE_INTERVAL_SECS = float(os.getenv("ARCHIVE_INTERVAL_SECS", "3600"))  # 0 = no in-process timer
+ARCHIVE_ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", "10"))
+ARCHIVE_LEASE_SECS = 600                                           # renewed before every day
+RETENTION_ENABLED = bool(POST_HOT_DAYS and ARCHIVE_DIR)
+
+STATE_COLLECTION = "archive_state"
+FILES_COLLECTION = "archive_files"
+STATE_ID = "posts"
+CODEC = "zstd" if zstandard is not None else "gzip"
+_EXT = {"zstd": ".ndjson.zst", "gzip": ".ndjson.gz"}
+_POLARITIES = ("positive", "neutral", "negative")
+
+# Fields copied into archives (everything but _id and the retention markers)
+_FIELDS = (
+    "post_id", "title", "author", "subreddit", "score", "num_comments", "created_utc", "url", "is_video",
+    "sentiment_polarity", "sentiment_compound", "sentiment_pos", "sentiment_neu", "sentiment_neg",
+    "comments_analyzed", "comments_compound", "comments_positive", "comments_neutral", "comments_negative",
+)
+
+
+def _posts():
+    return get_db()[POST_COLLECTION]
+
+
+def _day_start(d: date) -> datetime:
+    return datetime(d.year, d.month, d.day)
+
+
+def _day_query(day: date) -> dict:
+    start = _day_start(day)
+    return {"created_utc": {"$gte": start, "$lt": start + timedelta(days=1)}}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# TTL index
+# ──────────────────────────────────────────────────────────────────────────────
+def post_expiry_index() -> dict:
+    """Index spec for Post.meta: TTL on `expire_at`, which only the compactor sets."""
+    return {"fields": ["expire_at"], "expireAfterSeconds": 0, "sparse": True}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Manifest (Mongo)
+# ──────────────────────────────────────────────────────────────────────────────
+def _state_coll():
+    return get_db()[STATE_COLLECTION]
+
+
+def _files_coll():
+    return get_db()[FILES_COLLECTION]
+
+
+def _state() -> dict:
+    return _state_coll().find_one({"_id": STATE_ID}) or {}
+
+
+def _file_id(entry: dict) -> str:
+    return f"{entry['day']}/{(entry.get('subreddit') or '_unknown').lower()}"
+
+
+def archived_until() -> Optional[datetime]:
+    wm = _state().get("archived_until")
+    return _day_start(date.fromisoformat(wm)) if wm else None
+
+
+def ingest_cutoff() -> Optional[datetime]:
+    """Posts created before this are archived or about to be; don't store them again."""
+    if not RETENTION_ENABLED:
+        return None
+    cutoff = datetime.utcnow() - timedelta(days=POST_HOT_DAYS)
+    wm = archived_until()
+    return max(cutoff, wm) if wm else cutoff
+
+
+def _acquire_lease(owner: str) -> bool:
+    """Take or renew the compaction lease shared by every worker and host."""
+    now = datetime.utcnow()
+    try:
+        doc = _state_coll().find_one_and_update(
+            {"_id": STATE_ID, "$or": [{"lease_owner": owner}, {"lease_until": {"$not": {"$gt": now}}}]},
+            {"$set": {"lease_owner": owner, "lease_until": now + timedelta(seconds=ARCHIVE_LEASE_SECS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except Exception:
+        return False  # duplicate key on the upsert: someone else holds it
+    return doc is not None and doc.get("lease_owner") == owner
+
+
+def _release_lease(owner: str) -> None:
+    _state_coll().update_one({"_id": STATE_ID, "lease_owner": owner},
+                             {"$set": {"lease_owner": None, "lease_until": None}})
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Archive files
+# ──────────────────────────────────────────────────────────────────────────────
+def _open_writer(path: str, codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL).stream_writer(open(path, "wb"), closefd=True)
+    return gzip.GzipFile(path, "wb", mtime=0)
+
+
+def _open_reader(path: str, codec: str):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is not installed; cannot read .zst archives")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True),
+                                encoding="utf-8")
+    return gzip.open(path, "rt", encoding="utf-8")
+
+
+def _record(doc: dict) -> dict:
+    rec = {k: doc.get(k) for k in _FIELDS if doc.get(k) is not None}
+    if isinstance(rec.get("created_utc"), datetime):
+        rec["created_utc"] = rec["created_utc"].isoformat() + "Z"
+    return rec
+
+
+def _write_group(day: date, subreddit: str, docs: list[dict]) -> dict:
+    """Write one (day, subreddit) archive atomically; returns its manifest entry."""
+    name = re.sub(r"[^a-z0-9_]", "_", subreddit.lower()) or "_unknown"
+    rel = os.path.join(f"{day:%Y}", f"{day:%m}", f"{day:%d}", name + _EXT[CODEC])
+    path = os.path.join(ARCHIVE_DIR, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    stats = {"posts": 0, "analyzed": 0, "pending": 0, "compound_sum": 0.0,
+             "by_polarity": {p: 0 for p in _POLARITIES}}
+    created = [d["created_utc"] for d in docs if isinstance(d.get("created_utc"), datetime)]
+    raw_bytes = 0
+
+    tmp = path + ".tmp"
+    with _open_writer(tmp, CODEC) as out:
+        for doc in docs:
+            line = (json.dumps(_record(doc), separators=(",", ":")) + "\n").encode("utf-8")
+            out.write(line)
+            raw_bytes += len(line)
+            stats["posts"] += 1
+            if doc.get("sentiment_compound") is not None:
+                stats["analyzed"] += 1
+                stats["compound_sum"] += doc["sentiment_compound"]
+            pol = doc.get("sentiment_polarity")
+            if pol is None:
+                stats["pending"] += 1
+            elif pol in stats["by_polarity"]:
+                stats["by_polarity"][pol] += 1
+    os.replace(tmp, path)
+
+    return {
+        "day": day.isoformat(),
+        "subreddit": subreddit,
+        "path": rel.replace(os.sep, "/"),
+        "codec": CODEC,
+        **stats,
+        "compound_sum": round(stats["compound_sum"], 6),
+        "min_created_utc": min(created).isoformat() + "Z" if created else None,
+        "max_created_utc": max(created).isoformat() + "Z" if created else None,
+        "raw_bytes": raw_bytes,
+        "bytes": os.path.getsize(path),
+        "archived_at": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+def _archive_day(day: date) -> list[dict]:
+    """All posts created on `day`, grouped by subreddit, streamed in subreddit order."""
+    cursor = _posts().aggregate([
+        {"$match": _day_query(day)},
+        {"$addFields": {"_sub": {"$toLower": {"$ifNull": ["$subreddit", "_unknown"]}}}},
+        {"$sort": {"_sub": 1, "created_utc": 1}},
+        {"$project": {"_id": 0, "_sub": 1, **{k: 1 for k in _FIELDS}}},
+    ], allowDiskUse=True)
+
+    entries, group, current = [], [], None
+    for doc in cursor:
+        if doc["_sub"] != current and group:
+            entries.append(_write_group(day, group[0].get("subreddit") or current, group))
+            group = []
+        current = doc["_sub"]
+        group.append(doc)
+    if group:
+        entries.append(_write_group(day, group[0].get("subreddit") or current, group))
+    return entries
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Compaction
+# ──────────────────────────────────────────────────────────────────────────────
+def _expire_archived(watermark: date) -> int:
+    """Hand frozen posts on archived days to the TTL (also catches up after a crash)."""
+    res = _posts().update_many(
+        {"created_utc": {"$lt": _day_start(watermark)},
+         "frozen_at": {"$exists": True}, "expire_at": {"$exists": False}},
+        {"$set": {"expire_at": datetime.utcnow()}},
+    )
+    return res.modified_count
+
+
+def compact(now: Optional[datetime] = None) -> dict:
+    """
+    Archive every complete UTC day older than POST_HOT_DAYS, advance the
+    watermark, then let those posts expire. Idempotent; returns what was written.
+    """
+    if not POST_HOT_DAYS:
+        return {"skipped": "retention disabled (POST_HOT_DAYS=0)"}
+    if not ARCHIVE_DIR:
+        return {"skipped": "retention disabled (ARCHIVE_DIR not set)"}
+    now = now or datetime.utcnow()
+    target = (now - timedelta(days=POST_HOT_DAYS)).date()  # exclusive
+
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    if not _acquire_lease(owner):
+        return {"skipped": "another compaction is running"}
+    try:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        wm = _state().get("archived_until")
+        if wm:
+            day = date.fromisoformat(wm)
+        else:
+            oldest = _posts().find_one({"created_utc": {"$ne": None}}, {"created_utc": 1},
+                                       sort=[("created_utc", 1)])
+            if not oldest:
+                return {"days": 0, "files": 0, "posts": 0, "archived_until": None}
+            day = oldest["created_utc"].date()
+
+        days = files = posts = 0
+        while day < target:
+            if not _acquire_lease(owner):
+                print("⚠️ Archive lease lost; stopping compaction", flush=True)
+                break
+            # 1) freeze, so no write lands after the snapshot below
+            _posts().update_many({**_day_query(day), "frozen_at": {"$exists": False}},
+                                 {"$set": {"frozen_at": datetime.utcnow()}})
+            # 2) archive and record, then advance the watermark one day
+            entries = _archive_day(day)
+            _files_coll().delete_many({"day": day.isoformat()})
+            for e in entries:
+                _files_coll().replace_one({"_id": _file_id(e)}, e, upsert=True)
+            day += timedelta(days=1)
+            wm = day.isoformat()
+            _state_coll().update_one({"_id": STATE_ID}, {"$set": {"archived_until": wm}}, upsert=True)
+            # 3) only now may the TTL delete them
+            _expire_archived(day)
+            days += 1
+            files += len(entries)
+            posts += sum(e["posts"] for e in entries)
+
+        if wm and not days:
+            _expire_archived(date.fromisoformat(wm))
+        if days:
+            print(f"🗄️ Archived {posts} posts over {days} day(s) into {files} file(s)", flush=True)
+        return {"days": days, "files": files, "posts": posts, "archived_until": wm}
+    finally:
+        _release_lease(owner)
+
+
+class Compactor(threading.Thread):
+    """In-process timer; with several workers or hosts the lease makes all but one skip."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="archive-compactor", daemon=True)
+        self.interval = interval
+
+    def run(self) -> None:
+        while True:
+            try:
+                compact()
+            except Exception as e:
+                print(f"⚠️ Archive compaction failed: {e}", flush=True)
+            time.sleep(self.interval)
+
+
+_compactor: Optional[Compactor] = None
+
+
+def start_compactor() -> None:
+    global _compactor
+    if POST_HOT_DAYS and not ARCHIVE_DIR:
+        print("⚠️ ARCHIVE_DIR not set; post retention is off and nothing expires", flush=True)
+    if RETENTION_ENABLED and ARCHIVE_INTERVAL_SECS > 0 and _compactor is None:
+        _compactor = Compactor(ARCHIVE_INTERVAL_SECS)
+        _compactor.start()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Queries
+# ──────────────────────────────────────────────────────────────────────────────
+def _entries(subreddit: Optional[str], since: Optional[date], until: Optional[date],
+             watermark: Optional[str]) -> list[dict]:
+    """Manifest entries for fully archived days (below the watermark) in range."""
+    if not watermark:
+        return []
+    day = {"$lt": watermark}
+    if since is not None:
+        day["$gte"] = since.isoformat()
+    if until is not None:
+        day["$lte"] = until.isoformat()
+    q: dict = {"day": day}
+    if subreddit:
+        q["_id"] = {"$regex": f"/{re.escape(subreddit.lower())}$"}
+    return list(_files_coll().find(q, {"_id": 0}).sort([("day", 1), ("subreddit", 1)]))
+
+
+def archive_summary(subreddit: Optional[str] = None, since: Optional[date] = None,
+                    until: Optional[date] = None, by_day: bool = False) -> dict:
+    """/summary-shaped counts over archived days, from manifest stats only."""
+    return _archive_counts(subreddit, since, until, by_day, _state().get("archived_until"))
+
+
+def _archive_counts(subreddit: Optional[str], since: Optional[date], until: Optional[date],
+                    by_day: bool, watermark: Optional[str]) -> dict:
+    counts = {"total": 0, "analyzed": 0, "pending": 0, "by_polarity": {p: 0 for p in _POLARITIES}}
+    compound_sum = 0.0
+    days: dict[str, dict] = {}
+    for f in _entries(subreddit, since, until, watermark):
+        counts["total"] += f["posts"]
+        counts["analyzed"] += f["analyzed"]
+        counts["pending"] += f["pending"]
+        for p in _POLARITIES:
+            counts["by_polarity"][p] += f["by_polarity"].get(p, 0)
+        compound_sum += f["compound_sum"]
+        if by_day:
+            d = days.setdefault(f["day"], {"total": 0, "analyzed": 0, "compound_sum": 0.0})
+            d["total"] += f["posts"]
+            d["analyzed"] += f["analyzed"]
+            d["compound_sum"] += f["compound_sum"]
+
+    out = {
+        "counts": counts,
+        "compound_sum": compound_sum,
+        "average_compound": compound_sum / counts["analyzed"] if counts["analyzed"] else None,
+        "archived_until": watermark,
+    }
+    if by_day:
+        out["days"] = [
+            {"day": k, "total": v["total"], "analyzed": v["analyzed"],
+             "average_compound": v["compound_sum"] / v["analyzed"] if v["analyzed"] else None}
+            for k, v in sorted(days.items())
+        ]
+    return out
+
+
+def merge_archive_summary(counts: dict, compound_sum: float, watermark: Optional[datetime],
+                          subreddit: Optional[str] = None, since: Optional[datetime] = None) -> dict:
+    """
+    /summary?archive=1, shared by the Flask and ASGI apps. `counts` (updated in
+    place) and `compound_sum` cover hot posts not below `watermark`, the
+    archived_until() read once for this request; whole archived days
+    overlapping the window are added from the manifest. Returns the merged
+    average_compound and the watermark day.
+    """
+    wm = watermark.date().isoformat() if watermark else None
+    arch = _archive_counts(subreddit, since.date() if since else None, None, False, wm)
+    for k in ("total", "analyzed", "pending"):
+        counts[k] += arch["counts"][k]
+    for p in _POLARITIES:
+        counts["by_polarity"][p] += arch["counts"]["by_polarity"][p]
+    compound_sum += arch["compound_sum"]
+    return {
+        "average_compound": compound_sum / counts["analyzed"] if counts["analyzed"] else None,
+        "archived_until": wm,
+    }
+
+
+def iter_archived_posts(subreddit: str, day: date) -> Iterator[dict]:
+    """Records from one (subreddit, day) archive, in created order."""
+    if not ARCHIVE_DIR:
+        return
+    for f in _entries(subreddit, day, day, _state().get("archived_until")):
+        with _open_reader(os.path.join(ARCHIVE_DIR, f["path"]), f["codec"]) as r:
+            for line in r:
+                if line.strip():
+                    yield json.loads(line)
+
+
+if __name__ == "__main__":
+    from .database import init_db
+    if init_db() is None:
+        raise SystemExit(1)
+    print(json.dumps(compact(), indent=2))
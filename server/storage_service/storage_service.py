@@ -1,7 +1,9 @@
 # storage_service.py
+import re
 from datetime import datetime
 from typing import Any, Optional
 
+from pymongo import UpdateOne
 from mongoengine import (
     Document,
     StringField,
@@ -11,6 +13,11 @@ from mongoengine import (
     FloatField,
 )
 
+from .trends import record_scores
+from .events import publish, summary_delta
+from .retention import post_expiry_index, ingest_cutoff
+from telemetry import POSTS_STORED
+
  # ensures Mongo connection is established
 
 class Post(Document):
@@ -32,10 +39,49 @@ class Post(Document):
     sentiment_neu = FloatField()
     sentiment_neg = FloatField()
 
+    # Comment sentiment roll-up (maintained by upsert_comment_sentiment)
+    comments_analyzed = IntField()
+    comments_compound = FloatField()     # mean VADER compound over scored comments
+    comments_positive = IntField()
+    comments_neutral = IntField()
+    comments_negative = IntField()
+
+    # Retention markers (set by the archive compactor, see retention.py)
+    frozen_at = DateTimeField()          # day is being archived; no more sentiment writes
+    expire_at = DateTimeField()          # archived; the TTL index deletes it from here
+
     meta = {
         "indexes": [
             "post_id",
             "-created_utc",
+            post_expiry_index(), # TTL on expire_at
+            "subreddit",
+            "sentiment_polarity",
+            "$title",            # text index for /search
+        ]
+    }
+
+
+class Comment(Document):
+    comment_id = StringField(required=True, unique=True)
+    post_id = StringField(required=True)   # short id, same as Post.post_id
+    parent_id = StringField()              # fullname: t1_... or t3_...
+    subreddit = StringField()
+    author = StringField()
+    body = StringField()
+    score = IntField()
+    depth = IntField()
+    created_utc = DateTimeField()
+
+    sentiment_polarity = StringField()
+    sentiment_compound = FloatField()
+    sentiment_pos = FloatField()
+    sentiment_neu = FloatField()
+    sentiment_neg = FloatField()
+
+    meta = {
+        "indexes": [
+            ("post_id", "-created_utc"),
             "subreddit",
             "sentiment_polarity",
         ]
@@ -100,31 +146,117 @@ def _to_datetime(ts: Any) -> Optional[datetime]:
         return None
 
 
+def _post_fields(d: dict) -> Optional[dict]:
+    """Raw Post fields for one Reddit post dict (None if it carries no id)."""
+    pid = d.get("id") or d.get("name")  # e.g. "abc123" or "t3_abc123"
+    if not pid:
+        return None
+    return {
+        "post_id": pid,
+        "title": d.get("title"),
+        "author": d.get("author"),
+        "subreddit": d.get("subreddit"),
+        "score": d.get("score"),
+        "num_comments": d.get("num_comments"),
+        "created_utc": _to_datetime(d.get("created_utc") or d.get("created")),
+        "url": d.get("url"),
+        "is_video": d.get("is_video"),
+    }
+
+
+def _post_events(inserted: list[dict]) -> list[dict]:
+    """`posts` + `summary` events for newly inserted posts (fields from _post_fields)."""
+    changed: dict[str, list[dict]] = {}
+    for f in inserted:
+        if f.get("subreddit"):
+            changed.setdefault(f["subreddit"], []).append({
+                "post_id": f["post_id"],
+                "title": f.get("title"),
+                "score": f.get("score"),
+                "created_utc": f["created_utc"].isoformat() if f.get("created_utc") else None,
+            })
+
+    events = []
+    for sub, posts in changed.items():
+        events.append({"type": "posts", "subreddit": sub, "data": {"posts": posts}})
+        events.append(summary_delta(sub, total=len(posts), pending=len(posts)))
+    return events
+
+
+def _sentiment_effects(changes: list[tuple[dict, dict]]) -> tuple[dict[str, list[float]], list[dict]]:
+    """
+    From (previous post fields, new result) pairs, work out the trend inputs and
+    the `sentiment` + `summary` events. Re-scoring an unchanged title must not
+    count twice, so only new or changed compounds are kept.
+    """
+    new_scores: dict[str, list[float]] = {}
+    changed: dict[str, dict] = {}   # subreddit -> sentiment results + summary delta
+    for prev, r in changes:
+        sub = prev.get("subreddit")
+        comp = r.get("compound")
+        if comp is None or not sub or comp == prev.get("sentiment_compound"):
+            continue
+        new_scores.setdefault(sub, []).append(comp)
+
+        entry = changed.setdefault(sub, {
+            "results": [], "analyzed": 0, "pending": 0,
+            "by_polarity": {"positive": 0, "neutral": 0, "negative": 0},
+        })
+        entry["results"].append({"post_id": r.get("post_id"), "polarity": r.get("polarity"), "compound": comp})
+        if prev.get("sentiment_compound") is None:
+            entry["analyzed"] += 1
+        if prev.get("sentiment_polarity") is None:
+            entry["pending"] -= 1
+        elif prev["sentiment_polarity"] in entry["by_polarity"]:
+            entry["by_polarity"][prev["sentiment_polarity"]] -= 1
+        if r.get("polarity") in entry["by_polarity"]:
+            entry["by_polarity"][r["polarity"]] += 1
+
+    events = []
+    for sub, entry in changed.items():
+        events.append({"type": "sentiment", "subreddit": sub, "data": {"results": entry["results"]}})
+        events.append(summary_delta(sub, analyzed=entry["analyzed"], pending=entry["pending"],
+                                    by_polarity=entry["by_polarity"]))
+    return new_scores, events
+
+
+def apply_sentiment_effects(changes: list[tuple[dict, dict]]) -> None:
+    """Feed trends and the event stream after sentiment writes (non-fatal)."""
+    new_scores, events = _sentiment_effects(changes)
+    try:
+        record_scores(new_scores)
+    except Exception as e:
+        print(f"⚠️ Trend update failed: {e}", flush=True)
+    publish(events)
+
+
+def _is_hot(fields: dict, cutoff: Optional[datetime]) -> bool:
+    """False for posts past the hot window or on an already archived day."""
+    return cutoff is None or fields.get("created_utc") is None or fields["created_utc"] >= cutoff
+
+
 def upsert_posts(payload: dict) -> int:
     """Insert/update Reddit posts coming from reddit_service."""
     flat = _extract_flat_posts(payload)
+    cutoff = ingest_cutoff()
     count = 0
+    inserted: list[dict] = []
     for d in flat:
-        pid = d.get("id") or d.get("name")  # e.g. "abc123" or "t3_abc123"
-        if not pid:
+        fields = _post_fields(d)
+        if not fields or not _is_hot(fields, cutoff):
             continue
 
-        created_dt = _to_datetime(d.get("created_utc") or d.get("created"))
-
-        Post.objects(post_id=pid).update_one(
-            set__post_id=pid,
-            set__title=d.get("title"),
-            set__author=d.get("author"),
-            set__subreddit=d.get("subreddit"),
-            set__score=d.get("score"),
-            set__num_comments=d.get("num_comments"),
-            set__created_utc=created_dt,
-            set__url=d.get("url"),
-            set__is_video=d.get("is_video"),
+        res = Post.objects(post_id=fields["post_id"]).update_one(
             upsert=True,
+            full_result=True,
+            **{f"set__{k}": v for k, v in fields.items()},
         )
         count += 1
+        if res.upserted_id is not None:
+            inserted.append(fields)
 
+    publish(_post_events(inserted))
+    POSTS_STORED.inc(count)
     return count
 
 
@@ -143,17 +275,20 @@ def upsert_sentiment(results: list[dict]) -> int:
         raise ValueError("results must be a list")
 
     updated = 0
+    changes: list[tuple[dict, dict]] = []
     for r in results:
         pid = (r or {}).get("post_id")
         if not pid:
             continue
 
-        q = Post.objects(post_id=pid)
-        if not q:
+        # Frozen posts are being (or have been) archived; leave them as archived
+        q = Post.objects(post_id=pid, frozen_at__exists=False)
+        prev = q.only("subreddit", "sentiment_compound", "sentiment_polarity").as_pymongo().first()
+        if not prev:
             # Skip creating new docs from sentiment only
             continue
 
-        q.update_one(
+        n = q.update_one(
             set__sentiment_polarity=r.get("polarity"),
             set__sentiment_compound=r.get("compound"),
             set__sentiment_pos=r.get("pos"),
@@ -161,42 +296,268 @@ def upsert_sentiment(results: list[dict]) -> int:
             set__sentiment_neg=r.get("neg"),
             upsert=False,
         )
+        if not n:
+            continue  # frozen between the read and the write
         updated += 1
+        changes.append((prev, r))
 
+    apply_sentiment_effects(changes)
     return updated
 
 
+def upsert_comments(items: list[dict]) -> int:
+    """
+    Bulk insert/update comments coming from reddit_service.
+    One unordered bulk_write per call instead of a round-trip per comment.
+    """
+    if not isinstance(items, list):
+        raise ValueError("comments must be a list")
+
+    ops = []
+    for c in items:
+        cid = (c or {}).get("comment_id")
+        pid = (c or {}).get("post_id")
+        if not cid or not pid:
+            continue
+        ops.append(UpdateOne(
+            {"comment_id": cid},
+            {"$set": {
+                "comment_id": cid,
+                "post_id": pid,
+                "parent_id": c.get("parent_id"),
+                "subreddit": c.get("subreddit"),
+                "author": c.get("author"),
+                "body": c.get("body"),
+                "score": c.get("score"),
+                "depth": c.get("depth"),
+                "created_utc": _to_datetime(c.get("created_utc")),
+            }},
+            upsert=True,
+        ))
+
+    if not ops:
+        return 0
+    Comment._get_collection().bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+# Bodies Reddit leaves behind for deleted comments; never scored, so never "pending"
+UNSCORABLE_BODIES = ("[deleted]", "[removed]")
+
+
+def get_pending_comments(limit: int = 200, post_id: Optional[str] = None,
+                         subreddit: Optional[str] = None) -> list[dict]:
+    """
+    Newest unscored comments that have text to score. Blank and deleted bodies
+    are filtered in the query, not after the limit, so they can't fill every page.
+    """
+    limit = max(1, min(int(limit), 1000))
+    q = Comment.objects(
+        sentiment_polarity__exists=False,
+        body__nin=[None, "", *UNSCORABLE_BODIES],
+        body__regex=r"\S",
+    )
+    if post_id:
+        q = q.filter(post_id=post_id)
+    if subreddit:
+        q = q.filter(subreddit__iexact=subreddit)
+
+    comments = q.only("comment_id", "post_id", "body").order_by("-created_utc")[:limit]
+    return [{"comment_id": c.comment_id, "post_id": c.post_id, "body": c.body} for c in comments]
+
+
+def rollup_comment_sentiment(post_ids: list[str]) -> int:
+    """Recompute the comment sentiment roll-up for the given posts (one aggregate + one bulk write)."""
+    if not post_ids:
+        return 0
+
+    pipeline = [
+        {"$match": {"post_id": {"$in": list(post_ids)}, "sentiment_compound": {"$ne": None}}},
+        {"$group": {
+            "_id": "$post_id",
+            "n": {"$sum": 1},
+            "avg": {"$avg": "$sentiment_compound"},
+            "pos": {"$sum": {"$cond": [{"$eq": ["$sentiment_polarity", "positive"]}, 1, 0]}},
+            "neu": {"$sum": {"$cond": [{"$eq": ["$sentiment_polarity", "neutral"]}, 1, 0]}},
+            "neg": {"$sum": {"$cond": [{"$eq": ["$sentiment_polarity", "negative"]}, 1, 0]}},
+        }},
+    ]
+    ops = [
+        UpdateOne({"post_id": g["_id"], "frozen_at": {"$exists": False}}, {"$set": {
+            "comments_analyzed": g["n"],
+            "comments_compound": g["avg"],
+            "comments_positive": g["pos"],
+            "comments_neutral": g["neu"],
+            "comments_negative": g["neg"],
+        }})
+        for g in Comment._get_collection().aggregate(pipeline)
+    ]
+    if ops:
+        Post._get_collection().bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def upsert_comment_sentiment(results: list[dict]) -> int:
+    """
+    Update sentiment fields for existing comments, then roll the scores up
+    onto their parent posts. Same item shape as upsert_sentiment, keyed by
+    "comment_id" instead of "post_id".
+    """
+    if not isinstance(results, list):
+        raise ValueError("results must be a list")
+
+    ops = []
+    ids = []
+    for r in results:
+        cid = (r or {}).get("comment_id")
+        if not cid:
+            continue
+        ids.append(cid)
+        ops.append(UpdateOne({"comment_id": cid}, {"$set": {
+            "sentiment_polarity": r.get("polarity"),
+            "sentiment_compound": r.get("compound"),
+            "sentiment_pos": r.get("pos"),
+            "sentiment_neu": r.get("neu"),
+            "sentiment_neg": r.get("neg"),
+        }}))
+
+    if not ops:
+        return 0
+    res = Comment._get_collection().bulk_write(ops, ordered=False)
+    rollup_comment_sentiment(Comment.objects(comment_id__in=ids).distinct("post_id"))
+    return res.matched_count
+
+
+def _recent_row(p: dict) -> dict:
+    """API shape of one raw Post document (shared by the WSGI and ASGI apps)."""
+    created = p.get("created_utc")
+    row = {
+        "post_id": p.get("post_id"),
+        "title": p.get("title"),
+        "author": p.get("author"),
+        "subreddit": p.get("subreddit"),
+        "score": p.get("score"),
+        "num_comments": p.get("num_comments"),
+        "created_utc": created.isoformat() if created else None,
+        "url": p.get("url"),
+        "is_video": p.get("is_video"),
+    }
+    # include sentiment only if present
+    if p.get("sentiment_compound") is not None:
+        row["sentiment"] = {
+            "polarity": p.get("sentiment_polarity"),
+            "compound": p.get("sentiment_compound"),
+            "pos": p.get("sentiment_pos"),
+            "neu": p.get("sentiment_neu"),
+            "neg": p.get("sentiment_neg"),
+        }
+    if p.get("comments_analyzed"):
+        row["comment_sentiment"] = {
+            "analyzed": p["comments_analyzed"],
+            "compound": p.get("comments_compound"),
+            "by_polarity": {
+                "positive": p.get("comments_positive") or 0,
+                "neutral": p.get("comments_neutral") or 0,
+                "negative": p.get("comments_negative") or 0,
+            },
+        }
+    return row
+
+
 def get_recent_posts(limit: int = 20, subreddit: Optional[str] = None) -> list[dict]:
     limit = max(1, min(int(limit), 200))
     q = Post.objects
     if subreddit:
         q = q.filter(subreddit__iexact=subreddit)
 
-    posts = q.order_by("-created_utc")[:limit]
-    data: list[dict] = []
-    for p in posts:
-        row = {
-            "post_id": p.post_id,
-            "title": p.title,
-            "author": p.author,
-            "subreddit": p.subreddit,
-            "score": p.score,
-            "num_comments": p.num_comments,
-            "created_utc": p.created_utc.isoformat() if p.created_utc else None,
-            "url": p.url,
-            "is_video": p.is_video,
-        }
-        # include sentiment only if present
-        if p.sentiment_compound is not None:
-            row["sentiment"] = {
-                "polarity": p.sentiment_polarity,
-                "compound": p.sentiment_compound,
-                "pos": p.sentiment_pos,
-                "neu": p.sentiment_neu,
-                "neg": p.sentiment_neg,
-            }
-        data.append(row)
-    return data
+    posts = q.order_by("-created_utc").as_pymongo()[:limit]
+    return [_recent_row(p) for p in posts]
+
+def search_posts(query: str, subreddit: Optional[str] = None,
+                 page: int = 1, page_size: int = 20) -> dict:
+    """
+    Full-text search over titles plus sentiment facets for the whole match set,
+    computed in a single aggregation ($text match -> $facet).
+    """
+    page = max(1, int(page))
+    page_size = max(1, min(int(page_size), 100))
+
+    match: dict = {"$text": {"$search": query}}
+    if subreddit:
+        match["subreddit"] = re.compile(f"^{re.escape(subreddit)}$", re.IGNORECASE)
+
+    pipeline = [
+        {"$match": match},
+        {"$facet": {
+            "results": [
+                {"$sort": {"relevance": {"$meta": "textScore"}, "created_utc": -1}},
+                {"$skip": (page - 1) * page_size},
+                {"$limit": page_size},
+                {"$project": {
+                    "_id": 0, "post_id": 1, "title": 1, "subreddit": 1, "author": 1,
+                    "score": 1, "created_utc": 1, "url": 1,
+                    "sentiment_polarity": 1, "sentiment_compound": 1,
+                    "relevance": {"$meta": "textScore"},
+                }},
+            ],
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    "average_compound": {"$avg": "$sentiment_compound"},
+                }},
+            ],
+            "by_polarity": [
+                {"$group": {"_id": "$sentiment_polarity", "count": {"$sum": 1}}},
+            ],
+            "by_subreddit": [
+                {"$group": {
+                    "_id": "$subreddit",
+                    "count": {"$sum": 1},
+                    "average_compound": {"$avg": "$sentiment_compound"},
+                }},
+                {"$sort": {"count": -1}},
+                {"$limit": 20},
+            ],
+        }},
+    ]
+    facets = next(Post._get_collection().aggregate(pipeline), {}) or {}
+
+    totals = (facets.get("totals") or [{}])[0]
+    by_polarity = {"positive": 0, "neutral": 0, "negative": 0, "pending": 0}
+    for g in facets.get("by_polarity") or []:
+        by_polarity[g["_id"] or "pending"] = g["count"]
+
+    results = []
+    for d in facets.get("results") or []:
+        created = d.get("created_utc")
+        results.append({
+            "post_id": d.get("post_id"),
+            "title": d.get("title"),
+            "subreddit": d.get("subreddit"),
+            "author": d.get("author"),
+            "score": d.get("score"),
+            "created_utc": created.isoformat() if created else None,
+            "url": d.get("url"),
+            "polarity": d.get("sentiment_polarity"),
+            "compound": d.get("sentiment_compound"),
+            "relevance": d.get("relevance"),
+        })
+
+    return {
+        "query": query,
+        "filters": {"subreddit": subreddit},
+        "page": page,
+        "page_size": page_size,
+        "total": totals.get("total", 0),
+        "average_compound": totals.get("average_compound"),
+        "by_polarity": by_polarity,
+        "by_subreddit": [
+            {"subreddit": g["_id"], "count": g["count"], "average_compound": g["average_compound"]}
+            for g in facets.get("by_subreddit") or []
+        ],
+        "results": results,
+    }
 
 def store_sentiment_results(results: list[dict]) -> int:
     """Alias for backward/alternate import style."""
@@ -0,0 +1,174 @@
+# storage_service/trends.py
+"""
+Incremental per-subreddit sentiment trends.
+
+Every score written through upsert_sentiment is folded into a small state
+document per subreddit:
+  - EWMA of the compound score (fast "current mood")
+  - exponentially weighted mean / variance with a span of TREND_WINDOW scores
+    (the slow baseline); state is a handful of floats, so each update is O(1)
+    in both CPU and document size
+  - z-score of the EWMA against the baseline; |z| >= TREND_Z_THRESHOLD flags
+    an anomaly
+
+/trends reads only these documents, never the Post collection.
+"""
+import os
+import math
+from datetime import datetime
+from typing import Optional
+
+from mongoengine import (
+    Document,
+    StringField,
+    IntField,
+    BooleanField,
+    DateTimeField,
+    FloatField,
+    NotUniqueError,
+)
+
+TREND_ALPHA = float(os.getenv("TREND_EWMA_ALPHA", "0.1"))
+TREND_WINDOW = int(os.getenv("TREND_WINDOW", "200"))        # baseline span, in scores
+TREND_Z_THRESHOLD = float(os.getenv("TREND_Z_THRESHOLD", "3.0"))
+TREND_MIN_SAMPLES = int(os.getenv("TREND_MIN_SAMPLES", "30"))
+_MAX_RETRIES = 5
+
+
+class SubredditTrend(Document):
+    subreddit = StringField(required=True, unique=True)   # lower-cased
+    n = IntField(default=0)                               # scores seen, all time
+    ewma = FloatField()
+    mean = FloatField()                                   # EW baseline mean
+    var = FloatField(default=0.0)                         # EW baseline variance
+    z = FloatField()
+    anomaly = BooleanField(default=False)
+    anomaly_since = DateTimeField()
+    updated_at = DateTimeField()
+    version = IntField(default=0)                         # optimistic concurrency
+
+    meta = {"indexes": ["anomaly"]}
+
+
+class RollingStats:
+    """Fast EWMA + exponentially weighted baseline mean/variance, O(1) state."""
+
+    def __init__(self, alpha: float = TREND_ALPHA, span: int = TREND_WINDOW,
+                 n: int = 0, ewma: Optional[float] = None, mean: Optional[float] = None,
+                 var: float = 0.0):
+        self.alpha = alpha
+        self.beta = 2.0 / (span + 1)      # same centre of mass as a `span`-score window
+        self.span = span
+        self.n = n
+        self.ewma = ewma
+        self.mean = mean
+        self.var = var
+
+    def update(self, x: float) -> None:
+        x = float(x)
+        if self.mean is None:
+            self.mean, self.var = x, 0.0
+        else:
+            # Incremental EW variance (West 1979): no history needed
+            diff = x - self.mean
+            incr = self.beta * diff
+            self.mean += incr
+            self.var = (1 - self.beta) * (self.var + diff * incr)
+        self.ewma = x if self.ewma is None else self.alpha * x + (1 - self.alpha) * self.ewma
+        self.n += 1
+
+    @property
+    def variance(self) -> Optional[float]:
+        return max(0.0, self.var) if self.n >= 2 else None
+
+    @property
+    def z(self) -> Optional[float]:
+        """
+        z-score of the EWMA against the baseline. For i.i.d. scores the EWMA's
+        std is std * sqrt(alpha / (2 - alpha)), which is what we divide by.
+        """
+        var = self.variance
+        if self.ewma is None or not var:
+            return None
+        se = math.sqrt(var) * math.sqrt(self.alpha / (2 - self.alpha))
+        return (self.ewma - self.mean) / se if se > 0 else None
+
+
+def _load(sub: str) -> SubredditTrend:
+    return SubredditTrend.objects(subreddit=sub).first() or SubredditTrend(subreddit=sub)
+
+
+def _apply(doc: SubredditTrend, scores: list[float]) -> dict:
+    stats = RollingStats(n=doc.n or 0, ewma=doc.ewma, mean=doc.mean, var=doc.var or 0.0)
+    for x in scores:
+        stats.update(x)
+
+    z = stats.z
+    anomaly = z is not None and stats.n >= TREND_MIN_SAMPLES and abs(z) >= TREND_Z_THRESHOLD
+    now = datetime.utcnow()
+    return {
+        "n": stats.n,
+        "ewma": stats.ewma,
+        "mean": stats.mean,
+        "var": stats.var,
+        "z": z,
+        "anomaly": anomaly,
+        "anomaly_since": (doc.anomaly_since or now) if anomaly else None,
+        "updated_at": now,
+    }
+
+
+def record_scores(scores_by_subreddit: dict[str, list[float]]) -> int:
+    """Fold new compound scores into each subreddit's trend state."""
+    updated = 0
+    for sub, scores in scores_by_subreddit.items():
+        if not sub or not scores:
+            continue
+        sub = sub.lower()
+        for _ in range(_MAX_RETRIES):
+            doc = _load(sub)
+            fields = _apply(doc, scores)
+            if doc.pk is None:
+                try:
+                    SubredditTrend(subreddit=sub, version=1, **fields).save(force_insert=True)
+                    break
+                except NotUniqueError:
+                    continue  # another worker created it first; retry as an update
+            # Compare-and-set on version so concurrent workers never lose updates
+            n = SubredditTrend.objects(pk=doc.pk, version=doc.version).update_one(
+                inc__version=1, **{f"set__{k}": v for k, v in fields.items()}
+            )
+            if n:
+                break
+        else:
+            print(f"⚠️ Trend update for r/{sub} lost to contention", flush=True)
+            continue
+        updated += 1
+    return updated
+
+
+def get_trends(subreddit: Optional[str] = None, anomalies_only: bool = False) -> list[dict]:
+    q = SubredditTrend.objects
+    if subreddit:
+        q = q.filter(subreddit=subreddit.lower())
+    if anomalies_only:
+        q = q.filter(anomaly=True)
+
+    data: list[dict] = []
+    for t in q.order_by("subreddit"):
+        var = RollingStats(n=t.n or 0, mean=t.mean, var=t.var or 0.0).variance if t.mean is not None else None
+        data.append({
+            "subreddit": t.subreddit,
+            "samples": t.n,
+            "ewma": t.ewma,
+            "window": {
+                "size": min(t.n or 0, TREND_WINDOW),    # effective span of the baseline
+                "mean": t.mean,
+                "std": math.sqrt(var) if var is not None else None,
+            },
+            "z": t.z,
+            "anomaly": bool(t.anomaly),
+            "anomaly_since": t.anomaly_since.isoformat() if t.anomaly_since else None,
+            "updated_at": t.updated_at.isoformat() if t.updated_at else None,
+        })
+    return data
@@ -0,0 +1,207 @@
+# server/telemetry.py
+"""
+Prometheus instrumentation shared by the root app and the three services.
+
+  - per-route latency histograms (instrument_flask)
+  - outbound Reddit / storage call timings (timed)
+  - Mongo command timings via a pymongo CommandListener
+  - pipeline counters: posts fetched / stored / scored
+  - optional per-request `Server-Timing` header (SERVER_TIMING=1)
+
+Metrics are scraped from /metrics on the root app. Under gunicorn,
+gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR so all workers are merged, and
+marks exited workers dead. Run gunicorn from server/ (or pass --config) so it
+is loaded.
+"""
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by service and route",
+    ["service", "method", "route", "status"], buckets=_BUCKETS,
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_request_duration_seconds", "Outbound call latency (Reddit API, storage_service)",
+    ["dependency", "operation", "outcome"], buckets=_BUCKETS,
+)
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency",
+    ["command", "collection", "outcome"], buckets=_BUCKETS,
+)
+POSTS_FETCHED = Counter("posts_fetched_total", "Posts fetched from Reddit")
+POSTS_STORED = Counter("posts_stored_total", "Posts upserted into storage")
+POSTS_SCORED = Counter("posts_scored_total", "Posts scored by VADER", ["source"])
+
+# Per-request dependency timings for Server-Timing: list of (name, seconds)
+_timings: contextvars.ContextVar[list | None] = contextvars.ContextVar("server_timings", default=None)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def timed(dependency: str, operation: str):
+    """Time an outbound call: histogram + Server-Timing entry."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        DEPENDENCY_LATENCY.labels(dependency, operation, outcome).observe(elapsed)
+        record_timing(dependency, elapsed)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Mongo command listener
+# ──────────────────────────────────────────────────────────────────────────────
+class MongoCommandTimer(monitoring.CommandListener):
+    _IGNORED = frozenset({"hello", "ismaster", "isMaster", "ping", "saslStart", "saslContinue",
+                          "getMore", "endSessions", "killCursors", "buildInfo"})
+
+    def __init__(self):
+        self._collections: dict[int, str] = {}
+
+    def started(self, event):
+        if event.command_name not in self._IGNORED:
+            coll = event.command.get(event.command_name)
+            self._collections[event.request_id] = coll if isinstance(coll, str) else ""
+
+    def _finish(self, event, outcome: str):
+        coll = self._collections.pop(event.request_id, None)
+        if coll is None:
+            return
+        elapsed = event.duration_micros / 1e6
+        MONGO_LATENCY.labels(event.command_name, coll, outcome).observe(elapsed)
+        record_timing("mongo", elapsed)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+_mongo_listener_registered = False
+
+
+def register_mongo_listener() -> None:
+    """Install the command listener for every MongoClient created afterwards."""
+    global _mongo_listener_registered
+    if not _mongo_listener_registered:
+        monitoring.register(MongoCommandTimer())
+        _mongo_listener_registered = True
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Flask / WSGI
+# ──────────────────────────────────────────────────────────────────────────────
+def instrument_flask(app, service: str) -> None:
+    """Record a latency histogram per matched route template."""
+
+    @app.before_request
+    def _start_timer():
+        g._telemetry_start = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        start = getattr(g, "_telemetry_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            HTTP_LATENCY.labels(service, request.method, route, str(response.status_code)).observe(
+                time.perf_counter() - start
+            )
+        return response
+
+
+class ServerTimingMiddleware:
+    """Adds `Server-Timing` (app total + summed dependency time) to every response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        timings: list = []
+        token = _timings.set(timings)
+        start = time.perf_counter()
+
+        def _start_response(status, headers, exc_info=None):
+            totals: dict[str, list] = {}
+            for name, secs in timings:
+                t = totals.setdefault(name, [0.0, 0])
+                t[0] += secs
+                t[1] += 1
+            parts = [f'{name};dur={t[0] * 1000:.1f};desc="{t[1]} calls"' for name, t in totals.items()]
+            parts.append(f"app;dur={(time.perf_counter() - start) * 1000:.1f}")
+            headers = list(headers) + [("Server-Timing", ", ".join(parts))]
+            return start_response(status, headers, exc_info) if exc_info else start_response(status, headers)
+
+        try:
+            return self.app(environ, _start_response)
+        finally:
+            _timings.reset(token)
+
+
+def wrap_wsgi(app):
+    return ServerTimingMiddleware(app) if SERVER_TIMING else app
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Gauges read at scrape time (spool depth, SSE subscribers, ...)
+# ──────────────────────────────────────────────────────────────────────────────
+class _CallbackCollector:
+    def __init__(self, name: str, documentation: str, fn):
+        self.name, self.documentation, self.fn = name, documentation, fn
+
+    def collect(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if value is not None:
+            yield GaugeMetricFamily(self.name, self.documentation, value=float(value))
+
+
+_callbacks: list[_CallbackCollector] = []
+
+
+def gauge_callback(name: str, documentation: str, fn) -> None:
+    """Expose fn() as a gauge, evaluated on each scrape of this process."""
+    _callbacks.append(_CallbackCollector(name, documentation, fn))
+
+
+def metrics_response() -> tuple[bytes, int, dict]:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(REGISTRY)
+    for cb in _callbacks:
+        registry.register(cb)
+    return generate_latest(registry), 200, {"Content-Type": CONTENT_TYPE_LATEST}
@@ -0,0 +1,46 @@
+# server/tests/conftest.py
+import os
+import sys
+import socket
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Same import layout as app.py: service packages + telemetry at top level
+sys.path.insert(0, SERVER_DIR)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def reddit_stub(monkeypatch):
+    """bench.reddit_stub serving tests/fixtures/reddit, with reddit_api pointed at it."""
+    from bench.reddit_stub import serve
+    from reddit_service import reddit_api
+
+    server = serve(free_port(), posts=10, fixtures=os.path.join(FIXTURES, "reddit"))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(reddit_api, "REDDIT_API_BASE", base)
+    monkeypatch.setattr(reddit_api, "ACCESS_TOKEN", server.stub.issue_token())
+    yield server.stub
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mongomock_db():
+    """mongoengine's default connection on an in-memory mongomock client."""
+    mongomock = pytest.importorskip("mongomock")
+    from mongoengine import connect, disconnect
+
+    disconnect()
+    conn = connect("storage_tests", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+    yield conn
+    conn.drop_database("storage_tests")
+    disconnect()
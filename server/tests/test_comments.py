@@ -0,0 +1,79 @@
+# server/tests/test_comments.py
+"""
+Comment ingestion (reddit_service/comments.py) against recorded listings
+served by bench.reddit_stub, plus the pending-comment query it feeds.
+"""
+import pytest
+
+from reddit_service import comments
+
+POST = "q1x9zt"
+# Depth-first over the first page, then `more` (morechildren), then "continue this thread"
+ALL_IDS = ["kc01", "kc02", "kc03", "kc04", "kc08", "kc05", "kc06", "kc07"]
+
+
+def walk(**kw):
+    gen = comments.iter_comments(POST, **kw)
+    out = []
+    while True:
+        try:
+            out.append(next(gen))
+        except StopIteration as stop:
+            return out, stop.value
+
+
+def test_full_walk_expands_more_and_continue_thread(reddit_stub):
+    got, ret = walk(more_budget=10)
+    assert [c["comment_id"] for c in got] == ALL_IDS
+    assert ret == {"unexpanded": 0}
+    assert {c["post_id"] for c in got} == {POST}
+    assert reddit_stub.counts["morechildren"] == 1
+    assert reddit_stub.counts["comments"] == 2  # first page + one continue-thread
+
+
+def test_more_budget_caps_extra_calls(reddit_stub):
+    got, ret = walk(more_budget=0)
+    assert [c["comment_id"] for c in got] == ["kc01", "kc02", "kc03"]
+    assert ret == {"unexpanded": 3}  # kc04, kc05 + the continue stub under kc02
+
+    got, ret = walk(more_budget=1)
+    assert [c["comment_id"] for c in got] == ALL_IDS[:6]
+    assert ret == {"unexpanded": 1}
+
+
+def test_max_comments_stops_the_walk(reddit_stub):
+    got, _ = walk(more_budget=10, max_comments=4)
+    assert [c["comment_id"] for c in got] == ALL_IDS[:4]
+
+
+def test_fetch_and_store_batches(reddit_stub, monkeypatch):
+    batches = []
+    monkeypatch.setattr(comments, "COMMENT_BATCH_SIZE", 3)
+    monkeypatch.setattr(comments, "_store_batch", lambda b: batches.append(list(b)) or len(b))
+
+    result = comments.fetch_and_store_comments(POST, more_budget=10)
+    assert result == {"post_id": POST, "walked": 8, "stored": 8, "unexpanded_more": 0}
+    assert [len(b) for b in batches] == [3, 3, 2]
+
+    batches.clear()
+    result = comments.fetch_and_store_comments(POST, more_budget=10, max_comments=5)
+    assert result["walked"] == result["stored"] == 5
+
+
+def test_fetch_error_is_reported(reddit_stub):
+    result = comments.fetch_and_store_comments("nosuchpost")
+    assert result["walked"] == 0 and "error" in result
+
+
+def test_pending_skips_deleted_bodies(mongomock_db):
+    from storage_service.storage_service import Comment, get_pending_comments
+
+    for i in range(300):
+        Comment(comment_id=f"d{i}", post_id="p1", body="[deleted]" if i % 2 else "[removed]").save()
+    Comment(comment_id="blank", post_id="p1", body="   ").save()
+    for i in range(5):
+        Comment(comment_id=f"ok{i}", post_id="p1", body=f"real comment {i}").save()
+    Comment(comment_id="done", post_id="p1", body="already scored", sentiment_polarity="neutral").save()
+
+    pending = get_pending_comments(limit=200)
+    assert sorted(c["comment_id"] for c in pending) == [f"ok{i}" for i in range(5)]
@@ -0,0 +1,178 @@
+# server/tests/test_consumer.py
+"""
+Change-stream consumer against a real single-node replica set.
+
+Starts `mongod --replSet` in a temp dir (skipped when mongod isn't on PATH)
+and storage_service on a local port, then checks that inserts get scored,
+that a restart resumes from the checkpoint, and that replaying already-stored
+events neither re-scores nor re-counts them.
+"""
+import os
+import time
+import shutil
+import subprocess
+import threading
+from datetime import datetime, timezone
+
+import pytest
+import requests
+
+from conftest import free_port
+
+pytestmark = pytest.mark.skipif(shutil.which("mongod") is None, reason="needs a local mongod")
+
+TITLES = [
+    "I love this amazing new release",
+    "The update is a terrible disaster",
+    "Weekly question thread",
+    "Brilliant guide, really helpful",
+    "Worst patch ever, everything is broken",
+]
+
+
+def _wait(pred, timeout: float = 20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if pred():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+@pytest.fixture(scope="module")
+def replset(tmp_path_factory):
+    """mongod --replSet rs0 on a free port; yields its URI."""
+    from pymongo import MongoClient
+
+    dbpath = tmp_path_factory.mktemp("rs0")
+    port = free_port()
+    proc = subprocess.Popen(
+        ["mongod", "--replSet", "rs0", "--port", str(port), "--bind_ip", "127.0.0.1",
+         "--dbpath", str(dbpath), "--quiet", "--logpath", str(dbpath / "mongod.log")],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    client = MongoClient(f"mongodb://127.0.0.1:{port}/?directConnection=true", serverSelectionTimeoutMS=20000)
+    try:
+        client.admin.command("ping")
+        client.admin.command("replSetInitiate", {"_id": "rs0", "members": [{"_id": 0, "host": f"127.0.0.1:{port}"}]})
+        assert _wait(lambda: client.admin.command("hello").get("isWritablePrimary"))
+        yield f"mongodb://127.0.0.1:{port}/consumer_tests?directConnection=true"
+    finally:
+        client.close()
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+@pytest.fixture
+def storage(replset, monkeypatch):
+    """storage_service on a local port, connected to the replica set."""
+    from mongoengine import disconnect
+    from werkzeug.serving import make_server
+    from sentiment_service import logic
+    from storage_service import database
+    from storage_service.app import app
+
+    try:
+        logic._get_sia()
+    except Exception as e:
+        pytest.skip(f"VADER lexicon unavailable: {e}")
+
+    disconnect()
+    database._conn = None
+    monkeypatch.setenv("MONGODB_URI", replset)
+    assert database.init_db()
+
+    server = make_server("127.0.0.1", free_port(), app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(logic, "STORAGE_BASE", base)
+    yield base
+    server.shutdown()
+    database._conn.drop_database("consumer_tests")
+    disconnect()
+    database._conn = None
+
+
+def _store_posts(base: str, titles: list[str], start: int) -> list[str]:
+    now = datetime.now(timezone.utc).timestamp()
+    posts = [{"id": f"cs{start + i:04d}", "title": t, "subreddit": "python", "author": "tester",
+              "score": 1, "num_comments": 0, "created_utc": now - i}
+             for i, t in enumerate(titles)]
+    r = requests.post(f"{base}/store-posts", json=posts, timeout=10)
+    r.raise_for_status()
+    return [p["id"] for p in posts]
+
+
+class _Running:
+    """A SentimentConsumer on a background thread."""
+
+    def __init__(self, uri: str):
+        from sentiment_service.consumer import SentimentConsumer
+
+        self.consumer = SentimentConsumer(uri, name="test-scorer", batch_size=2, max_wait_ms=200)
+        self.stop = threading.Event()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.consumer.run, args=(self.stop, ready), daemon=True)
+        self.thread.start()
+        assert ready.wait(20), "change stream did not open"
+
+    def close(self):
+        self.stop.set()
+        self.thread.join(10)
+        self.consumer.client.close()
+
+
+def _scores(uri: str, ids: list[str]) -> dict:
+    from pymongo import MongoClient
+
+    with MongoClient(uri) as client:
+        posts = client.get_default_database()["post"]
+        return {d["post_id"]: d.get("sentiment_compound")
+                for d in posts.find({"post_id": {"$in": ids}}, {"post_id": 1, "sentiment_compound": 1})}
+
+
+def test_insert_scored_and_resume_after_restart(replset, storage):
+    run = _Running(replset)
+    try:
+        first = _store_posts(storage, TITLES[:3], 0)
+        assert _wait(lambda: None not in _scores(replset, first).values() and len(_scores(replset, first)) == 3)
+        assert _wait(lambda: run.consumer.scored == 3)
+    finally:
+        run.close()
+
+    # Posts stored while the consumer is down are picked up from the checkpoint
+    second = _store_posts(storage, TITLES[3:], 3)
+    run = _Running(replset)
+    try:
+        assert _wait(lambda: None not in _scores(replset, second).values())
+        assert _wait(lambda: run.consumer.scored == 2)
+        assert run.consumer.skipped == 0
+    finally:
+        run.close()
+
+
+def test_replayed_inserts_are_not_rescored(replset, storage):
+    from pymongo import MongoClient
+    from sentiment_service.consumer import CHECKPOINT_COLLECTION
+
+    run = _Running(replset)
+    with MongoClient(replset) as client:
+        start = client.get_default_database()[CHECKPOINT_COLLECTION].find_one({"_id": "test-scorer"})["resume_token"]
+    try:
+        ids = _store_posts(storage, TITLES, 10)
+        assert _wait(lambda: None not in _scores(replset, ids).values() and len(_scores(replset, ids)) == 5)
+    finally:
+        run.close()
+    before = _scores(replset, ids)
+
+    # Rewind the checkpoint: a crash between store and checkpoint replays like this
+    with MongoClient(replset) as client:
+        client.get_default_database()[CHECKPOINT_COLLECTION].update_one(
+            {"_id": "test-scorer"}, {"$set": {"resume_token": start}})
+    run = _Running(replset)
+    try:
+        assert _wait(lambda: run.consumer.skipped >= 5)
+        assert run.consumer.scored == 0
+    finally:
+        run.close()
+    assert _scores(replset, ids) == before
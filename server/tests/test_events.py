@@ -0,0 +1,186 @@
+# server/tests/test_events.py
+"""EventHub resume paths (ring, backfill, rotation) and the subscriber cap, with the tailer driven by hand."""
+import pytest
+from bson import ObjectId
+
+from storage_service import events
+from storage_service.events import EventHub, TooManySubscribers
+
+
+@pytest.fixture
+def coll(mongomock_db, monkeypatch):
+    c = mongomock_db.get_database("storage_tests")[events.EVENTS_COLLECTION]
+    monkeypatch.setattr(events, "_coll", c)
+    return c
+
+
+def make_hub(monkeypatch, ring: int = 100) -> EventHub:
+    monkeypatch.setattr(events, "EVENTS_RING", ring)
+    h = EventHub()
+    monkeypatch.setattr(h, "_ensure_started", lambda: None)
+    return h
+
+
+def publish(n: int, subreddit: str = "python") -> list[dict]:
+    events.publish([{"type": "posts", "subreddit": subreddit, "data": {"n": i}} for i in range(n)])
+    return list(events._coll.find().sort("$natural", 1))
+
+
+def tail(h: EventHub, through: ObjectId | None = None) -> None:
+    """Dispatch what the tailer has not seen yet, optionally stopping at `through`."""
+    docs = list(events._coll.find().sort("$natural", 1))
+    ids = [d["_id"] for d in docs]
+    start = ids.index(h._last_id) + 1 if h._last_id in ids else 0
+    for doc in docs[start:]:
+        h._dispatch(doc)
+        if doc["_id"] == through:
+            break
+
+
+def drain(sub) -> list[dict]:
+    out = []
+    while not sub.queue.empty():
+        out.append(sub.queue.get_nowait())
+    return out
+
+
+def _ns(docs: list[dict]) -> list[int]:
+    return [d["data"]["n"] for d in docs]
+
+
+def test_fresh_subscriber_gets_only_live_events(coll, monkeypatch):
+    h = make_hub(monkeypatch)
+    h._start_at(None)
+    publish(3)
+    tail(h)
+
+    sub, backlog, reset = h.subscribe(None, None)
+    assert (backlog, reset) == ([], False)
+    events.publish([{"type": "posts", "subreddit": "python", "data": {"n": 9}}])
+    tail(h)
+    assert _ns(drain(sub)) == [9]
+
+
+def test_resume_from_the_ring(coll, monkeypatch):
+    h = make_hub(monkeypatch)
+    h._start_at(None)
+    docs = publish(5)
+    tail(h)
+
+    sub, backlog, reset = h.subscribe(None, str(docs[1]["_id"]))
+    assert not reset
+    assert _ns(backlog) == [2, 3, 4]
+
+
+def test_resume_from_backfill_then_the_ring(coll, monkeypatch):
+    h = make_hub(monkeypatch, ring=3)
+    h._start_at(None)
+    docs = publish(10)
+    tail(h)
+
+    sub, backlog, reset = h.subscribe(None, str(docs[2]["_id"]))
+    assert not reset
+    assert _ns(backlog) == [3, 4, 5, 6, 7, 8, 9]
+
+
+def test_backfill_stops_at_the_tailer_position(coll, monkeypatch):
+    h = make_hub(monkeypatch)
+    docs = publish(5)
+    h._start_at(docs[-1]["_id"])     # tailer started at the end; ring still empty
+    events.publish([{"type": "posts", "subreddit": "python", "data": {"n": n}} for n in (5, 6)])
+
+    sub, backlog, reset = h.subscribe(None, str(docs[1]["_id"]))
+    assert not reset
+    assert _ns(backlog) == [2, 3, 4]
+    tail(h)
+    assert _ns(drain(sub)) == [5, 6]  # each event exactly once
+
+
+def test_events_dispatched_during_the_backfill_are_not_lost(coll, monkeypatch):
+    h = make_hub(monkeypatch, ring=2)
+    h._start_at(None)
+    docs = publish(6)
+    tail(h)
+    late = []
+    real_backfill = h._backfill
+
+    def racing_backfill(*args):
+        out = real_backfill(*args)
+        late.extend(publish(1)[-1:])
+        tail(h)                      # tailer moves on before we register
+        return out
+
+    monkeypatch.setattr(h, "_backfill", racing_backfill)
+    sub, backlog, reset = h.subscribe(None, str(docs[0]["_id"]))
+    assert not reset
+    assert [d["_id"] for d in backlog] == [d["_id"] for d in docs[1:]] + [late[0]["_id"]]
+    assert drain(sub) == []
+
+
+def test_backfill_longer_than_the_cap_resets(coll, monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_BACKFILL_MAX", 3)
+    h = make_hub(monkeypatch, ring=2)
+    h._start_at(None)
+    docs = publish(10)
+    tail(h)
+
+    sub, backlog, reset = h.subscribe(None, str(docs[0]["_id"]))
+    assert (backlog, reset) == ([], True)
+    publish(1)
+    tail(h)
+    assert len(drain(sub)) == 1      # live events still flow after the reset
+
+
+def test_resume_after_rotation_resets(coll, monkeypatch):
+    h = make_hub(monkeypatch, ring=2)
+    h._start_at(None)
+    docs = publish(6)
+    tail(h)
+    coll.delete_many({"_id": {"$in": [d["_id"] for d in docs[:3]]}})  # capped collection wrapped
+
+    _, backlog, reset = h.subscribe(None, str(docs[1]["_id"]))
+    assert (backlog, reset) == ([], True)
+
+
+def test_resume_ahead_of_this_tailer_skips_what_the_client_has(coll, monkeypatch):
+    h = make_hub(monkeypatch)
+    h._start_at(None)
+    docs = publish(4)
+    tail(h, through=docs[1]["_id"])  # this worker's tailer lags behind another's
+
+    sub, backlog, reset = h.subscribe(None, str(docs[3]["_id"]))
+    assert (backlog, reset) == ([], False)
+    events.publish([{"type": "posts", "subreddit": "python", "data": {"n": 4}}])
+    tail(h)
+    assert _ns(drain(sub)) == [4]
+
+
+def test_backlog_and_live_events_respect_the_filter(coll, monkeypatch):
+    h = make_hub(monkeypatch)
+    h._start_at(None)
+    events.publish([{"type": "posts", "subreddit": s, "data": {"n": i}}
+                    for i, s in enumerate(["python", "rust", "python"])])
+    first = coll.find_one(sort=[("$natural", 1)])
+    tail(h)
+
+    sub, backlog, _ = h.subscribe({"python"}, str(first["_id"]))
+    assert _ns(backlog) == [2]
+
+
+def test_subscriber_cap(coll, monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_MAX_SUBSCRIBERS", 2)
+    h = make_hub(monkeypatch)
+    h._start_at(None)
+    a, _, _ = h.subscribe(None, None)
+    h.subscribe(None, None)
+    with pytest.raises(TooManySubscribers):
+        h.subscribe(None, None)
+
+    a.overflowed = True               # still holds its thread until it unsubscribes
+    with pytest.raises(TooManySubscribers):
+        h.subscribe(None, None)
+    h.unsubscribe(a)
+    h.unsubscribe(a)                  # route close callback and generator both call it
+    h.subscribe(None, None)
+    assert h.stats()["subscribers"] == 2
+    assert h.stats()["rejected_subscribers"] == 2
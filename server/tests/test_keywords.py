@@ -0,0 +1,134 @@
+# server/tests/test_keywords.py
+"""Count-Min Sketch and Space-Saving add/merge, and folding batches into stored sketches."""
+import random
+from collections import Counter
+
+import pytest
+from mongoengine import OperationError
+
+from storage_service import keywords
+from storage_service.keywords import CountMinSketch, SpaceSaving, KeywordSketch, record_keywords, get_keywords
+
+
+def _zipf_stream(n: int, vocab: int = 500, seed: int = 3) -> list[str]:
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(vocab)]
+    return rng.choices([f"t{i}" for i in range(vocab)], weights, k=n)
+
+
+def test_cms_never_underestimates():
+    stream = _zipf_stream(20_000)
+    truth = Counter(stream)
+    cms = CountMinSketch(width=256, depth=4)
+    for term in stream:
+        cms.add(term)
+
+    assert all(cms.estimate(t) >= c for t, c in truth.items())
+    assert cms.estimate("t0") <= truth["t0"] + 2 * len(stream) // 256
+    assert cms.estimate("never-seen") <= 2 * len(stream) // 256
+
+
+def test_cms_merge_equals_one_sketch_over_both_streams():
+    stream = _zipf_stream(5_000)
+    whole, left, right = (CountMinSketch(width=128, depth=3) for _ in range(3))
+    for i, term in enumerate(stream):
+        whole.add(term)
+        (left if i % 2 else right).add(term)
+
+    assert left.merge(right).counts == whole.counts
+    restored = CountMinSketch.from_bytes(whole.to_bytes(), 128, 3)
+    assert restored.counts == whole.counts
+
+
+def test_cms_refuses_to_merge_different_shapes():
+    with pytest.raises(ValueError):
+        CountMinSketch(width=128, depth=3).merge(CountMinSketch(width=64, depth=3))
+
+
+def test_space_saving_keeps_heavy_hitters_within_error():
+    stream = _zipf_stream(20_000)
+    truth = Counter(stream)
+    top = SpaceSaving(k=20)
+    for term in stream:
+        top.add(term)
+
+    assert len(top.items) == 20
+    for term, (count, error) in top.items.items():
+        assert count - error <= truth[term] <= count
+    assert [row["term"] for row in top.top(3)] == ["t0", "t1", "t2"]
+
+
+def test_space_saving_eviction_inherits_the_floor():
+    top = SpaceSaving(k=2)
+    top.add("a", 5)
+    top.add("b", 2)
+    top.add("c")
+    assert top.items == {"a": [5, 0], "c": [3, 2]}
+
+
+def test_space_saving_merge_charges_the_floor_of_a_full_summary():
+    left = SpaceSaving(k=2, items={"a": [10, 0], "b": [4, 0]})     # full: floor 4
+    right = SpaceSaving(k=3, items={"a": [1, 0], "c": [7, 0]})     # not full: floor 0
+    left.merge(right)
+
+    assert left.k == 3
+    assert left.items == {"a": [11, 0], "c": [11, 4], "b": [4, 0]}
+
+
+def test_record_keywords_folds_batches_into_one_sketch(mongomock_db):
+    day = "2025-01-31"
+    groups = [{"subreddit": "Python", "polarity": "negative", "day": day, "terms": {"bug": 3, "crash": 1}}]
+    assert record_keywords(groups) == 1
+    assert record_keywords([{**groups[0], "terms": {"bug": 2, "zero": 0}}]) == 1
+    assert record_keywords([{"subreddit": "python", "polarity": "negative", "day": day}]) == 0
+
+    doc = KeywordSketch.objects.get(subreddit="python", polarity="negative", day=day)
+    assert (doc.total, doc.version) == (6, 2)
+
+    out = get_keywords("python", polarities=("negative",), day=day, terms=["bug", "outage"])
+    entry = out["keywords"]["negative"]
+    assert entry["top"][0] == {"term": "bug", "count": 5, "error": 0}
+    assert entry["estimates"]["bug"] >= 5
+    assert entry["sketches"] == 1
+
+
+def test_get_keywords_merges_subreddits_and_days(mongomock_db):
+    record_keywords([
+        {"subreddit": "python", "polarity": "positive", "day": "2025-01-30", "terms": {"release": 2}},
+        {"subreddit": "rust", "polarity": "positive", "day": "2025-01-31", "terms": {"release": 3, "fast": 1}},
+    ])
+    out = get_keywords(polarities=("positive",), day="2025-01-31", days=2)
+    entry = out["keywords"]["positive"]
+    assert entry["sketches"] == 2 and entry["total_terms"] == 6
+    assert entry["top"][0] == {"term": "release", "count": 5, "error": 0}
+
+
+def test_insert_race_retries_as_update(mongomock_db, monkeypatch):
+    day = "2025-01-31"
+    record_keywords([{"subreddit": "python", "polarity": "positive", "day": day, "terms": {"a": 1}}])
+    real_objects = KeywordSketch.objects
+    first = []
+
+    class StaleManager:
+        """First lookup misses the existing doc, as if another worker inserted it just after."""
+
+        def __call__(self, **kw):
+            qs = real_objects(**kw)
+            if not first and "version" not in kw:
+                first.append(kw)
+                return qs.filter(subreddit="missing")
+            return qs
+
+    monkeypatch.setattr(KeywordSketch, "objects", StaleManager())
+    assert record_keywords([{"subreddit": "python", "polarity": "positive", "day": day, "terms": {"a": 1}}]) == 1
+    monkeypatch.undo()
+    assert KeywordSketch.objects.get(subreddit="python").total == 2
+
+
+def test_write_failures_are_not_mistaken_for_the_insert_race(mongomock_db, monkeypatch):
+    def broken_save(self, *args, **kwargs):
+        raise OperationError("database unavailable")
+
+    monkeypatch.setattr(KeywordSketch, "save", broken_save)
+    with pytest.raises(OperationError):
+        record_keywords([{"subreddit": "python", "polarity": "positive", "day": "2025-01-31", "terms": {"a": 1}}])
@@ -0,0 +1,156 @@
+# server/tests/test_retention.py
+"""compact(): freeze, archive, watermark and expiry; archive_summary and the /summary merge."""
+from datetime import datetime, timedelta, date
+
+import pytest
+
+from storage_service import retention
+from storage_service.retention import (
+    compact,
+    archived_until,
+    archive_summary,
+    merge_archive_summary,
+    iter_archived_posts,
+    ingest_cutoff,
+)
+
+NOW = datetime(2025, 3, 10, 12, 0)
+
+
+@pytest.fixture
+def archive(mongomock_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(retention, "POST_HOT_DAYS", 2)
+    monkeypatch.setattr(retention, "RETENTION_ENABLED", True)
+    return tmp_path
+
+
+def _post(pid: str, created: datetime, subreddit: str = "python", compound: float | None = None) -> dict:
+    doc = {"post_id": pid, "title": f"post {pid}", "subreddit": subreddit, "created_utc": created}
+    if compound is not None:
+        doc["sentiment_compound"] = compound
+        doc["sentiment_polarity"] = "positive" if compound >= 0.05 else "negative" if compound <= -0.05 else "neutral"
+    return doc
+
+
+def _seed():
+    retention._posts().insert_many([
+        _post("a1", datetime(2025, 3, 6, 9), compound=0.5),
+        _post("a2", datetime(2025, 3, 6, 10), compound=-0.5),
+        _post("a3", datetime(2025, 3, 6, 11), subreddit="Rust"),
+        _post("b1", datetime(2025, 3, 7, 8), compound=0.0),
+        _post("h1", datetime(2025, 3, 8, 8), compound=0.9),   # inside the hot window
+        _post("h2", datetime(2025, 3, 10, 8)),
+    ])
+
+
+def test_compact_archives_complete_days_then_expires_them(archive):
+    _seed()
+    result = compact(NOW)
+
+    assert result == {"days": 2, "files": 3, "posts": 4, "archived_until": "2025-03-08"}
+    assert archived_until() == datetime(2025, 3, 8)
+    assert sorted(p.name for p in (archive / "2025" / "03" / "06").iterdir()) == [
+        f"python{retention._EXT[retention.CODEC]}", f"rust{retention._EXT[retention.CODEC]}"]
+
+    posts = {d["post_id"]: d for d in retention._posts().find()}
+    for pid in ("a1", "a2", "a3", "b1"):
+        assert posts[pid].get("frozen_at") and posts[pid].get("expire_at")
+    for pid in ("h1", "h2"):
+        assert "frozen_at" not in posts[pid] and "expire_at" not in posts[pid]
+
+
+def test_archived_posts_read_back_in_created_order(archive):
+    _seed()
+    compact(NOW)
+    rows = list(iter_archived_posts("python", date(2025, 3, 6)))
+    assert [r["post_id"] for r in rows] == ["a1", "a2"]
+    assert rows[0]["created_utc"] == "2025-03-06T09:00:00Z"
+    assert list(iter_archived_posts("python", date(2025, 3, 8))) == []  # not archived yet
+
+
+def test_compact_is_idempotent_and_resumes_from_the_watermark(archive):
+    _seed()
+    compact(NOW)
+    assert compact(NOW)["days"] == 0
+
+    retention._posts().insert_one(_post("c1", datetime(2025, 3, 8, 9)))
+    assert compact(NOW + timedelta(days=1)) == {"days": 1, "files": 1, "posts": 2, "archived_until": "2025-03-09"}
+
+
+def test_crash_after_the_watermark_still_expires(archive):
+    _seed()
+    compact(NOW)
+    retention._posts().update_many({}, {"$unset": {"expire_at": ""}})  # died before step 3
+
+    compact(NOW)
+    expired = {d["post_id"] for d in retention._posts().find({"expire_at": {"$exists": True}})}
+    assert expired == {"a1", "a2", "a3", "b1"}
+
+
+def test_ttl_deletes_only_archived_posts(archive):
+    from storage_service.storage_service import Post
+
+    _seed()
+    Post.ensure_indexes()
+    compact(NOW)
+    assert sorted(d["post_id"] for d in retention._posts().find()) == ["h1", "h2"]
+
+
+def test_compaction_waits_for_the_lease(archive):
+    _seed()
+    assert retention._acquire_lease("other-host")
+    assert compact(NOW) == {"skipped": "another compaction is running"}
+    retention._release_lease("other-host")
+    assert compact(NOW)["days"] == 2
+
+
+def test_compaction_is_off_without_an_archive_dir(archive, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", None)
+    _seed()
+    assert "skipped" in compact(NOW)
+    assert retention._posts().count_documents({"frozen_at": {"$exists": True}}) == 0
+
+
+def test_archive_summary_from_the_manifest(archive):
+    _seed()
+    compact(NOW)
+
+    out = archive_summary()
+    assert out["counts"] == {"total": 4, "analyzed": 3, "pending": 1,
+                             "by_polarity": {"positive": 1, "neutral": 1, "negative": 1}}
+    assert out["average_compound"] == pytest.approx(0.0)
+    assert out["archived_until"] == "2025-03-08"
+
+    rust = archive_summary(subreddit="rust", by_day=True)
+    assert rust["counts"]["total"] == 1
+    assert rust["days"] == [{"day": "2025-03-06", "total": 1, "analyzed": 0, "average_compound": None}]
+    assert archive_summary(since=date(2025, 3, 7))["counts"]["total"] == 1
+
+
+def test_merge_adds_archived_days_to_hot_counts(archive):
+    _seed()
+    compact(NOW)
+    watermark = archived_until()
+
+    hot = {"total": 2, "analyzed": 1, "pending": 1, "by_polarity": {"positive": 1, "neutral": 0, "negative": 0}}
+    out = merge_archive_summary(hot, 0.9, watermark, subreddit="python")
+    assert hot == {"total": 5, "analyzed": 4, "pending": 1,
+                   "by_polarity": {"positive": 2, "neutral": 1, "negative": 1}}
+    assert out == {"average_compound": pytest.approx(0.9 / 4), "archived_until": "2025-03-08"}
+
+
+def test_merge_before_anything_is_archived(archive):
+    hot = {"total": 1, "analyzed": 1, "pending": 0, "by_polarity": {"positive": 1, "neutral": 0, "negative": 0}}
+    out = merge_archive_summary(hot, 0.5, None)
+    assert hot["total"] == 1
+    assert out == {"average_compound": 0.5, "archived_until": None}
+
+
+def test_ingest_cutoff_follows_the_watermark(archive, monkeypatch):
+    assert ingest_cutoff() > datetime.utcnow() - timedelta(days=2, minutes=1)
+    retention._state_coll().update_one({"_id": retention.STATE_ID},
+                                       {"$set": {"archived_until": "2999-01-01"}}, upsert=True)
+    assert ingest_cutoff() == datetime(2999, 1, 1)
+    monkeypatch.setattr(retention, "RETENTION_ENABLED", False)
+    assert ingest_cutoff() is None
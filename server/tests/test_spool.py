@@ -0,0 +1,162 @@
+# server/tests/test_spool.py
+"""Spool drain, quarantine and restart behaviour against a local fake /store-posts."""
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from reddit_service import spool as spool_mod
+from reddit_service.spool import Spool, Drainer, peek
+
+
+class FakeStorage:
+    """/store-posts: 400 for {"bad": true}, 500 for {"boom": true}, 503 for everything while down."""
+
+    def __init__(self):
+        self.down = False
+        self.received: list[dict] = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                payloads = list(body.values())
+                if fake.down:
+                    status = 503
+                elif any(p.get("bad") for p in payloads):
+                    status = 400
+                elif any(p.get("boom") for p in payloads):
+                    status = 500
+                else:
+                    status = 201
+                    fake.received.extend(payloads)
+                raw = json.dumps({"count": len(payloads)} if status == 201 else {"error": "nope"}).encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/store-posts"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def storage():
+    fake = FakeStorage()
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+@pytest.fixture
+def spool_path(tmp_path):
+    return str(tmp_path / "spool.sqlite3")
+
+
+def _drain_all(drainer: Drainer) -> None:
+    while drainer.drain_once():
+        pass
+
+
+def test_drains_in_order_and_shares_rate(storage, spool_path):
+    sp = Spool(spool_path)
+    for i in range(5):
+        sp.append({"i": i})
+    drainer = Drainer(sp, storage.url, batch_size=2)
+    _drain_all(drainer)
+
+    assert [p["i"] for p in storage.received] == [0, 1, 2, 3, 4]
+    assert sp.depth() == (0, None)
+    assert sp.offset() == 5
+    # The rate lives in the file, so another process sees it too
+    assert peek(spool_path)["drain_rate_per_s"] > 0
+    assert drainer.stats()["drained_payloads"] == 5
+
+
+def test_rejected_payload_is_quarantined_alone(storage, spool_path):
+    sp = Spool(spool_path)
+    for i in range(4):
+        sp.append({"i": i, "bad": i == 2})
+    drainer = Drainer(sp, storage.url, batch_size=4)
+
+    assert drainer.drain_once() == 4
+    assert [p["i"] for p in storage.received] == [0, 1, 3]
+    assert sp.quarantined() == 1
+    assert drainer.stats()["rejected"] == 1
+
+
+def test_payload_that_always_500s_is_isolated_and_quarantined(storage, spool_path, monkeypatch):
+    monkeypatch.setattr(spool_mod, "SPOOL_POISON_ATTEMPTS", 2)
+    sp = Spool(spool_path)
+    sp.append({"i": 0, "boom": True})
+    sp.append({"i": 1})
+    sp.append({"i": 2})
+    drainer = Drainer(sp, storage.url, batch_size=3)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            drainer.drain_once()
+    _drain_all(drainer)
+
+    assert [p["i"] for p in storage.received] == [1, 2]
+    assert sp.quarantined() == 1
+    assert sp.depth()[0] == 0
+
+
+def test_outage_is_not_mistaken_for_a_poison_payload(storage, spool_path, monkeypatch):
+    monkeypatch.setattr(spool_mod, "SPOOL_POISON_ATTEMPTS", 1)
+    sp = Spool(spool_path)
+    sp.append({"i": 0})
+    sp.append({"i": 1})
+    drainer = Drainer(sp, storage.url)
+    storage.down = True
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            drainer.drain_once()
+    assert sp.quarantined() == 0
+
+    storage.down = False
+    _drain_all(drainer)
+    assert [p["i"] for p in storage.received] == [0, 1]
+
+
+def test_resumes_from_checkpoint_after_restart(storage, spool_path):
+    sp = Spool(spool_path)
+    for i in range(4):
+        sp.append({"i": i})
+    Drainer(sp, storage.url, batch_size=2).drain_once()
+
+    # New process: same file, fresh Spool/Drainer (the old lease has to lapse first)
+    restarted = Spool(spool_path)
+    restarted._conn().execute("UPDATE checkpoint SET lease_until=0")
+    assert restarted.offset() == 2
+    assert peek(spool_path)["depth"] == 2
+    _drain_all(Drainer(restarted, storage.url))
+    assert [p["i"] for p in storage.received] == [0, 1, 2, 3]
+
+
+def test_peek_never_creates_the_spool(spool_path):
+    assert peek(spool_path) is None
+    assert not os.path.exists(spool_path)
+
+
+def test_resume_pending_starts_the_drainer_only_with_a_backlog(storage, spool_path, monkeypatch):
+    monkeypatch.setattr(spool_mod, "SPOOL_PATH", spool_path)
+    monkeypatch.setattr(spool_mod, "_spool", None)
+    monkeypatch.setattr(spool_mod, "_drainer", None)
+    started = []
+    monkeypatch.setattr(spool_mod, "get_drainer", lambda url: started.append(url))
+
+    spool_mod.resume_pending(storage.url)
+    assert started == []
+
+    Spool(spool_path).append({"i": 0})
+    spool_mod.resume_pending(storage.url)
+    assert started == [storage.url]
@@ -0,0 +1,108 @@
+# server/tests/test_trends.py
+"""RollingStats maths and the record_scores compare-and-set path."""
+import math
+
+import pytest
+from mongoengine import OperationError
+
+from storage_service import trends
+from storage_service.trends import RollingStats, SubredditTrend, record_scores, get_trends
+
+
+def test_ew_mean_and_variance_match_the_closed_form():
+    stats = RollingStats(alpha=0.5, span=3)      # beta = 0.5
+    stats.update(0.0)
+    assert stats.variance is None               # one sample: no spread yet
+    stats.update(1.0)
+    assert stats.mean == pytest.approx(0.5)
+    assert stats.var == pytest.approx(0.25)     # (1 - b) * b * diff^2
+    assert stats.ewma == pytest.approx(0.5)
+    assert stats.n == 2
+
+
+def test_state_stays_constant_size():
+    stats = RollingStats()
+    for i in range(10_000):
+        stats.update(math.sin(i))
+    assert set(vars(stats)) == {"alpha", "beta", "span", "n", "ewma", "mean", "var"}
+
+
+def test_z_flags_a_shift_but_not_a_flat_stream():
+    stats = RollingStats(alpha=0.2, span=200)
+    for _ in range(100):
+        stats.update(0.0)
+    assert stats.z is None                      # zero variance: no z-score
+
+    for i in range(200):
+        stats.update(0.1 if i % 2 else -0.1)
+    assert abs(stats.z) < 3
+    for _ in range(10):
+        stats.update(0.9)
+    assert stats.z > 3
+
+
+def test_record_scores_creates_then_updates(mongomock_db):
+    assert record_scores({"Python": [0.1, -0.1]}) == 1
+    assert record_scores({"python": [0.2]}) == 1
+
+    doc = SubredditTrend.objects.get(subreddit="python")
+    assert doc.n == 3
+    assert doc.version == 2
+    assert [t["samples"] for t in get_trends()] == [3]
+
+
+def test_record_scores_flags_anomalies(mongomock_db, monkeypatch):
+    monkeypatch.setattr(trends, "TREND_MIN_SAMPLES", 10)
+    record_scores({"python": [0.1 if i % 2 else -0.1 for i in range(100)]})
+    assert not SubredditTrend.objects.get(subreddit="python").anomaly
+
+    record_scores({"python": [0.9] * 10})
+    doc = SubredditTrend.objects.get(subreddit="python")
+    assert doc.anomaly and doc.anomaly_since is not None
+    assert [t["subreddit"] for t in get_trends(anomalies_only=True)] == ["python"]
+
+
+def test_stale_version_retries_instead_of_losing_an_update(mongomock_db, monkeypatch):
+    record_scores({"python": [0.0]})
+    real_load = trends._load
+    calls = []
+
+    def racing_load(sub):
+        doc = real_load(sub)
+        calls.append(sub)
+        if len(calls) == 1:
+            record_scores({sub: [1.0]})         # another worker wins the race
+        return doc
+
+    monkeypatch.setattr(trends, "_load", racing_load)
+    assert record_scores({"python": [0.5]}) == 1
+
+    doc = SubredditTrend.objects.get(subreddit="python")
+    assert doc.n == 3                           # nothing lost
+    assert doc.version == 3
+    assert len(calls) == 3                      # stale attempt, racing writer, retry
+
+
+def test_insert_race_retries_as_update(mongomock_db, monkeypatch):
+    record_scores({"python": [0.0]})
+    real_load = trends._load
+    first = []
+
+    def stale_load(sub):
+        if not first:
+            first.append(sub)
+            return SubredditTrend(subreddit=sub)  # looked missing, but it exists now
+        return real_load(sub)
+
+    monkeypatch.setattr(trends, "_load", stale_load)
+    assert record_scores({"python": [0.5]}) == 1
+    assert SubredditTrend.objects.get(subreddit="python").n == 2
+
+
+def test_write_failures_are_not_mistaken_for_the_insert_race(mongomock_db, monkeypatch):
+    def broken_save(self, *args, **kwargs):
+        raise OperationError("database unavailable")
+
+    monkeypatch.setattr(SubredditTrend, "save", broken_save)
+    with pytest.raises(OperationError):
+        record_scores({"python": [0.5]})